@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+# This file is part of Python Cielo Webservice.
+#
+# Copyright (c) 2016, Rockho Team. All rights reserved.
+# Author: Christian Hess
+#
+# This source code is licensed under the AGPLv3 license found in the
+# LICENSE file in the root directory of this source tree.
+import io
+import os
+import threading
+
+
+class CieloResponseArchive(object):
+
+    '''
+    Append-only archive of raw Cielo responses
+
+    Responses are appended to segment files and an offset index
+    (payment id, segment, offset, length) is appended to an index file
+    and kept in memory, so looking up the responses of a payment
+    costs one seek per response
+    '''
+
+    INDEX_FILENAME = 'index'
+    SEGMENT_FILENAME = '%08d.seg'
+
+    def __init__(self, path, segment_size=64 * 1024 * 1024):
+        '''
+        :param: path archive directory, created if missing
+        :type: path string
+        :param: segment_size size in bytes after which a new segment is started
+        :type: segment_size int
+        '''
+
+        self.path = path
+        self.segment_size = segment_size
+        self._lock = threading.Lock()
+        self._index = {}
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+        self._segment = self._load_index()
+        self._segment_file = io.open(self._segment_path(self._segment), 'ab')
+        self._index_file = io.open(os.path.join(path, self.INDEX_FILENAME), 'ab')
+        # drops an incomplete last line, which the next line would be glued to
+        self._index_file.truncate(self._index_size)
+
+    def _segment_path(self, segment):
+        return os.path.join(self.path, self.SEGMENT_FILENAME % segment)
+
+    def _load_index(self):
+        '''
+        Loads the index file and returns the last segment number, setting
+        _index_size to the size of its complete lines
+        '''
+
+        segment = 0
+        self._index_size = 0
+        index_path = os.path.join(self.path, self.INDEX_FILENAME)
+
+        if not os.path.exists(index_path):
+            return segment
+
+        with io.open(index_path, 'rb') as index_file:
+            for line in index_file:
+                # an interrupted write leaves an incomplete last line
+                if not line.endswith(b'\n'):
+                    break
+
+                self._index_size += len(line)
+                fields = line.split()
+                if len(fields) != 4:
+                    continue
+
+                payment_id = fields[0].decode('ascii')
+                location = (int(fields[1]), int(fields[2]), int(fields[3]))
+
+                self._index.setdefault(payment_id, []).append(location)
+                segment = max(segment, location[0])
+
+        return segment
+
+    def append(self, payment_id, buffer):
+        '''
+        Archives a raw response
+
+        :param: payment_id payment the response belongs to
+        :type: payment_id string
+        :param: buffer raw response body
+        :type: buffer memoryview|bytes
+        '''
+
+        with self._lock:
+            offset = self._segment_file.tell()
+
+            if offset and offset + len(buffer) > self.segment_size:
+                self._segment_file.close()
+                self._segment += 1
+                self._segment_file = io.open(self._segment_path(self._segment), 'ab')
+                offset = 0
+
+            self._segment_file.write(buffer)
+            self._segment_file.flush()
+
+            location = (self._segment, offset, len(buffer))
+            self._index_file.write(("%s %d %d %d\n" % ((payment_id,) + location)).encode('ascii'))
+            self._index_file.flush()
+
+            self._index.setdefault(payment_id, []).append(location)
+
+    def get(self, payment_id):
+        '''
+        Returns every archived response of a payment, oldest first
+
+        :type: payment_id string
+        :rtype: list of bytes
+        '''
+
+        with self._lock:
+            locations = list(self._index.get(payment_id, []))
+
+        responses = []
+        for segment, offset, length in locations:
+            with io.open(self._segment_path(segment), 'rb') as segment_file:
+                segment_file.seek(offset)
+                responses.append(segment_file.read(length))
+
+        return responses
+
+    def __contains__(self, payment_id):
+        return payment_id in self._index
+
+    def close(self):
+        with self._lock:
+            self._segment_file.close()
+            self._index_file.close()
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+# This file is part of Python Cielo Webservice.
+#
+# Copyright (c) 2016, Rockho Team. All rights reserved.
+# Author: Christian Hess
+#
+# This source code is licensed under the AGPLv3 license found in the
+# LICENSE file in the root directory of this source tree.
+#
+# ASGI adapters (python 3.5+ only)
+from cielows.exceptions import ValidationError
+
+
+class CieloNotificationASGIApp(object):
+
+    '''
+    ASGI application for a CieloNotificationReceiver
+    '''
+
+    def __init__(self, receiver):
+        '''
+        :type: receiver CieloNotificationReceiver
+        '''
+
+        self.receiver = receiver
+
+    async def _respond(self, send, status):
+        await send({'type': 'http.response.start',
+                    'status': status,
+                    'headers': [(b'content-type', b'text/plain')]})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return
+
+        if scope['method'] != 'POST':
+            await self._respond(send, 405)
+            return
+
+        chunks = []
+        while True:
+            message = await receive()
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+
+        try:
+            accepted = self.receiver.receive(b''.join(chunks))
+        except ValidationError:
+            await self._respond(send, 400)
+            return
+
+        await self._respond(send, 200 if accepted else 503)
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+# This file is part of Python Cielo Webservice.
+#
+# Copyright (c) 2016, Rockho Team. All rights reserved.
+# Author: Christian Hess
+#
+# This source code is licensed under the AGPLv3 license found in the
+# LICENSE file in the root directory of this source tree.
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import csv
+
+
+def stream_concurrently(function, items, max_workers=16, max_pending=None):
+    '''
+    Calls function on every item using a pool of threads and yields
+    (item, result, error) tuples as soon as each call finishes
+
+    At most max_pending calls (2 * max_workers by default) are in flight
+    at a time, so items are consumed lazily and long (or endless)
+    iterables are streamed with bounded memory
+
+    :type: function callable
+    :type: items iterable
+    :type: max_workers int
+    :type: max_pending int|None
+    '''
+
+    max_pending = max_pending or 2 * max_workers
+    items = iter(items)
+    pending = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            for item in items:
+                pending[executor.submit(function, item)] = item
+                if len(pending) >= max_pending:
+                    break
+
+            if not pending:
+                return
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                item = pending.pop(future)
+                error = future.exception()
+                yield item, None if error else future.result(), error
+
+
+class CieloBoletoIssue(object):
+
+    '''
+    Outcome of a boleto issuance
+    '''
+
+    order_id = None
+    payment_id = None
+    url = None
+    bar_code_number = None
+    digitable_line = None
+    error = None
+
+    def __init__(self, order_id, payment=None, error=None):
+        '''
+        :type: order_id string
+        :type: payment CieloResponseBoletoPayment|None
+        :type: error Exception|None
+        '''
+
+        self.order_id = order_id
+        self.error = error
+
+        if payment is not None:
+            self.payment_id = payment.payment_id
+            self.url = payment.url
+            self.bar_code_number = payment.bar_code_number
+            self.digitable_line = payment.digitable_line
+
+
+class CieloBoletoCSVSink(object):
+
+    '''
+    Boleto issuance sink writing one CSV row per issued boleto
+    '''
+
+    COLUMNS = ('order_id', 'payment_id', 'url', 'bar_code_number', 'digitable_line', 'error')
+
+    def __init__(self, fileobj):
+        self._writer = csv.writer(fileobj)
+        self._writer.writerow(self.COLUMNS)
+
+    def __call__(self, issue):
+        self._writer.writerow([issue.order_id,
+                               issue.payment_id,
+                               issue.url,
+                               issue.bar_code_number,
+                               issue.digitable_line,
+                               issue.error])
+
+
+class CieloBoletoBatch(object):
+
+    '''
+    Issues boletos concurrently
+
+    Boletos are issued through a pool of threads and every outcome is
+    handed to the sink, in completion order, from the calling thread
+    '''
+
+    def __init__(self, cielo_ws, sink, max_workers=16):
+        '''
+        :type: cielo_ws CieloWS
+        :param: sink callable receiving each CieloBoletoIssue
+        :param: max_workers max number of concurrent issuances
+        :type: max_workers int
+        '''
+
+        self.cielo_ws = cielo_ws
+        self.sink = sink
+        self.max_workers = max_workers
+
+    def _issue(self, order):
+        order_id, customer, payment = order
+        return self.cielo_ws.authorize(order_id=order_id, customer=customer, payment=payment)
+
+    def issue(self, orders):
+        '''
+        Issues a boleto for every order
+
+        :param: orders (order_id, CieloRequestCustomer, CieloRequestBoletoPayment) tuples
+        :type: orders iterable
+        :return: (issued, failed) counts
+        :rtype: tuple
+        '''
+
+        issued = failed = 0
+
+        for order, cielo_response, error in stream_concurrently(self._issue, orders,
+                                                                max_workers=self.max_workers):
+            if error is None:
+                issued += 1
+                self.sink(CieloBoletoIssue(order[0], payment=cielo_response.payment))
+            else:
+                failed += 1
+                self.sink(CieloBoletoIssue(order[0], error=error))
+
+        return issued, failed
+
+
+class CieloPaymentsQueryBatch(object):
+
+    '''
+    Queries the payments of many orders concurrently
+
+    Repeated order ids are queried once and payments found under
+    several orders are yielded once. Failed queries are kept in errors.
+    '''
+
+    def __init__(self, cielo_ws, max_workers=16):
+        '''
+        :type: cielo_ws CieloWS
+        :param: max_workers max number of concurrent queries
+        :type: max_workers int
+        '''
+
+        self.cielo_ws = cielo_ws
+        self.max_workers = max_workers
+        self.errors = []
+
+    def query(self, order_ids, received_since=None, received_until=None):
+        '''
+        Yields (order_id, CieloPaymentQueryResult) for the payments of
+        every order, in completion order
+
+        Cielo has no date range search, so received_since and
+        received_until filter the payments found for order_ids by their
+        received date, both bounds included
+
+        :type: order_ids iterable of string
+        :type: received_since datetime.date|datetime.datetime|None
+        :type: received_until datetime.date|datetime.datetime|None
+        '''
+
+        since = received_since.isoformat() if received_since else None
+        # dates cover their whole day
+        until = received_until.isoformat() + '\xff' if received_until else None
+
+        seen_orders = set()
+        seen_payments = set()
+
+        def unique_order_ids():
+            for order_id in order_ids:
+                if order_id not in seen_orders:
+                    seen_orders.add(order_id)
+                    yield order_id
+
+        for order_id, query_result, error in stream_concurrently(self.cielo_ws.query_payments,
+                                                                 unique_order_ids(),
+                                                                 max_workers=self.max_workers):
+            if error is not None:
+                self.errors.append((order_id, error))
+                continue
+
+            for payment in query_result.payments:
+                if payment.payment_id in seen_payments:
+                    continue
+
+                received_date = payment.received_date or ''
+                if (since and received_date < since) or (until and received_date > until):
+                    continue
+
+                seen_payments.add(payment.payment_id)
+                yield order_id, payment
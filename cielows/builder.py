@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+# This file is part of Python Cielo Webservice.
+#
+# Copyright (c) 2016, Rockho Team. All rights reserved.
+# Author: Christian Hess
+#
+# This source code is licensed under the AGPLv3 license found in the
+# LICENSE file in the root directory of this source tree.
+from json.encoder import encode_basestring_ascii
+import threading
+
+from cielows.constants import CieloPaymentType, CieloCurrency, CieloPaymentInterest,\
+    CieloErrorsMap
+from cielows.exceptions import ValidationError
+from cielows.validation import CieloLengthRules
+
+
+_LENGTH_LIMITS = dict((path, (max_length, code)) for path, max_length, code in CieloLengthRules)
+
+_ADDRESS_FIELDS = (
+    (b'"Street":', 'Street', 'street'),
+    (b'"Number":', 'Number', 'number'),
+    (b'"Complement":', 'Complement', 'complement'),
+    (b'"ZipCode":', 'ZipCode', 'zip_code'),
+    (b'"City":', 'City', 'city'),
+    (b'"State":', 'State', 'state'),
+    (b'"Country":', 'Country', 'country'),
+)
+
+_local = threading.local()
+
+
+class CieloRequestBuilder(object):
+
+    '''
+    Reusable authorization request builder
+
+    The builder keeps the request fields in slots instead of a tree of
+    request objects and serializes them straight to JSON into a bytearray
+    that is kept (and grown when needed) between requests. A worker
+    builds every request with the same builder: reset it, fill it in,
+    then serialize or authorize.
+
+    Field lengths are checked against CieloLengthRules while serializing.
+    '''
+
+    __slots__ = (
+        'order_id',
+        'customer_name', 'customer_email', 'customer_birth_date',
+        'customer_identity', 'customer_identity_type',
+        'address_street', 'address_number', 'address_complement', 'address_zip_code',
+        'address_city', 'address_state', 'address_country',
+        'delivery_street', 'delivery_number', 'delivery_complement', 'delivery_zip_code',
+        'delivery_city', 'delivery_state', 'delivery_country',
+        'card_number', 'card_holder', 'card_expiration_date', 'card_security_code',
+        'card_brand', 'card_save', 'card_token',
+        'payment_type', 'amount', 'installments', 'currency', 'country', 'provider',
+        'service_tax_amount', 'interest', 'capture', 'authenticate', 'soft_descriptor',
+        '_buffer', '_size',
+    )
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._size = 0
+        self.reset()
+
+    @classmethod
+    def for_thread(cls):
+        '''
+        Returns the (reset) builder of the calling thread
+
+        :rtype: CieloRequestBuilder
+        '''
+
+        builder = getattr(_local, 'builder', None)
+
+        if builder is None:
+            builder = _local.builder = cls()
+        else:
+            builder.reset()
+
+        return builder
+
+    def reset(self):
+        '''
+        Clears every field, keeping the serialization buffer
+        '''
+
+        for slot in self.__slots__[:-2]:
+            setattr(self, slot, None)
+
+        self.card_save = False
+        self.payment_type = CieloPaymentType.CreditCard
+        self.currency = CieloCurrency.BRL
+        self.interest = CieloPaymentInterest.ByMerchant
+        self.service_tax_amount = 0
+        self.capture = False
+        self.authenticate = False
+        return self
+
+    def customer(self, name, email=None, birth_date=None, identity=None, identity_type=None):
+        self.customer_name = name
+        self.customer_email = email
+        self.customer_birth_date = birth_date
+        self.customer_identity = identity
+        self.customer_identity_type = identity_type
+        return self
+
+    def address(self, street=None, number=None, complement=None, zip_code=None,
+                city=None, state=None, country=None):
+        self.address_street = street
+        self.address_number = number
+        self.address_complement = complement
+        self.address_zip_code = zip_code
+        self.address_city = city
+        self.address_state = state
+        self.address_country = country
+        return self
+
+    def delivery_address(self, street=None, number=None, complement=None, zip_code=None,
+                         city=None, state=None, country=None):
+        self.delivery_street = street
+        self.delivery_number = number
+        self.delivery_complement = complement
+        self.delivery_zip_code = zip_code
+        self.delivery_city = city
+        self.delivery_state = state
+        self.delivery_country = country
+        return self
+
+    def credit_card(self, card_number, holder, expiration_date, security_code, brand,
+                    save_card=False, card_token=None):
+        self.card_number = card_number
+        self.card_holder = holder
+        self.card_expiration_date = expiration_date
+        self.card_security_code = security_code
+        self.card_brand = brand
+        self.card_save = save_card
+        self.card_token = card_token
+        return self
+
+    def payment(self, amount, installments, provider,
+                payment_type=CieloPaymentType.CreditCard,
+                currency=CieloCurrency.BRL,
+                interest=CieloPaymentInterest.ByMerchant,
+                capture=False,
+                authenticate=False,
+                service_tax_amount=0,
+                country=None,
+                soft_descriptor=None):
+        self.amount = amount
+        self.installments = installments
+        self.provider = provider
+        self.payment_type = payment_type
+        self.currency = currency
+        self.interest = interest
+        self.capture = capture
+        self.authenticate = authenticate
+        self.service_tax_amount = service_tax_amount
+        self.country = country
+        self.soft_descriptor = soft_descriptor
+        return self
+
+    def _write(self, chunk):
+        end = self._size + len(chunk)
+        # overwrites the previous request bytes, growing the buffer only when needed
+        self._buffer[self._size:end] = chunk
+        self._size = end
+
+    def _string(self, key, value, path):
+        if value is None:
+            return
+
+        limit = _LENGTH_LIMITS.get(path)
+        if limit is not None and len(value) > limit[0]:
+            raise ValidationError("%s (%s longer than %d)" % (CieloErrorsMap[str(limit[1])],
+                                                              '.'.join(path), limit[0]),
+                                  code=limit[1])
+
+        self._write(key)
+        self._write(encode_basestring_ascii(value).encode('ascii'))
+        self._write(b',')
+
+    def _integer(self, key, value):
+        if value is not None:
+            self._write(key)
+            self._write(('%d' % value).encode('ascii'))
+            self._write(b',')
+
+    def _boolean(self, key, value):
+        self._write(key)
+        self._write(b'true,' if value else b'false,')
+
+    def _close(self):
+        # drops the trailing comma of the last member
+        if self._buffer[self._size - 1] == ord(b','):
+            self._size -= 1
+        self._write(b'}')
+
+    def _address(self, key, prefix):
+        values = [getattr(self, prefix + attribute) for _, _, attribute in _ADDRESS_FIELDS]
+        if not any(value is not None for value in values):
+            return
+
+        self._write(key)
+        self._write(b'{')
+        for (field_key, field, _), value in zip(_ADDRESS_FIELDS, values):
+            self._string(field_key, value, ('Customer', key[1:-2].decode('ascii'), field))
+        self._close()
+        self._write(b',')
+
+    def serialize(self):
+        '''
+        Serializes the request as Cielo JSON
+
+        :raises: ValidationError when a field exceeds its Cielo length limit
+        :rtype: bytes
+        '''
+
+        self._size = 0
+
+        self._write(b'{')
+        self._string(b'"MerchantOrderId":', self.order_id, ('MerchantOrderId',))
+
+        self._write(b'"Customer":{')
+        self._string(b'"Name":', self.customer_name, ('Customer', 'Name'))
+        self._string(b'"Email":', self.customer_email, ('Customer', 'Email'))
+        self._string(b'"Birthdate":', self.customer_birth_date, ('Customer', 'Birthdate'))
+        self._string(b'"Identity":', self.customer_identity, ('Customer', 'Identity'))
+        self._string(b'"IdentityType":', self.customer_identity_type, ('Customer', 'IdentityType'))
+        self._address(b'"Address":', 'address_')
+        self._address(b'"DeliveryAddress":', 'delivery_')
+        self._close()
+        self._write(b',')
+
+        self._write(b'"Payment":{')
+        self._string(b'"Type":', self.payment_type, ('Payment', 'Type'))
+        self._integer(b'"Amount":', self.amount)
+        self._string(b'"Currency":', self.currency, ('Payment', 'Currency'))
+        self._string(b'"Country":', self.country, ('Payment', 'Country'))
+        self._string(b'"Provider":', self.provider, ('Payment', 'Provider'))
+        self._integer(b'"ServiceTaxAmount":', self.service_tax_amount)
+        self._integer(b'"Installments":', self.installments)
+        self._string(b'"Interest":', self.interest, ('Payment', 'Interest'))
+        self._boolean(b'"Capture":', self.capture)
+        self._boolean(b'"Authenticate":', self.authenticate)
+        self._string(b'"SoftDescriptor":', self.soft_descriptor, ('Payment', 'SoftDescriptor'))
+
+        self._write(b'"CreditCard":{')
+        self._string(b'"CardNumber":', self.card_number, ('Payment', 'CreditCard', 'CardNumber'))
+        self._string(b'"Holder":', self.card_holder, ('Payment', 'CreditCard', 'Holder'))
+        self._string(b'"ExpirationDate":', self.card_expiration_date,
+                     ('Payment', 'CreditCard', 'ExpirationDate'))
+        self._string(b'"SecurityCode":', self.card_security_code,
+                     ('Payment', 'CreditCard', 'SecurityCode'))
+        self._boolean(b'"SaveCard":', self.card_save)
+        self._string(b'"Brand":', self.card_brand, ('Payment', 'CreditCard', 'Brand'))
+        self._string(b'"CardToken":', self.card_token, ('Payment', 'CreditCard', 'CardToken'))
+        self._close()
+
+        self._close()
+        self._close()
+
+        # the HTTP stack needs immutable bytes, this is the only copy made
+        return memoryview(self._buffer)[:self._size].tobytes()
+
+    def authorize(self, cielo_ws):
+        '''
+        Sends the request as an authorization
+
+        :type: cielo_ws CieloWS
+        :rtype: CieloResponse
+        '''
+
+        return cielo_ws.authorize_body(self.serialize(), order_id=self.order_id)
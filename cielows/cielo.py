@@ -6,27 +6,448 @@
 #
 # This source code is licensed under the AGPLv3 license found in the
 # LICENSE file in the root directory of this source tree.
+import copy
+import os
+import time
+
+from cielows.constants import CieloEndpoint, CieloPaymentType, CieloPaymentStatus
+from cielows.exceptions import cielo_error, ValidationError, CieloTimeoutError
+from cielows.models import CieloFactory
+
+# clock of the deadlines, unaffected by system clock changes (python 3.3+)
+_clock = getattr(time, 'monotonic', time.time)
+
+
+class _CieloNoStage(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, error_type, error, traceback):
+        pass
+
+
+_NO_STAGE = _CieloNoStage()
+
 
 class CieloWS(object):
+
+    '''
+    Cielo webservice client
+
+    A client is thread-safe and meant to be shared: its settings are
+    not changed after __init__, calls keep their state in local
+    variables and the default CieloTransport pools connections across
+    threads. Shared archives, metrics and rate limiters lock internally.
+
+    The transport, codec and validation modules (and the HTTP stack)
+    are imported when first needed, to keep the package import cheap.
+    '''
+
     merchant_id = None
     merchant_key = None
     sandbox = False
+    transport = None
+    archive = None
+    codec = None
+    metrics = None
+    rate_limiter = None
+    timeout = None
+    profiler = None
 
-    def __init__(self, merchant_id, merchant_key, sandbox=False):
-        pass
+    def __init__(self, merchant_id, merchant_key, sandbox=False, transport=None, archive=None,
+                 codec=None, metrics=None, rate_limiter=None, timeout=None, profiler=None):
+        '''
+        The transport, codec, metrics and rate limiter may be shared
+        between clients of different merchants
 
-    def authorize(self, order_id, customer, payment):
-        pass
+        :type: merchant_id string
+        :type: merchant_key string
+        :type: sandbox bool
+        :param: transport HTTP transport, a new CieloTransport by default
+        :type: transport CieloTransport|None
+        :param: archive when set, every raw response is archived, rejected ones included
+        :type: archive CieloResponseArchive|None
+        :param: codec request/response body codec, a CieloJSONCodec by default
+        :type: codec CieloJSONCodec|None
+        :param: metrics when set, every call is recorded
+        :type: metrics CieloMetrics|None
+        :param: rate_limiter when set, throttles the requests
+        :type: rate_limiter CieloRateLimiter|None
+        :param: timeout default seconds a call may take (see
+            CieloTransport.request), no limit when None
+        :type: timeout float|None
+        :param: profiler when set, the stages of every call are profiled; the
+            clients share one when the CIELOWS_PROFILE environment variable
+            names a report file
+        :type: profiler CieloProfiler|None
+        '''
 
-    def capture(self, payment_id, amount, service_tax_amount):
-        pass
+        self.merchant_id = merchant_id
+        self.merchant_key = merchant_key
+        self.sandbox = sandbox
+        if transport is None:
+            from cielows.transport import CieloTransport
+            transport = CieloTransport()
 
-    def cancel(self, payment_id, amount):
-        pass
+        if codec is None:
+            from cielows.codec import CieloJSONCodec
+            codec = CieloJSONCodec()
 
-    def query_payment(self, payment_id):
-        pass
+        self.transport = transport
+        self.archive = archive
+        self.codec = codec
+        self.metrics = metrics
+        self.rate_limiter = rate_limiter
+        self.timeout = timeout
 
-    def query_payments(self, order_id):
-        pass
+        if profiler is None and os.environ.get('CIELOWS_PROFILE'):
+            from cielows.profiling import environment_profiler
+            profiler = environment_profiler()
+
+        self.profiler = profiler
+
+        self._headers = {
+            'Content-Type': self.codec.content_type,
+            # responses, mostly JSON text, are decompressed by the transport
+            'Accept-Encoding': 'gzip, deflate',
+            'MerchantId': merchant_id,
+            'MerchantKey': merchant_key,
+        }
+
+        if sandbox:
+            self.transaction_url = CieloEndpoint.SandboxTransaction
+            self.query_url = CieloEndpoint.SandboxQuery
+        else:
+            self.transaction_url = CieloEndpoint.Transaction
+            self.query_url = CieloEndpoint.Query
+
+    def _stage(self, operation, stage):
+        '''
+        Returns a context manager profiling a stage of a call
+        '''
+
+        if self.profiler is None:
+            return _NO_STAGE
+
+        return self.profiler.stage(operation, stage)
+
+    def _request(self, operation, method, url, payload=None, params=None, body=None,
+                 timeout=None, archive_key=None, error_archive_key=None):
+        '''
+        Sends a request to Cielo and returns the raw response
+
+        :param: operation operation name, for the metrics
+        :param: payload JSON data to encode as the request body
+        :param: body already encoded request body, used instead of payload
+        :param: timeout seconds the call may take, the client timeout when None;
+            time spent waiting on the rate limiter counts
+        :param: archive_key archive key of the response, usually the payment id
+        :param: error_archive_key archive key of error responses, archive_key when None
+        :raises: CieloAPIError when Cielo rejects the request
+        :raises: CieloTimeoutError when the call runs out of time
+        :rtype: CieloTransportResponse
+        '''
+
+        import uuid
+
+        timeout = self.timeout if timeout is None else timeout
+        deadline = None if timeout is None else _clock() + timeout
+
+        headers = dict(self._headers)
+        headers['RequestId'] = str(uuid.uuid4())
+
+        if body is None and payload is not None:
+            with self._stage(operation, 'serialization'):
+                body = self.codec.encode(payload)
+
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+
+        started = _clock()
+        try:
+            if deadline is not None:
+                timeout = deadline - started
+                if timeout <= 0:
+                    raise CieloTimeoutError("%s timed out before being sent" % operation)
+
+            with self._stage(operation, 'network'):
+                response = self.transport.request(method, url, headers, body=body, params=params,
+                                                  timeout=timeout)
+
+            if response.status_code < 400:
+                self._archive(archive_key, response)
+            else:
+                # archived before raising, rejected calls are the ones disputed
+                self._archive(error_archive_key or archive_key, response)
+
+                try:
+                    errors = [(error.get("Code"), error.get("Message"))
+                              for error in self._decode(response)]
+                except (ValueError, TypeError, AttributeError):
+                    errors = []
+
+                raise cielo_error(response.status_code, errors)
+        except Exception as error:
+            if self.metrics is not None:
+                self.metrics.record(operation, _clock() - started, error)
+            raise
+
+        if self.metrics is not None:
+            self.metrics.record(operation, _clock() - started)
+
+        return response
+
+    def _decode(self, response):
+        '''
+        Decodes the body of a raw response
+        '''
+
+        return self.codec.decode(response.body)
+
+    def _archive(self, payment_id, response):
+        if self.archive is not None and payment_id:
+            self.archive.append(payment_id, response.buffer)
+
+    def prewarm(self, connections=1, query_connections=1):
+        '''
+        Opens pooled connections to the transaction and query hosts ahead
+        of the first requests, e.g. right after a deploy
+
+        :param: connections number of connections to the transaction host
+        :type: connections int
+        :param: query_connections number of connections to the query host
+        :type: query_connections int
+        :return: number of connections opened, 0 when the transport
+            does not support prewarming
+        :rtype: int
+        '''
+
+        prewarm = getattr(self.transport, 'prewarm', None)
+        if prewarm is None:
+            return 0
+
+        opened = 0
+        if connections:
+            opened += prewarm(self.transaction_url, connections)
+        if query_connections:
+            opened += prewarm(self.query_url, query_connections)
+
+        return opened
+
+    def authorize(self, order_id, customer, payment, timeout=None):
+        '''
+        Authorizes a payment (issues it, for boletos)
+
+        :type: order_id string
+        :type: customer CieloRequestCustomer
+        :type: payment CieloRequestPayment|CieloRequestBoletoPayment
+        :param: timeout seconds the call may take, the client timeout when None
+        :raises: ValidationError when a field exceeds its Cielo length limit
+        :rtype: CieloResponse
+        '''
+
+        from cielows.validation import validate_request_json
+
+        with self._stage('authorize', 'validation'):
+            cielo_data = CieloFactory.new_request(order_id, customer, payment).to_json()
+            validate_request_json(cielo_data)
+
+        with self._stage('authorize', 'serialization'):
+            body = self.codec.encode(cielo_data)
+
+        return self.authorize_body(body, timeout=timeout, order_id=order_id)
+
+    def authorize_body(self, body, timeout=None, order_id=None):
+        '''
+        Authorizes a payment from an already encoded (and validated)
+        request body, e.g. one made by a CieloRequestBuilder
+
+        :type: body bytes
+        :type: timeout float|None
+        :param: order_id order id of the body, the archive key of rejected
+            authorizations, which have no payment id
+        :type: order_id string|None
+        :rtype: CieloResponse
+        '''
+
+        response = self._request('authorize', 'POST', self.transaction_url + '/1/sales/', body=body,
+                                 timeout=timeout, error_archive_key=order_id)
+
+        with self._stage('authorize', 'parse'):
+            cielo_response = CieloFactory.new_response(self._decode(response))
+        self._archive(cielo_response.payment.payment_id, response)
+
+        return cielo_response
+
+    def authorize_and_capture(self, order_id, customer, payment, amount=None, service_tax_amount=None,
+                              timeout=None):
+        '''
+        Authorizes and captures a credit card payment
+
+        When the whole payment is captured, the authorization is sent with
+        Capture set, in a single round trip. Partial captures (amount or
+        service_tax_amount given) are sent right after a successful
+        authorization, over the same pooled connection.
+
+        :type: order_id string
+        :type: customer CieloRequestCustomer
+        :type: payment CieloRequestPayment
+        :param: amount captured amount, the whole payment amount when None
+        :type: amount int|None
+        :type: service_tax_amount int|None
+        :param: timeout seconds both calls may take together, the client
+            timeout when None
+        :type: timeout float|None
+        :return: the authorization response, with the payment status and
+            return code updated by the capture. When the capture call fails
+            the response is returned unchanged, with status Authorized, so
+            the payment can still be captured or cancelled later.
+        :rtype: CieloResponse
+        '''
+
+        if payment.payment_type != CieloPaymentType.CreditCard:
+            raise ValidationError("only credit card payments can be captured")
+
+        if (amount is None or amount == payment.amount) and service_tax_amount is None:
+            if not payment.capture:
+                payment = copy.copy(payment)
+                payment.capture = True
+
+            return self.authorize(order_id, customer, payment, timeout=timeout)
+
+        timeout = self.timeout if timeout is None else timeout
+        deadline = None if timeout is None else _clock() + timeout
+
+        cielo_response = self.authorize(order_id, customer, payment, timeout=timeout)
+
+        if cielo_response.payment.status == CieloPaymentStatus.Authorized:
+            if deadline is not None:
+                # a timeout <= 0 would mean no limit
+                timeout = max(deadline - _clock(), 1e-6)
+
+            try:
+                capture_response = self.capture(cielo_response.payment.payment_id,
+                                                amount=amount,
+                                                service_tax_amount=service_tax_amount,
+                                                timeout=timeout)
+            except Exception:
+                # the caller must not lose the authorized payment
+                return cielo_response
+
+            cielo_response.payment.status = capture_response.status
+            cielo_response.payment.return_code = capture_response.return_code
+            cielo_response.payment.return_message = capture_response.return_message
+            if capture_response.status == CieloPaymentStatus.PaymentConfirmed:
+                cielo_response.payment.captured_amount = payment.amount if amount is None else amount
+
+        return cielo_response
+
+    def capture(self, payment_id, amount=None, service_tax_amount=None, timeout=None):
+        '''
+        Captures an authorized payment, the full amount when amount is None
+
+        :type: payment_id string
+        :type: amount int|None
+        :type: service_tax_amount int|None
+        :type: timeout float|None
+        :rtype: CieloResponsePaymentUpdate
+        '''
+
+        params = {}
+        if amount is not None:
+            params['amount'] = amount
+        if service_tax_amount is not None:
+            params['serviceTaxAmount'] = service_tax_amount
+
+        response = self._request('capture', 'PUT',
+                                 self.transaction_url + '/1/sales/%s/capture' % payment_id,
+                                 params=params, timeout=timeout, archive_key=payment_id)
+
+        with self._stage('capture', 'parse'):
+            return CieloFactory.new_response_payment_update(self._decode(response))
+
+    def cancel(self, payment_id, amount=None, timeout=None):
+        '''
+        Cancels (voids) a payment, the full amount when amount is None
+
+        :type: payment_id string
+        :type: amount int|None
+        :type: timeout float|None
+        :rtype: CieloResponsePaymentUpdate
+        '''
+
+        params = {}
+        if amount is not None:
+            params['amount'] = amount
+
+        response = self._request('cancel', 'PUT',
+                                 self.transaction_url + '/1/sales/%s/void' % payment_id,
+                                 params=params, timeout=timeout, archive_key=payment_id)
+
+        with self._stage('cancel', 'parse'):
+            return CieloFactory.new_response_payment_update(self._decode(response))
+
+    def tokenize_card(self, customer_name, credit_card, timeout=None):
+        '''
+        Saves a card on Cielo and returns its token
+
+        :type: customer_name string
+        :type: credit_card CieloRequestCreditCard
+        :type: timeout float|None
+        :return: the card token, the archive key of the response; rejected
+            tokenizations are archived under "tokenize_card"
+        :rtype: string
+        '''
+
+        payload = {
+            'CustomerName': customer_name,
+            'CardNumber': credit_card.card_number,
+            'Holder': credit_card.holder,
+            'ExpirationDate': credit_card.expiration_date,
+            'Brand': credit_card.brand,
+        }
+
+        response = self._request('tokenize_card', 'POST', self.transaction_url + '/1/card/', payload,
+                                 timeout=timeout, error_archive_key='tokenize_card')
+        with self._stage('tokenize_card', 'parse'):
+            card_token = self._decode(response)["CardToken"]
+
+        self._archive(card_token, response)
+        return card_token
+
+    def query_payment(self, payment_id, fields=None, timeout=None):
+        '''
+        Queries a payment
+
+        :type: payment_id string
+        :param: fields CieloResponsePart parts to parse, e.g. an empty
+            tuple for status checks, which then skip the customer, card
+            and links; all when None
+        :type: fields iterable|None
+        :type: timeout float|None
+        :rtype: CieloResponse
+        '''
+
+        response = self._request('query_payment', 'GET', self.query_url + '/1/sales/%s' % payment_id,
+                                 timeout=timeout, archive_key=payment_id)
+
+        with self._stage('query_payment', 'parse'):
+            return CieloFactory.new_response(self._decode(response),
+                                             None if fields is None else frozenset(fields))
+
+    def query_payments(self, order_id, timeout=None):
+        '''
+        Queries the payments of an order, archived under order_id
+
+        :type: order_id string
+        :type: timeout float|None
+        :rtype: CieloPaymentsQueryResult
+        '''
+
+        response = self._request('query_payments', 'GET', self.query_url + '/1/sales',
+                                 params={'merchantOrderId': order_id}, timeout=timeout,
+                                 archive_key=order_id)
 
+        with self._stage('query_payments', 'parse'):
+            return CieloFactory.new_payments_query_result(self._decode(response))
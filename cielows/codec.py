@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# This file is part of Python Cielo Webservice.
+#
+# Copyright (c) 2016, Rockho Team. All rights reserved.
+# Author: Christian Hess
+#
+# This source code is licensed under the AGPLv3 license found in the
+# LICENSE file in the root directory of this source tree.
+import json
+
+
+class CieloJSONCodec(object):
+
+    '''
+    Encodes Cielo JSON data to request bodies and decodes response bodies
+    '''
+
+    content_type = 'application/json'
+
+    def encode(self, cielo_data):
+        '''
+        :type: cielo_data dict
+        :rtype: bytes
+        '''
+
+        return json.dumps(cielo_data, separators=(',', ':')).encode('utf-8')
+
+    def decode(self, body):
+        '''
+        :type: body bytes
+        :rtype: dict|list
+        '''
+
+        return json.loads(body.decode('utf-8'))
@@ -6,13 +6,113 @@
 #
 # This source code is licensed under the AGPLv3 license found in the
 # LICENSE file in the root directory of this source tree.
+import six
+
+
+class CieloStringConstant(str):
+
+    '''
+    String member of a CieloConstants class
+    Members compare and hash equal to their raw values
+    '''
+
+    group = None
+    name = None
+
+    def __reduce__(self):
+        return getattr, (self.group, self.name)
+
+
+class CieloIntegerConstant(int):
+
+    '''
+    Integer member of a CieloConstants class
+    Members compare and hash equal to their raw values
+    '''
+
+    group = None
+    name = None
+
+    def __reduce__(self):
+        return getattr, (self.group, self.name)
+
+
+class _CieloConstantsType(type):
+
+    '''
+    Turns the public int and string attributes of a class into its
+    members and precomputes the value to member map
+    '''
+
+    def __new__(mcs, name, bases, attrs):
+        cls = type.__new__(mcs, name, bases, attrs)
+        cls._members = {}
+
+        for member_name, value in list(attrs.items()):
+            if member_name.startswith('_') or isinstance(value, bool):
+                continue
+
+            if isinstance(value, six.integer_types):
+                member = CieloIntegerConstant(value)
+            elif isinstance(value, six.string_types):
+                member = CieloStringConstant(value)
+            else:
+                continue
+
+            member.group = cls
+            member.name = member_name
+            cls._members[value] = member
+            setattr(cls, member_name, member)
+
+        return cls
+
+    def __iter__(cls):
+        return iter(sorted(cls._members.values()))
+
+    def __len__(cls):
+        return len(cls._members)
+
+    def __contains__(cls, value):
+        return value in cls._members
+
+
+class CieloConstants(six.with_metaclass(_CieloConstantsType, object)):
+
+    '''
+    Enum-like constants
+
+    Members are created once, so values parsed with from_value are
+    shared (and can be compared by identity) across responses
+    '''
+
+    @classmethod
+    def from_value(cls, value):
+        '''
+        Returns the member of a raw value, or the value itself when it
+        is not a member (e.g. codes added by Cielo after this release)
+        '''
+
+        return cls._members.get(value, value)
+
+
+class CieloEndpoint(object):
+    Transaction = "https://api.cieloecommerce.cielo.com.br"
+    Query = "https://apiquery.cieloecommerce.cielo.com.br"
+    SandboxTransaction = "https://apisandbox.cieloecommerce.cielo.com.br"
+    SandboxQuery = "https://apiquerysandbox.cieloecommerce.cielo.com.br"
 
 
 class CieloPaymentType(object):
     CreditCard = "CreditCard"
+    Boleto = "Boleto"
+
+
+class CieloBoletoProvider(object):
+    Bradesco = "Bradesco2"
+    BancoDoBrasil = "BancoDoBrasil2"
 
 
-class CieloCardBrand(object):
+class CieloCardBrand(CieloConstants):
     Visa = "Visa"
     Mastercard = "Mastercard"
     Amex = "Amex"
@@ -23,11 +123,39 @@ class CieloCardBrand(object):
     Discover = "Discover"
 
 
+class CieloResponsePart(object):
+    '''
+    Optional parts of a CieloResponse, see CieloWS.query_payment fields
+    '''
+    Customer = "customer"
+    CreditCard = "credit_card"
+    RecurrentPayment = "recurrent_payment"
+    Links = "links"
+    ExtraDataCollection = "extra_data_collection"
+
+
 class CieloPaymentInterest(object):
     ByMerchant = "ByMerchant"
 
 
-class CieloPaymentReturnCode(object):
+class CieloRecurrentPaymentInterval(object):
+    Monthly = "Monthly"
+    Bimonthly = "Bimonthly"
+    Quarterly = "Quarterly"
+    SemiAnnual = "SemiAnnual"
+    Annual = "Annual"
+
+
+CieloRecurrentPaymentIntervalMonths = {
+    CieloRecurrentPaymentInterval.Monthly: 1,
+    CieloRecurrentPaymentInterval.Bimonthly: 2,
+    CieloRecurrentPaymentInterval.Quarterly: 3,
+    CieloRecurrentPaymentInterval.SemiAnnual: 6,
+    CieloRecurrentPaymentInterval.Annual: 12,
+}
+
+
+class CieloPaymentReturnCode(CieloConstants):
     OperationSuccessful = '4'
     NotAuthorized = '2'
     ProblemsWithCreditCard = '70'
@@ -37,7 +165,7 @@ class CieloPaymentReturnCode(object):
     TimeOut = '99'
 
 
-class CieloPaymentStatus(object):
+class CieloPaymentStatus(CieloConstants):
     NotFinished = 0
     Authorized = 1
     PaymentConfirmed = 2
@@ -49,7 +177,16 @@ class CieloPaymentStatus(object):
     Scheduled = 20
 
 
-class CieloCurrency(object):
+class CieloNotificationChangeType(object):
+    PaymentStatus = 1
+    RecurrenceCreated = 2
+    AntifraudStatus = 3
+    RecurrentPaymentStatus = 4
+    CancellationDenied = 5
+    Chargeback = 7
+
+
+class CieloCurrency(CieloConstants):
     BRL = "BRL"
     USD = "USD"
     MXN = "MXN"
@@ -65,6 +202,24 @@ class CieloCurrency(object):
     GBP = "GBP"
 
 
+# number of minor unit digits (ISO 4217) of each currency, amounts being integers of minor units
+CieloCurrencyExponents = {
+    CieloCurrency.BRL: 2,
+    CieloCurrency.USD: 2,
+    CieloCurrency.MXN: 2,
+    CieloCurrency.COP: 2,
+    CieloCurrency.CLP: 0,
+    CieloCurrency.ARS: 2,
+    CieloCurrency.PEN: 2,
+    CieloCurrency.EUR: 2,
+    CieloCurrency.PYN: 0,
+    CieloCurrency.UYU: 2,
+    CieloCurrency.VEB: 2,
+    CieloCurrency.VEF: 2,
+    CieloCurrency.GBP: 2,
+}
+
+
 CieloErrorsMap = {
     '100': 'RequestId is required',
     '101': 'MerchantId is required',
@@ -6,13 +6,19 @@
 #
 # This source code is licensed under the AGPLv3 license found in the
 # LICENSE file in the root directory of this source tree.
+from cielows.constants import CieloErrorsMap
 
 
 class ValidationError(Exception):
     '''
     A validation error exception
+    code is the matching Cielo error code, when there is one
     '''
-    pass
+    code = None
+
+    def __init__(self, message, code=None):
+        super(ValidationError, self).__init__(message)
+        self.code = code
 
 
 class RequiredAttributeError(Exception):
@@ -23,3 +29,164 @@ class RequiredAttributeError(Exception):
 
     def __init__(self, attributes=[]):
         self.attributes = attributes
+
+
+class CieloManualReviewError(Exception):
+    '''
+    An operation may have been applied by Cielo, which could not be
+    verified: it is neither sent again nor settled as done, someone
+    must check the payment
+    '''
+
+
+class CieloChargeDeclinedError(Exception):
+    '''
+    Cielo answered a charge with a payment that is not authorized
+    (e.g. Denied or NotFinished)
+    response holds the CieloResponse
+    '''
+    response = None
+
+    def __init__(self, response):
+        self.response = response
+
+        super(CieloChargeDeclinedError, self).__init__(
+            "payment %s has status %s (return code %s)" % (response.payment.payment_id,
+                                                           response.payment.status,
+                                                           response.payment.return_code))
+
+
+class CieloRequestError(Exception):
+    '''
+    Cielo rejected a request
+    errors holds the (code, message) pairs returned by Cielo
+    '''
+    status_code = None
+    errors = []
+
+    def __init__(self, status_code, errors=[]):
+        self.status_code = status_code
+        self.errors = errors
+
+        super(CieloRequestError, self).__init__(
+            "Cielo returned HTTP %s: %s" % (status_code,
+                                            "; ".join("%s %s" % error for error in errors)))
+
+
+class CieloAPIError(CieloRequestError):
+    '''
+    Cielo rejected a request with an error code
+    Subclasses are generated for every code of CieloErrorsMap
+    (CieloError100, CieloError101...), grouped by how the failure
+    should be handled: CieloRetryableError, CieloClientError and
+    CieloMerchantConfigError
+    '''
+    code = None
+    message = None
+
+
+class CieloRetryableError(CieloAPIError):
+    '''
+    Transient failure, the request may succeed if sent again later
+    '''
+    pass
+
+
+class CieloServerError(CieloRetryableError):
+    '''
+    Cielo failed to process the request (HTTP 5xx)
+    '''
+    pass
+
+
+class CieloTimeoutError(CieloRetryableError):
+    '''
+    The call deadline passed before Cielo answered
+    The request may have reached Cielo, check the payment before
+    sending it again
+    '''
+
+    def __init__(self, message):
+        self.status_code = None
+        self.errors = []
+        Exception.__init__(self, message)
+
+
+class CieloClientError(CieloAPIError):
+    '''
+    The request is invalid and must be fixed before being sent again
+    '''
+    pass
+
+
+class CieloMerchantConfigError(CieloAPIError):
+    '''
+    The merchant credentials or settings do not allow the request
+    '''
+    pass
+
+
+CieloMerchantConfigErrorCodes = frozenset([
+    101, 114, 115, 120, 129, 131, 132, 133, 167, 300, 301, 306, 311, 314,
+])
+
+CieloRetryableErrorCodes = frozenset([
+    130, 315,
+])
+
+
+def _build_error_classes():
+    '''
+    Creates one CieloAPIError subclass per CieloErrorsMap code
+    '''
+
+    error_classes = {}
+
+    for code, message in CieloErrorsMap.items():
+        code = int(code)
+
+        if code in CieloMerchantConfigErrorCodes:
+            base = CieloMerchantConfigError
+        elif code in CieloRetryableErrorCodes:
+            base = CieloRetryableError
+        else:
+            base = CieloClientError
+
+        name = 'CieloError%d' % code
+        error_classes[code] = type(name, (base,), {'code': code,
+                                                   'message': message,
+                                                   '__doc__': message,
+                                                   '__module__': __name__})
+
+    return error_classes
+
+
+CieloErrorClasses = _build_error_classes()
+globals().update((error_class.__name__, error_class) for error_class in CieloErrorClasses.values())
+
+
+def cielo_error(status_code, errors=[]):
+    '''
+    Returns the exception for a Cielo error response, typed after its
+    first error code
+
+    :param: status_code HTTP status code
+    :type: status_code int
+    :param: errors (code, message) pairs returned by Cielo
+    :type: errors list
+    :rtype: CieloRequestError
+    '''
+
+    for code, _ in errors:
+        try:
+            error_class = CieloErrorClasses.get(int(code))
+        except (TypeError, ValueError):
+            error_class = None
+
+        if error_class is not None:
+            return error_class(status_code, errors)
+
+    if status_code >= 500:
+        return CieloServerError(status_code, errors)
+
+    return CieloClientError(status_code, errors)
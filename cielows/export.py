@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+# This file is part of Python Cielo Webservice.
+#
+# Copyright (c) 2016, Rockho Team. All rights reserved.
+# Author: Christian Hess
+#
+# This source code is licensed under the AGPLv3 license found in the
+# LICENSE file in the root directory of this source tree.
+from array import array
+import csv
+
+import six
+
+
+# 64 bits signed integers ('q' is not available on python 2 arrays)
+_INT64 = 'q' if six.PY3 else 'l'
+
+CieloPaymentExportColumns = (
+    'payment_id',
+    'tid',
+    'proof_of_sale',
+    'amount',
+    'captured_amount',
+    'status',
+    'return_code',
+    'brand',
+    'installments',
+)
+
+
+class CieloPaymentColumnBuffer(object):
+
+    '''
+    Columnar buffer of payments
+    Integer columns are kept in typed arrays and string columns
+    in plain lists, so a batch of payments costs one slot per
+    value instead of one object per payment
+    '''
+
+    def __init__(self):
+        self.payment_id = []
+        self.tid = []
+        self.proof_of_sale = []
+        self.amount = array(_INT64)
+        self.captured_amount = array(_INT64)
+        self.status = array('i')
+        self.return_code = []
+        self.brand = []
+        self.installments = array('i')
+
+    def __len__(self):
+        return len(self.payment_id)
+
+    def append(self, payment):
+        '''
+        Appends a payment to the buffer
+
+        :type: payment CieloResponsePayment
+        '''
+
+        credit_card = payment.credit_card
+
+        self.payment_id.append(payment.payment_id)
+        self.tid.append(payment.tid)
+        self.proof_of_sale.append(payment.proof_of_sale)
+        self.amount.append(payment.amount or 0)
+        self.captured_amount.append(payment.captured_amount or 0)
+        self.status.append(payment.status)
+        self.return_code.append(payment.return_code)
+        self.brand.append(credit_card.brand if credit_card else None)
+        self.installments.append(payment.installments or 0)
+
+    def clear(self):
+        '''
+        Empties all columns, keeping the buffer ready for the next batch
+        '''
+
+        self.__init__()
+
+    def columns(self):
+        '''
+        Returns the columns as (name, values) pairs in export order
+
+        :rtype: list
+        '''
+
+        return [(name, getattr(self, name)) for name in CieloPaymentExportColumns]
+
+
+class CieloCSVColumnWriter(object):
+
+    '''
+    Writes payment buffers to a CSV file, with a header
+    named after CieloPaymentExportColumns
+    '''
+
+    def __init__(self, fileobj):
+        self._writer = csv.writer(fileobj)
+        self._writer.writerow(CieloPaymentExportColumns)
+
+    def write(self, buffer):
+        self._writer.writerows(six.moves.zip(*[values for _, values in buffer.columns()]))
+
+    def close(self):
+        pass
+
+
+class CieloArrowColumnWriter(object):
+
+    '''
+    Writes payment buffers as Arrow record batches, either to an Arrow
+    IPC stream or, when parquet is True, as Parquet row groups
+
+    Requires pyarrow
+    '''
+
+    def __init__(self, where, parquet=False):
+        try:
+            import pyarrow
+        except ImportError:
+            raise ImportError("pyarrow is required to export Arrow/Parquet files")
+
+        self._pyarrow = pyarrow
+        self._schema = pyarrow.schema([
+            ('payment_id', pyarrow.string()),
+            ('tid', pyarrow.string()),
+            ('proof_of_sale', pyarrow.string()),
+            ('amount', pyarrow.int64()),
+            ('captured_amount', pyarrow.int64()),
+            ('status', pyarrow.int32()),
+            ('return_code', pyarrow.string()),
+            ('brand', pyarrow.string()),
+            ('installments', pyarrow.int32()),
+        ])
+
+        if parquet:
+            import pyarrow.parquet
+            self._writer = pyarrow.parquet.ParquetWriter(where, self._schema)
+        else:
+            self._writer = pyarrow.ipc.new_stream(where, self._schema)
+
+    def write(self, buffer):
+        pyarrow = self._pyarrow
+        arrays = [pyarrow.array(values, type=field.type)
+                  for field, (_, values) in zip(self._schema, buffer.columns())]
+
+        self._writer.write_batch(pyarrow.record_batch(arrays, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+
+class CieloPaymentExporter(object):
+
+    '''
+    Exports CieloResponsePayment objects in batches
+
+    Payments are accumulated in a CieloPaymentColumnBuffer and handed
+    to the writer every batch_size payments, so memory use depends on
+    the batch size only, never on the number of exported payments
+    '''
+
+    def __init__(self, writer, batch_size=10000):
+        '''
+        :param: writer a CieloCSVColumnWriter or CieloArrowColumnWriter
+        :param: batch_size number of payments buffered before each write
+        :type: batch_size int
+        '''
+
+        if not isinstance(batch_size, six.integer_types) or batch_size < 1:
+            raise ValueError("batch_size must be a positive integer")
+
+        self.writer = writer
+        self.batch_size = batch_size
+        self.exported = 0
+        self._buffer = CieloPaymentColumnBuffer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add(self, payment):
+        '''
+        Adds a payment to the export
+
+        :type: payment CieloResponsePayment
+        '''
+
+        self._buffer.append(payment)
+
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def add_many(self, payments):
+        '''
+        Adds every payment of an iterable to the export
+
+        :type: payments iterable of CieloResponsePayment
+        '''
+
+        for payment in payments:
+            self.add(payment)
+
+    def flush(self):
+        '''
+        Writes the buffered payments
+        '''
+
+        if len(self._buffer):
+            self.writer.write(self._buffer)
+            self.exported += len(self._buffer)
+            self._buffer.clear()
+
+    def close(self):
+        '''
+        Writes the remaining payments and closes the writer
+        '''
+
+        self.flush()
+        self.writer.close()
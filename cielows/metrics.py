@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+# This file is part of Python Cielo Webservice.
+#
+# Copyright (c) 2016, Rockho Team. All rights reserved.
+# Author: Christian Hess
+#
+# This source code is licensed under the AGPLv3 license found in the
+# LICENSE file in the root directory of this source tree.
+import threading
+
+from cielows.exceptions import CieloRetryableError, CieloClientError,\
+    CieloMerchantConfigError, CieloTimeoutError
+
+
+def classify_error(error):
+    '''
+    Returns the outcome name of a failed call
+
+    :type: error Exception
+    :rtype: string
+    '''
+
+    if isinstance(error, CieloTimeoutError):
+        return 'timeout'
+    elif isinstance(error, CieloRetryableError):
+        return 'retryable_error'
+    elif isinstance(error, CieloMerchantConfigError):
+        return 'merchant_config_error'
+    elif isinstance(error, CieloClientError):
+        return 'client_error'
+
+    return 'error'
+
+
+class CieloMetrics(object):
+
+    '''
+    Thread-safe call counters and latencies of the Cielo operations,
+    by (operation, outcome), outcome being 'ok' or an error class
+    from classify_error
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._seconds = {}
+
+    def record(self, operation, seconds, error=None):
+        '''
+        Records a call
+
+        :param: operation CieloWS method name
+        :type: operation string
+        :param: seconds call duration
+        :type: seconds float
+        :param: error exception raised by the call, if any
+        '''
+
+        key = (operation, 'ok' if error is None else classify_error(error))
+
+        with self._lock:
+            self._calls[key] = self._calls.get(key, 0) + 1
+            self._seconds[key] = self._seconds.get(key, 0.0) + seconds
+
+    def calls(self, operation=None, outcome=None):
+        '''
+        Returns the number of recorded calls matching operation and outcome
+        (all of them when None)
+        '''
+
+        with self._lock:
+            return sum(count for (key_operation, key_outcome), count in self._calls.items()
+                       if operation in (None, key_operation) and outcome in (None, key_outcome))
+
+    def snapshot(self):
+        '''
+        Returns {(operation, outcome): (calls, total seconds)}
+        '''
+
+        with self._lock:
+            return dict((key, (count, self._seconds[key])) for key, count in self._calls.items())
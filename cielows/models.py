@@ -7,9 +7,9 @@
 # This source code is licensed under the AGPLv3 license found in the
 # LICENSE file in the root directory of this source tree.
 from cielows.constants import CieloPaymentType, CieloCurrency,\
-    CieloPaymentInterest
+    CieloPaymentInterest, CieloRecurrentPaymentIntervalMonths, CieloCardBrand,\
+    CieloPaymentStatus, CieloPaymentReturnCode, CieloResponsePart
 import six
-from datetime import datetime
 from cielows.utils import validate_cc
 from cielows.exceptions import ValidationError
 
@@ -32,7 +32,33 @@ class CieloJSONParsableObject(object):
         raise NotImplementedError("Implement this method.")
 
 
-class CieloCustomerAddress(object):
+class CieloJSONSerializableObject(object):
+
+    '''
+    Cielo JSON serializable object
+    This object has capabilities to
+    dump its attributes as Cielo JSON data
+    '''
+
+    def to_json(self):
+        '''
+        Returns the attributes as Cielo JSON data
+
+        :return: Cielo REST JSON as a dictionary
+        :rtype: dict
+        '''
+        raise NotImplementedError("Implement this method.")
+
+
+def _compact(cielo_data):
+    '''
+    Drops the unset (None) values of a Cielo JSON dictionary
+    '''
+
+    return dict((key, value) for key, value in six.iteritems(cielo_data) if value is not None)
+
+
+class CieloCustomerAddress(CieloJSONSerializableObject):
     street = None
     number = None
     complement = None
@@ -50,8 +76,19 @@ class CieloCustomerAddress(object):
         self.state = state
         self.country = country
 
+    def to_json(self):
+        return _compact({
+            "Street": self.street,
+            "Number": self.number,
+            "Complement": self.complement,
+            "ZipCode": self.zip_code,
+            "City": self.city,
+            "State": self.state,
+            "Country": self.country,
+        })
+
 
-class CieloRequestCustomer(object):
+class CieloRequestCustomer(CieloJSONSerializableObject):
     name = None
     email = None
     birth_date = None
@@ -65,6 +102,15 @@ class CieloRequestCustomer(object):
         self.address = address
         self.delivery_address = delivery_address
 
+    def to_json(self):
+        return _compact({
+            "Name": self.name,
+            "Email": self.email,
+            "Birthdate": self.birth_date,
+            "Address": self.address.to_json() if self.address else None,
+            "DeliveryAddress": self.delivery_address.to_json() if self.delivery_address else None,
+        })
+
 
 class CieloResponseCustomer(CieloJSONParsableObject):
     name = None
@@ -107,7 +153,7 @@ class CieloResponseCustomer(CieloJSONParsableObject):
                 country=cielo_data["Customer"]["DeliveryAddress"].get("Country"),
             )
 
-class CieloRequestCreditCard(object):
+class CieloRequestCreditCard(CieloJSONSerializableObject):
     card_number = None
     holder = None
     expiration_date = None
@@ -133,6 +179,17 @@ class CieloRequestCreditCard(object):
         self.save_card = save_card
         self.card_token = card_token
 
+    def to_json(self):
+        return _compact({
+            "CardNumber": self.card_number,
+            "Holder": self.holder,
+            "ExpirationDate": self.expiration_date,
+            "SecurityCode": self.security_code,
+            "SaveCard": self.save_card,
+            "Brand": self.brand,
+            "CardToken": self.card_token,
+        })
+
 class CieloResponseCreditCard(CieloJSONParsableObject):
     card_number = None
     holder = None
@@ -150,7 +207,7 @@ class CieloResponseCreditCard(CieloJSONParsableObject):
         self.holder = cielo_data["Payment"]["CreditCard"].get("Holder")
         self.expiration_date = cielo_data["Payment"]["CreditCard"].get("ExpirationDate")
         self.security_code = cielo_data["Payment"]["CreditCard"].get("SecurityCode")
-        self.brand = cielo_data["Payment"]["CreditCard"].get("Brand")
+        self.brand = CieloCardBrand.from_value(cielo_data["Payment"]["CreditCard"].get("Brand"))
         self.save_card = cielo_data["Payment"]["CreditCard"].get("SaveCard")
         self.card_token = cielo_data["Payment"]["CreditCard"].get("CardToken")
 
@@ -165,7 +222,86 @@ class CieloPaymentLink(object):
         self.href = href
 
 
-class CieloRequestPayment(object):
+class CieloValueInterner(object):
+
+    '''
+    Shares one instance of the values repeated across the models built
+    in a batch (providers, countries, boleto instructions, ...), which
+    are then meant to be read only
+    '''
+
+    def __init__(self):
+        self._values = {}
+
+    def __call__(self, value):
+        # other values (None, objects such as a boleto Address) are not shared
+        if not isinstance(value, six.string_types):
+            return value
+
+        return self._values.setdefault(value, value)
+
+    def link(self, method, rel, href):
+        '''
+        Returns a CieloPaymentLink sharing its method and rel
+
+        Hrefs hold the payment id, so they are never shared.
+
+        :rtype: CieloPaymentLink
+        '''
+
+        return CieloFactory.new_payment_link(self(method), self(rel), href)
+
+
+def _identity(value):
+    return value
+
+
+class CieloRequestRecurrentPayment(CieloJSONSerializableObject):
+    authorize_now = True
+    start_date = None
+    end_date = None
+    interval = None
+
+    def __init__(self, authorize_now, start_date, end_date, interval):
+        self.authorize_now = authorize_now
+        self.start_date = start_date
+        self.end_date = end_date
+        self.interval = interval
+
+    def to_json(self):
+        return _compact({
+            "AuthorizeNow": self.authorize_now,
+            "StartDate": self.start_date,
+            "EndDate": self.end_date,
+            "Interval": self.interval,
+        })
+
+
+class CieloResponseRecurrentPayment(CieloJSONParsableObject):
+    recurrent_payment_id = None
+    reason_code = None
+    reason_message = None
+    next_recurrency = None
+    start_date = None
+    end_date = None
+    interval = None
+
+    def __init__(self, cielo_data):
+        self.from_json(cielo_data)
+
+    def from_json(self, cielo_data):
+        recurrent_payment = cielo_data["Payment"]["RecurrentPayment"]
+
+        self.recurrent_payment_id = recurrent_payment.get("RecurrentPaymentId")
+        self.reason_code = recurrent_payment.get("ReasonCode")
+        self.reason_message = recurrent_payment.get("ReasonMessage")
+        self.next_recurrency = recurrent_payment.get("NextRecurrency")
+        self.start_date = recurrent_payment.get("StartDate")
+        self.end_date = recurrent_payment.get("EndDate")
+        self.interval = recurrent_payment.get("Interval")
+
+
+class CieloRequestPayment(CieloJSONSerializableObject):
     amount = 0
     installments = 0
     credit_card = None
@@ -178,6 +314,7 @@ class CieloRequestPayment(object):
     capture = False
     authenticate = False
     soft_descriptor = None
+    recurrent_payment = None
 
     def __init__(self,
                  amount,
@@ -191,13 +328,14 @@ class CieloRequestPayment(object):
                  country,
                  provider,
                  service_tax_amount,
-                 soft_descriptor):
+                 soft_descriptor,
+                 recurrent_payment=None):
 
         self.amount = amount
         self.installments = installments
         self.credit_card = credit_card
         self.payment_type = payment_type
-        self.intereset = interest
+        self.interest = interest
         self.capture = capture
         self.authenticate = authenticate
         self.currency = currency
@@ -205,6 +343,24 @@ class CieloRequestPayment(object):
         self.provider = provider
         self.service_tax_amount = service_tax_amount
         self.soft_descriptor = soft_descriptor
+        self.recurrent_payment = recurrent_payment
+
+    def to_json(self):
+        return _compact({
+            "Type": self.payment_type,
+            "Amount": self.amount,
+            "Currency": self.currency,
+            "Country": self.country,
+            "Provider": self.provider,
+            "ServiceTaxAmount": self.service_tax_amount,
+            "Installments": self.installments,
+            "Interest": self.interest,
+            "Capture": self.capture,
+            "Authenticate": self.authenticate,
+            "SoftDescriptor": self.soft_descriptor,
+            "CreditCard": self.credit_card.to_json() if self.credit_card else None,
+            "RecurrentPayment": self.recurrent_payment.to_json() if self.recurrent_payment else None,
+        })
 
 
 class CieloResponsePayment(CieloJSONParsableObject):
@@ -214,6 +370,9 @@ class CieloResponsePayment(CieloJSONParsableObject):
     capture = False
     authenticate = False
     credit_card = None
+    provider = None
+    soft_descriptor = None
+    recurrent_payment = None
     proof_of_sale = None
     tid = None
     authorization_code = None
@@ -228,35 +387,165 @@ class CieloResponsePayment(CieloJSONParsableObject):
     links = []
     amount = 0
     captured_amount = 0
+    voided_amount = None
+
+    def __init__(self, cielo_data, fields=None, interner=None):
+        self.from_json(cielo_data, fields, interner)
+
+    def from_json(self, cielo_data, fields=None, interner=None):
+        '''
+        :param: fields CieloResponsePart parts to parse, all when None;
+            the payment attributes themselves are always parsed
+        :param: interner when set, shares the repeated values and links
+            with the other models it builds
+        :type: interner CieloValueInterner|None
+        '''
+
+        payment = cielo_data["Payment"]
+        intern = interner or _identity
+
+        if payment.get("CreditCard") and \
+                (fields is None or CieloResponsePart.CreditCard in fields):
+            self.credit_card = CieloFactory.new_response_credit_card(cielo_data)
+
+        if payment.get("RecurrentPayment") and \
+                (fields is None or CieloResponsePart.RecurrentPayment in fields):
+            self.recurrent_payment = CieloFactory.new_response_recurrent_payment(cielo_data)
+
+        self.service_tax_amount = int(payment.get("ServiceTaxAmount", 0))
+        self.installments = int(payment.get("Installments", 0))
+        self.interest = intern(payment.get("Interest"))
+        self.capture = payment.get("Capture")
+        self.authenticate = payment.get("Authenticate")
+        self.proof_of_sale = payment.get("ProofOfSale")
+        self.tid = payment.get("Tid")
+        self.authorization_code = payment.get("AuthorizationCode")
+        self.payment_id = payment.get("PaymentId")
+        self.payment_type = intern(payment.get("Type"))
+        self.currency = CieloCurrency.from_value(payment.get("Currency"))
+        self.country = intern(payment.get("Country"))
+        self.provider = intern(payment.get("Provider"))
+        self.soft_descriptor = intern(payment.get("SoftDescriptor"))
+        self.status = CieloPaymentStatus.from_value(int(payment.get("Status", -1)))
+        self.return_code = CieloPaymentReturnCode.from_value(payment.get("ReturnCode"))
+        self.return_message = intern(payment.get("ReturnMessage"))
+        self.amount = int(payment.get("Amount", 0))
+        self.captured_amount = int(payment.get("CapturedAmount", 0))
+        if payment.get("VoidedAmount") is not None:
+            self.voided_amount = int(payment["VoidedAmount"])
+
+        if fields is None or CieloResponsePart.Links in fields:
+            new_link = CieloFactory.new_payment_link if interner is None else interner.link
+            self.links = [new_link(link["Method"], link["Rel"], link["Href"])
+                          for link in payment.get("Links", [])]
+
+        if fields is None or CieloResponsePart.ExtraDataCollection in fields:
+            self.extra_data_collection = payment.get("ExtraDataCollection", [])
+
+
+class CieloResponsePaymentUpdate(CieloJSONParsableObject):
+
+    '''
+    Cielo response of a payment capture or void
+    '''
+
+    status = -1
+    reason_code = None
+    reason_message = None
+    provider_return_code = None
+    provider_return_message = None
+    return_code = None
+    return_message = None
+    links = []
 
     def __init__(self, cielo_data):
         self.from_json(cielo_data)
 
     def from_json(self, cielo_data):
-        self.credit_card = CieloFactory.new_response_credit_card(cielo_data)
-
-        self.service_tax_amount = int(cielo_data["Payment"].get("ServiceTaxAmount"))
-        self.installments = int(cielo_data["Payment"].get("Installments"))
-        self.interest = cielo_data["Payment"].get("Interest")
-        self.capture = cielo_data["Payment"].get("Capture")
-        self.authenticate = cielo_data["Payment"].get("Authenticate")
-        self.proof_of_sale = cielo_data["Payment"].get("ProofOfSale")
-        self.tid = cielo_data["Payment"].get("Tid")
-        self.authorization_code = cielo_data["Payment"].get("AuthorizationCode")
-        self.payment_id = cielo_data["Payment"].get("PaymentId")
-        self.payment_type = cielo_data["Payment"].get("Type")
-        self.currency = cielo_data["Payment"].get("Currency")
-        self.country = cielo_data["Payment"].get("Country")
-        self.status = int(cielo_data["Payment"].get("Status"))
-        self.return_code = cielo_data["Payment"].get("ReturnCode")
-        self.return_message = cielo_data["Payment"].get("ReturnMessage")
-        self.amount = int(cielo_data["Payment"].get("Amount"))
-        self.captured_amount = int(cielo_data["Payment"].get("CapturedAmount"))
+        self.status = CieloPaymentStatus.from_value(int(cielo_data.get("Status", -1)))
+        self.reason_code = cielo_data.get("ReasonCode")
+        self.reason_message = cielo_data.get("ReasonMessage")
+        self.provider_return_code = cielo_data.get("ProviderReturnCode")
+        self.provider_return_message = cielo_data.get("ProviderReturnMessage")
+        self.return_code = CieloPaymentReturnCode.from_value(cielo_data.get("ReturnCode"))
+        self.return_message = cielo_data.get("ReturnMessage")
 
         self.links = [CieloFactory.new_payment_link(link["Method"], link["Rel"], link["Href"]) \
-                        for link in cielo_data["Payment"].get("Links", [])]
+                        for link in cielo_data.get("Links", [])]
+
+
+class CieloRequestBoletoPayment(CieloJSONSerializableObject):
+    amount = 0
+    provider = None
+    payment_type = CieloPaymentType.Boleto
+    boleto_number = None
+    assignor = None
+    demonstrative = None
+    expiration_date = None
+    identification = None
+    instructions = None
+
+    def __init__(self,
+                 amount,
+                 provider,
+                 boleto_number,
+                 assignor,
+                 demonstrative,
+                 expiration_date,
+                 identification,
+                 instructions):
+
+        self.amount = amount
+        self.provider = provider
+        self.boleto_number = boleto_number
+        self.assignor = assignor
+        self.demonstrative = demonstrative
+        self.expiration_date = expiration_date
+        self.identification = identification
+        self.instructions = instructions
+
+    def to_json(self):
+        return _compact({
+            "Type": self.payment_type,
+            "Amount": self.amount,
+            "Provider": self.provider,
+            "BoletoNumber": self.boleto_number,
+            "Assignor": self.assignor,
+            "Demonstrative": self.demonstrative,
+            "ExpirationDate": self.expiration_date,
+            "Identification": self.identification,
+            "Instructions": self.instructions,
+        })
+
+
+class CieloResponseBoletoPayment(CieloResponsePayment):
+    url = None
+    bar_code_number = None
+    digitable_line = None
+    boleto_number = None
+    assignor = None
+    demonstrative = None
+    expiration_date = None
+    identification = None
+    instructions = None
+    address = None
 
-        self.extra_data_collection = cielo_data["Payment"].get("ExtraDataCollection", [])
+    def from_json(self, cielo_data, fields=None, interner=None):
+        super(CieloResponseBoletoPayment, self).from_json(cielo_data, fields, interner)
+
+        payment = cielo_data["Payment"]
+        intern = interner or _identity
+
+        self.url = payment.get("Url")
+        self.bar_code_number = payment.get("BarCodeNumber")
+        self.digitable_line = payment.get("DigitableLine")
+        self.boleto_number = payment.get("BoletoNumber")
+        self.assignor = intern(payment.get("Assignor"))
+        self.demonstrative = intern(payment.get("Demonstrative"))
+        self.expiration_date = intern(payment.get("ExpirationDate"))
+        self.identification = intern(payment.get("Identification"))
+        self.instructions = intern(payment.get("Instructions"))
+        self.address = intern(payment.get("Address"))
 
 
 class CieloPaymentsQueryResult(CieloJSONParsableObject):
@@ -276,10 +565,33 @@ class CieloPaymentsQueryResult(CieloJSONParsableObject):
         self.from_json(cielo_data)
 
     def from_json(self, cielo_data):
-        pass
+        # Cielo misspells ReceivedDate as ReceveidDate
+        self.payments = [self.CieloPaymentQueryResult(payment["PaymentId"],
+                                                      payment.get("ReceivedDate",
+                                                                  payment.get("ReceveidDate")))
+                         for payment in cielo_data.get("Payments", [])]
+
+
+class CieloNotification(CieloJSONParsableObject):
+
+    '''
+    Cielo change notification (sent to the merchant notification URL)
+    '''
+
+    payment_id = None
+    change_type = None
+    recurrent_payment_id = None
+
+    def __init__(self, cielo_data):
+        self.from_json(cielo_data)
+
+    def from_json(self, cielo_data):
+        self.payment_id = cielo_data.get("PaymentId")
+        self.change_type = int(cielo_data["ChangeType"])
+        self.recurrent_payment_id = cielo_data.get("RecurrentPaymentId")
 
 
-class CieloRequest(object):
+class CieloRequest(CieloJSONSerializableObject):
     order_id = None
     customer = None
     payment = None
@@ -289,16 +601,37 @@ class CieloRequest(object):
         self.customer = customer
         self.payment = payment
 
+    def to_json(self):
+        return _compact({
+            "MerchantOrderId": self.order_id,
+            "Customer": self.customer.to_json() if self.customer else None,
+            "Payment": self.payment.to_json() if self.payment else None,
+        })
+
 class CieloResponse(CieloJSONParsableObject):
     order_id = None
     customer = None
     payment = None
 
-    def __init__(self, cielo_data):
-        self.from_json(cielo_data)
+    def __init__(self, cielo_data, fields=None):
+        self.from_json(cielo_data, fields)
 
-    def from_json(self, cielo_data):
-        pass
+    def from_json(self, cielo_data, fields=None):
+        '''
+        :param: fields CieloResponsePart parts to parse, all when None;
+            the order id and payment attributes are always parsed
+        '''
+
+        self.order_id = cielo_data.get("MerchantOrderId")
+
+        if cielo_data.get("Customer") and (fields is None or CieloResponsePart.Customer in fields):
+            self.customer = CieloFactory.new_response_customer(cielo_data)
+
+        if cielo_data.get("Payment"):
+            if cielo_data["Payment"].get("Type") == CieloPaymentType.Boleto:
+                self.payment = CieloFactory.new_response_boleto_payment(cielo_data, fields)
+            else:
+                self.payment = CieloFactory.new_response_payment(cielo_data, fields)
 
 
 class CieloFactory(object):
@@ -334,6 +667,8 @@ class CieloFactory(object):
             if not isinstance(birth_date, six.string_types):
                 raise TypeError("birth_date must be a string")
 
+            from datetime import datetime
+
             # convert string to datetime.. it must not throw exceptions..
             datetime.strptime(birth_date, '%Y-%m-%d')
 
@@ -441,6 +776,8 @@ class CieloFactory(object):
         elif not isinstance(expiration_date, six.string_types):
             raise TypeError("expiration_date must be a string")
 
+        from datetime import datetime
+
         # convert string to datetime.. it must not throw exceptions..
         datetime.strptime(expiration_date, '%m/%Y')
 
@@ -452,6 +789,34 @@ class CieloFactory(object):
                                       save_card=save_card,
                                       card_token=card_token)
 
+    @staticmethod
+    def new_request_token_credit_card(card_token, brand, security_code=None):
+        '''
+        Creates a new CieloRequestCreditCard object that refers to
+        a saved card by its token instead of the card data
+
+        :type: card_token string
+        :type: brand CieloCardBrand
+        :type: security_code string|None
+        '''
+
+        if not isinstance(card_token, six.string_types):
+            raise TypeError("card_token must be a string")
+
+        elif not isinstance(brand, six.string_types):
+            raise TypeError("brand must be a string")
+
+        elif security_code and not isinstance(security_code, six.string_types):
+            raise TypeError("security_code must be a string")
+
+        return CieloRequestCreditCard(card_number=None,
+                                      holder=None,
+                                      expiration_date=None,
+                                      security_code=security_code,
+                                      brand=brand,
+                                      save_card=False,
+                                      card_token=card_token)
+
 
     @staticmethod
     def new_response_credit_card(cielo_data):
@@ -471,28 +836,251 @@ class CieloFactory(object):
                             provider,
                             payment_type=CieloPaymentType.CreditCard,
                             currency=CieloCurrency.BRL,
-                            intereset=CieloPaymentInterest.ByMerchant,
+                            interest=CieloPaymentInterest.ByMerchant,
                             capture=False,
                             authenticate=False,
-                            service_tax_amount=0):
+                            service_tax_amount=0,
+                            country=None,
+                            soft_descriptor=None,
+                            recurrent_payment=None):
         '''
         Creates a new CieloRequestPayment object
 
+        :param: amount amount in cents
+        :type: amount int
+        :type: installments int
+        :type: credit_card CieloRequestCreditCard
+        :type: provider string
+        :type: payment_type CieloPaymentType
+        :type: currency CieloCurrency
+        :type: interest CieloPaymentInterest
+        :type: capture bool
+        :type: authenticate bool
+        :type: service_tax_amount int
+        :type: country string|None
+        :type: soft_descriptor string|None
+        :type: recurrent_payment CieloRequestRecurrentPayment|None
+        '''
+
+        if not isinstance(amount, six.integer_types):
+            raise TypeError("amount must be an int")
+
+        elif not isinstance(installments, six.integer_types):
+            raise TypeError("installments must be an int")
+
+        elif not isinstance(service_tax_amount, six.integer_types):
+            raise TypeError("service_tax_amount must be an int")
+
+        elif payment_type != CieloPaymentType.CreditCard:
+            raise ValidationError("invalid payment type")
+
+        elif not isinstance(credit_card, CieloRequestCreditCard):
+            raise ValidationError("invalid credit card object")
+
+        elif not isinstance(provider, six.string_types):
+            raise TypeError("provider must be a string")
+
+        elif not isinstance(capture, bool):
+            raise TypeError("capture must be a boolean")
+
+        elif not isinstance(authenticate, bool):
+            raise TypeError("authenticate must be a boolean")
+
+        elif country and not isinstance(country, six.string_types):
+            raise TypeError("country must be a string")
+
+        elif soft_descriptor and not isinstance(soft_descriptor, six.string_types):
+            raise TypeError("soft_descriptor must be a string")
+
+        elif recurrent_payment and not isinstance(recurrent_payment, CieloRequestRecurrentPayment):
+            raise TypeError("recurrent_payment must be a CieloRequestRecurrentPayment instance")
+
+        return CieloRequestPayment(amount=amount,
+                                   installments=installments,
+                                   credit_card=credit_card,
+                                   payment_type=payment_type,
+                                   interest=interest,
+                                   capture=capture,
+                                   authenticate=authenticate,
+                                   currency=currency,
+                                   country=country,
+                                   provider=provider,
+                                   service_tax_amount=service_tax_amount,
+                                   soft_descriptor=soft_descriptor,
+                                   recurrent_payment=recurrent_payment)
+
+    @staticmethod
+    def new_request_recurrent_payment(interval,
+                                      authorize_now=True,
+                                      start_date=None,
+                                      end_date=None):
+        '''
+        Creates a new CieloRequestRecurrentPayment object
+
+        :type: interval CieloRecurrentPaymentInterval
+        :param: authorize_now whether the first payment is authorized right away
+        :type: authorize_now bool
+        :param: start_date first payment date in format 'YYYY-MM-DD', when not authorized now
+        :type: start_date string|None
+        :param: end_date last payment date in format 'YYYY-MM-DD'
+        :type: end_date string|None
+        '''
+
+        if interval not in CieloRecurrentPaymentIntervalMonths:
+            raise ValidationError("invalid recurrent payment interval")
+
+        elif not isinstance(authorize_now, bool):
+            raise TypeError("authorize_now must be a boolean")
+
+        for date in (start_date, end_date):
+            if date:
+                if not isinstance(date, six.string_types):
+                    raise TypeError("start_date and end_date must be strings")
+
+                from datetime import datetime
+
+                # convert string to datetime.. it must not throw exceptions..
+                datetime.strptime(date, '%Y-%m-%d')
+
+        return CieloRequestRecurrentPayment(authorize_now=authorize_now,
+                                            start_date=start_date,
+                                            end_date=end_date,
+                                            interval=interval)
+
+    @staticmethod
+    def new_response_recurrent_payment(cielo_data):
+        '''
+        Creates a new CieloResponseRecurrentPayment object
+
+        :param: cielo_data Cielo JSON data
+        :type: cielo_data dict|None
         '''
 
-        pass
+        return CieloResponseRecurrentPayment(cielo_data)
 
     @staticmethod
-    def new_response_payment(cielo_data):
+    def new_response_payment(cielo_data, fields=None):
         '''
         Creates a new CieloResponsePayment object
 
         :param: cielo_data Cielo JSON data
         :type: cielo_data dict|None
+        :param: fields CieloResponsePart parts to parse, all when None
+        :type: fields set|None
         '''
 
-        return CieloResponsePayment(cielo_data)
+        return CieloResponsePayment(cielo_data, fields)
+
+    @staticmethod
+    def new_response_payments(cielo_data, fields=None, interner=None):
+        '''
+        Creates CieloResponsePayment objects (CieloResponseBoletoPayment
+        for boletos) from many Cielo JSON data, in one pass
+
+        The payments share one instance of their repeated values and
+        payment links, so bulk loads take less memory.
+
+        :param: cielo_data Cielo JSON data (dicts) or JSON lines, e.g. a
+            JSON lines file; blank lines are skipped
+        :type: cielo_data iterable
+        :param: fields CieloResponsePart parts to parse, all when None
+        :type: fields set|None
+        :param: interner interner shared with other batches, a new one when None
+        :type: interner CieloValueInterner|None
+        :rtype: list
+        '''
+
+        import json
+
+        interner = interner or CieloValueInterner()
+        payments = []
 
+        for payment_data in cielo_data:
+            if isinstance(payment_data, bytes):
+                payment_data = payment_data.decode('utf-8')
+
+            if isinstance(payment_data, six.string_types):
+                if not payment_data.strip():
+                    continue
+                payment_data = json.loads(payment_data)
+
+            if payment_data["Payment"].get("Type") == CieloPaymentType.Boleto:
+                payments.append(CieloResponseBoletoPayment(payment_data, fields, interner))
+            else:
+                payments.append(CieloResponsePayment(payment_data, fields, interner))
+
+        return payments
+
+
+    @staticmethod
+    def new_request_boleto_payment(amount,
+                                   provider,
+                                   expiration_date=None,
+                                   boleto_number=None,
+                                   assignor=None,
+                                   demonstrative=None,
+                                   identification=None,
+                                   instructions=None):
+        '''
+        Creates a new CieloRequestBoletoPayment object
+
+        :param: amount amount in cents
+        :type: amount int
+        :type: provider CieloBoletoProvider
+        :param: expiration_date due date in format 'YYYY-MM-DD'
+        :type: expiration_date string|None
+        :type: boleto_number string|None
+        :type: assignor string|None
+        :type: demonstrative string|None
+        :param: identification assignor CNPJ
+        :type: identification string|None
+        :type: instructions string|None
+        '''
+
+        if not isinstance(amount, six.integer_types):
+            raise TypeError("amount must be an int")
+
+        elif not isinstance(provider, six.string_types):
+            raise TypeError("provider must be a string")
+
+        for name, value in (("boleto_number", boleto_number),
+                            ("assignor", assignor),
+                            ("demonstrative", demonstrative),
+                            ("identification", identification),
+                            ("instructions", instructions)):
+            if value and not isinstance(value, six.string_types):
+                raise TypeError("%s must be a string" % name)
+
+        if expiration_date:
+            if not isinstance(expiration_date, six.string_types):
+                raise TypeError("expiration_date must be a string")
+
+            from datetime import datetime
+
+            # convert string to datetime.. it must not throw exceptions..
+            datetime.strptime(expiration_date, '%Y-%m-%d')
+
+        return CieloRequestBoletoPayment(amount=amount,
+                                         provider=provider,
+                                         boleto_number=boleto_number,
+                                         assignor=assignor,
+                                         demonstrative=demonstrative,
+                                         expiration_date=expiration_date,
+                                         identification=identification,
+                                         instructions=instructions)
+
+    @staticmethod
+    def new_response_boleto_payment(cielo_data, fields=None):
+        '''
+        Creates a new CieloResponseBoletoPayment object
+
+        :param: cielo_data Cielo JSON data
+        :type: cielo_data dict|None
+        :param: fields CieloResponsePart parts to parse, all when None
+        :type: fields set|None
+        '''
+
+        return CieloResponseBoletoPayment(cielo_data, fields)
 
     @staticmethod
     def new_payments_query_result(cielo_data):
@@ -503,7 +1091,38 @@ class CieloFactory(object):
         :type: cielo_data dict|None
         '''
 
-        pass
+        return CieloPaymentsQueryResult(cielo_data)
+
+    @staticmethod
+    def new_response_payment_update(cielo_data):
+        '''
+        Creates a new CieloResponsePaymentUpdate object
+
+        :param: cielo_data Cielo JSON data
+        :type: cielo_data dict|None
+        '''
+
+        return CieloResponsePaymentUpdate(cielo_data)
+
+    @staticmethod
+    def new_notification(cielo_data):
+        '''
+        Creates a new CieloNotification object
+
+        :param: cielo_data Cielo JSON data
+        :type: cielo_data dict
+        '''
+
+        if not cielo_data or not isinstance(cielo_data, dict):
+            raise TypeError("cielo_data must be a valid dictionary")
+
+        elif "ChangeType" not in cielo_data:
+            raise ValidationError("ChangeType is required")
+
+        elif not cielo_data.get("PaymentId") and not cielo_data.get("RecurrentPaymentId"):
+            raise ValidationError("PaymentId or RecurrentPaymentId is required")
+
+        return CieloNotification(cielo_data)
 
     @staticmethod
     def new_payment_link(method, rel, href):
@@ -538,18 +1157,38 @@ class CieloFactory(object):
         return CieloRequest(order_id, cielo_customer, cielo_payment)
 
     @staticmethod
-    def new_response(cielo_data):
+    def new_response(cielo_data, fields=None):
         '''
         Creates a new CieloResponse object
 
         :param: cielo_data Cielo JSON data
         :type: cielo_data dict|None
+        :param: fields CieloResponsePart parts to parse, all when None
+        :type: fields set|None
         '''
         
-        return CieloResponse(cielo_data)
+        return CieloResponse(cielo_data, fields)
 
 
     @staticmethod
-    def new_webservice(merchant_id, merchant_key, sandbox=False):
-        pass
+    def new_webservice(merchant_id, merchant_key, sandbox=False, **kwargs):
+        '''
+        Creates a new CieloWS object
+        The client is thread-safe, a single one may serve every thread
+
+        :type: merchant_id string
+        :type: merchant_key string
+        :type: sandbox bool
+        :param: kwargs extra CieloWS options (transport, archive)
+        '''
+
+        from cielows.cielo import CieloWS
+
+        if not isinstance(merchant_id, six.string_types):
+            raise TypeError("merchant_id must be a string")
+
+        elif not isinstance(merchant_key, six.string_types):
+            raise TypeError("merchant_key must be a string")
+
+        return CieloWS(merchant_id, merchant_key, sandbox=sandbox, **kwargs)
 
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+# This file is part of Python Cielo Webservice.
+#
+# Copyright (c) 2016, Rockho Team. All rights reserved.
+# Author: Christian Hess
+#
+# This source code is licensed under the AGPLv3 license found in the
+# LICENSE file in the root directory of this source tree.
+import threading
+
+import six
+
+from cielows.constants import CieloCurrency, CieloCurrencyExponents
+
+
+# minor units in one major unit, per currency
+_FACTORS = dict((currency, 10 ** exponent)
+                for currency, exponent in six.iteritems(CieloCurrencyExponents))
+
+
+def _exponent(currency):
+    try:
+        return CieloCurrencyExponents[currency]
+    except KeyError:
+        raise ValueError("unknown currency %r" % (currency,))
+
+
+class CieloMoney(tuple):
+
+    '''
+    Immutable amount of money: an int of minor units (cents for BRL)
+    and a CieloCurrency
+
+    Amounts only add to (or compare with) amounts of the same currency.
+    Being immutable, they are safely shared between threads.
+    '''
+
+    __slots__ = ()
+
+    def __new__(cls, amount, currency=CieloCurrency.BRL):
+        '''
+        :param: amount amount in minor units
+        :type: amount int
+        :type: currency CieloCurrency
+        :raises: ValueError when the currency is unknown
+        '''
+
+        if not isinstance(amount, six.integer_types):
+            raise TypeError("amount must be an int")
+
+        _exponent(currency)
+
+        return tuple.__new__(cls, (amount, currency))
+
+    amount = property(lambda self: self[0])
+    currency = property(lambda self: self[1])
+
+    @classmethod
+    def from_decimal(cls, value, currency=CieloCurrency.BRL):
+        '''
+        Returns the amount of a value in major units, e.g. Decimal('12.34')
+
+        :type: value Decimal|int|string
+        :type: currency CieloCurrency
+        :raises: ValueError when value has more digits than the currency minor unit
+        :rtype: CieloMoney
+        '''
+
+        from decimal import Decimal
+
+        amount = Decimal(value).scaleb(_exponent(currency))
+
+        if amount != amount.to_integral_value():
+            raise ValueError("%s has more than %d decimal places" % (value, _exponent(currency)))
+
+        return cls(int(amount), currency)
+
+    def to_decimal(self):
+        '''
+        :return: the amount in major units
+        :rtype: Decimal
+        '''
+
+        from decimal import Decimal
+
+        return Decimal(self[0]).scaleb(-CieloCurrencyExponents[self[1]])
+
+    def _check(self, other):
+        if not isinstance(other, CieloMoney):
+            raise TypeError("%r is not a CieloMoney" % (other,))
+
+        if other[1] != self[1]:
+            raise ValueError("cannot mix %s and %s amounts" % (self[1], other[1]))
+
+    def __add__(self, other):
+        self._check(other)
+        return CieloMoney(self[0] + other[0], self[1])
+
+    def __sub__(self, other):
+        self._check(other)
+        return CieloMoney(self[0] - other[0], self[1])
+
+    def __mul__(self, factor):
+        if not isinstance(factor, six.integer_types):
+            raise TypeError("amounts are only multiplied by ints")
+
+        return CieloMoney(self[0] * factor, self[1])
+
+    __rmul__ = __mul__
+
+    def __neg__(self):
+        return CieloMoney(-self[0], self[1])
+
+    def __lt__(self, other):
+        self._check(other)
+        return self[0] < other[0]
+
+    def __le__(self, other):
+        self._check(other)
+        return self[0] <= other[0]
+
+    def __gt__(self, other):
+        self._check(other)
+        return self[0] > other[0]
+
+    def __ge__(self, other):
+        self._check(other)
+        return self[0] >= other[0]
+
+    def __bool__(self):
+        return self[0] != 0
+
+    __nonzero__ = __bool__
+
+    def __repr__(self):
+        return "CieloMoney(%d, %r)" % (self[0], str(self[1]))
+
+    def __str__(self):
+        amount, currency = self
+        exponent = CieloCurrencyExponents[currency]
+        units, minor = divmod(abs(amount), _FACTORS[currency])
+
+        return "%s%s %d%s" % ('-' if amount < 0 else '', currency, units,
+                              '.%0*d' % (exponent, minor) if exponent else '')
+
+
+def payment_money(payment, field='amount'):
+    '''
+    Returns an amount of a payment, e.g. its captured_amount, as CieloMoney
+
+    Payments without currency are in BRL, the Cielo default.
+
+    :type: payment CieloRequestPayment|CieloResponsePayment
+    :type: field string
+    :rtype: CieloMoney
+    '''
+
+    return CieloMoney(getattr(payment, field) or 0, payment.currency or CieloCurrency.BRL)
+
+
+def sum_amounts(payments, field='captured_amount'):
+    '''
+    Sums an amount of many payments, per currency
+
+    Amounts are summed as plain ints, CieloMoney objects being only made
+    for the totals.
+
+    :type: payments iterable of CieloResponsePayment
+    :param: field amount attribute summed
+    :type: field string
+    :return: the totals by currency
+    :rtype: dict
+    '''
+
+    totals = {}
+    default = CieloCurrency.BRL
+
+    for payment in payments:
+        amount = getattr(payment, field)
+        if amount:
+            currency = payment.currency or default
+            totals[currency] = totals.get(currency, 0) + amount
+
+    return dict((currency, CieloMoney(amount, currency))
+                for currency, amount in six.iteritems(totals))
+
+
+class CieloMoneyTotals(object):
+
+    '''
+    Thread-safe totals of an amount of payments, per currency, e.g.
+    the captured amounts of a settlement filled in by several workers
+    '''
+
+    def __init__(self, field='captured_amount'):
+        '''
+        :param: field amount attribute summed
+        :type: field string
+        '''
+
+        self.field = field
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    def add(self, payments):
+        '''
+        Adds the amounts of payments, summed before the lock is taken
+
+        :type: payments iterable of CieloResponsePayment
+        '''
+
+        totals = sum_amounts(payments, self.field)
+
+        with self._lock:
+            for currency, money in six.iteritems(totals):
+                self._totals[currency] = self._totals.get(currency, 0) + money[0]
+
+    def totals(self):
+        '''
+        :return: the totals by currency
+        :rtype: dict
+        '''
+
+        with self._lock:
+            return dict((currency, CieloMoney(amount, currency))
+                        for currency, amount in six.iteritems(self._totals))
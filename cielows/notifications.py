@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+# This file is part of Python Cielo Webservice.
+#
+# Copyright (c) 2016, Rockho Team. All rights reserved.
+# Author: Christian Hess
+#
+# This source code is licensed under the AGPLv3 license found in the
+# LICENSE file in the root directory of this source tree.
+import json
+import logging
+import threading
+
+from six.moves import queue
+
+from cielows.exceptions import ValidationError
+from cielows.models import CieloFactory
+
+
+logger = logging.getLogger(__name__)
+
+
+class CieloNotificationReceiver(object):
+
+    '''
+    Receives Cielo change notifications
+
+    Notifications are queued on a bounded queue consumed by a pool of
+    worker threads that dispatch them to the registered handlers.
+
+    Cielo resends a notification until it is acknowledged, and its
+    notifications carry no status: a notification whose (PaymentId,
+    ChangeType) is already queued or being handled is coalesced with it,
+    while a later one, which may be a new change, is dispatched again.
+
+    The receiver is a WSGI application, see cielows.asgi for ASGI.
+    '''
+
+    def __init__(self, workers=4, queue_size=1000):
+        '''
+        :param: workers number of dispatching threads
+        :type: workers int
+        :param: queue_size max number of notifications waiting for dispatch
+        :type: queue_size int
+        '''
+
+        self.workers = workers
+
+        self._handlers = []
+        self._queue = queue.Queue(maxsize=queue_size)
+        # keys of the notifications queued or being handled
+        self._in_flight = set()
+        self._in_flight_lock = threading.Lock()
+        self._threads = []
+
+    def register(self, handler, change_type=None):
+        '''
+        Registers a notification handler
+
+        :param: handler callable receiving a CieloNotification
+        :param: change_type only dispatch notifications of this type, all when None
+        :type: change_type CieloNotificationChangeType|None
+        '''
+
+        self._handlers.append((change_type, handler))
+
+    def start(self):
+        '''
+        Starts the dispatching threads
+        '''
+
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._work)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        '''
+        Dispatches the queued notifications and stops the dispatching threads
+        '''
+
+        for _ in self._threads:
+            self._queue.put(None)
+
+        for thread in self._threads:
+            thread.join()
+
+        self._threads = []
+
+    def _work(self):
+        while True:
+            notification = self._queue.get()
+
+            try:
+                if notification is None:
+                    return
+
+                try:
+                    self.dispatch(notification)
+                finally:
+                    self._forget(notification)
+            finally:
+                self._queue.task_done()
+
+    def dispatch(self, notification):
+        '''
+        Calls the handlers registered for the notification change type
+
+        :type: notification CieloNotification
+        '''
+
+        for change_type, handler in self._handlers:
+            if change_type is None or change_type == notification.change_type:
+                try:
+                    handler(notification)
+                except Exception:
+                    logger.exception("Cielo notification handler failed for %s",
+                                     notification.payment_id)
+
+    @staticmethod
+    def _key(notification):
+        return (notification.payment_id or notification.recurrent_payment_id,
+                notification.change_type)
+
+    def _is_duplicate(self, notification):
+        '''
+        Whether the same notification is already queued or being handled,
+        marking it so otherwise
+        '''
+
+        key = self._key(notification)
+
+        with self._in_flight_lock:
+            if key in self._in_flight:
+                return True
+
+            self._in_flight.add(key)
+            return False
+
+    def _forget(self, notification):
+        with self._in_flight_lock:
+            self._in_flight.discard(self._key(notification))
+
+    def receive(self, body):
+        '''
+        Parses and queues a notification body
+
+        :type: body bytes
+        :raises: ValidationError when the body is not a valid notification
+        :return: False when the queue is full and the notification must be resent
+        :rtype: bool
+        '''
+
+        try:
+            cielo_data = json.loads(body.decode('utf-8'))
+        except ValueError:
+            raise ValidationError("invalid notification body")
+
+        try:
+            notification = CieloFactory.new_notification(cielo_data)
+        except (TypeError, ValueError):
+            raise ValidationError("invalid notification body")
+
+        if self._is_duplicate(notification):
+            return True
+
+        try:
+            self._queue.put_nowait(notification)
+        except queue.Full:
+            # let Cielo resend it later
+            self._forget(notification)
+            return False
+
+        return True
+
+    def __call__(self, environ, start_response):
+        if environ.get('REQUEST_METHOD') != 'POST':
+            start_response('405 Method Not Allowed', [('Content-Type', 'text/plain'),
+                                                      ('Allow', 'POST')])
+            return [b'']
+
+        try:
+            length = int(environ.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            length = 0
+
+        try:
+            accepted = self.receive(environ['wsgi.input'].read(length))
+        except ValidationError:
+            start_response('400 Bad Request', [('Content-Type', 'text/plain')])
+            return [b'']
+
+        if not accepted:
+            start_response('503 Service Unavailable', [('Content-Type', 'text/plain')])
+            return [b'']
+
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [b'']
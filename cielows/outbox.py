@@ -0,0 +1,530 @@
+# -*- coding: utf-8 -*-
+# This file is part of Python Cielo Webservice.
+#
+# Copyright (c) 2016, Rockho Team. All rights reserved.
+# Author: Christian Hess
+#
+# This source code is licensed under the AGPLv3 license found in the
+# LICENSE file in the root directory of this source tree.
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import sqlite3
+import threading
+import time
+
+from cielows.constants import CieloPaymentStatus
+from cielows.exceptions import CieloRequestError, CieloRetryableError, CieloManualReviewError
+
+
+logger = logging.getLogger(__name__)
+
+# payment statuses showing that an operation was already applied by Cielo
+_APPLIED_STATUS = {
+    'capture': frozenset([CieloPaymentStatus.PaymentConfirmed]),
+    'cancel': frozenset([CieloPaymentStatus.Voided, CieloPaymentStatus.Refunded]),
+}
+
+
+def is_retryable(error):
+    '''
+    Whether a failed operation may succeed if sent again later: Cielo
+    transient errors and transport failures (connection errors,
+    timeouts...) are, requests rejected by Cielo and operations left for
+    manual review are not
+    '''
+
+    return isinstance(error, CieloRetryableError) or \
+        not isinstance(error, (CieloRequestError, CieloManualReviewError))
+
+
+class CieloCircuitBreaker(object):
+
+    '''
+    Circuit breaker of the calls to Cielo
+
+    The circuit opens after failure_threshold consecutive failures and
+    stays open for reset_timeout seconds. It is then half-open: a single
+    probe call is allowed, closing the circuit when it succeeds and
+    opening it again when it fails.
+    '''
+
+    Closed = 'closed'
+    Open = 'open'
+    HalfOpen = 'half-open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30, clock=time.time):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return self.Closed
+        if self.clock() - self._opened_at < self.reset_timeout:
+            return self.Open
+        return self.HalfOpen
+
+    def allow(self):
+        '''
+        Whether a call may be sent now, taking the half-open probe slot
+        when needed
+
+        :rtype: bool
+        '''
+
+        with self._lock:
+            state = self._state()
+
+            if state == self.Closed:
+                return True
+
+            if state == self.HalfOpen and not self._probing:
+                self._probing = True
+                return True
+
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = self.clock()
+
+
+class CieloOutboxOperation(object):
+
+    '''
+    Capture or cancel recorded in a CieloOutbox
+    '''
+
+    id = None
+    operation = None
+    payment_id = None
+    amount = None
+    service_tax_amount = None
+
+    def __init__(self, id, operation, payment_id, amount=None, service_tax_amount=None):
+        self.id = id
+        self.operation = operation
+        self.payment_id = payment_id
+        self.amount = amount
+        self.service_tax_amount = service_tax_amount
+
+
+class CieloOutbox(object):
+
+    '''
+    Durable outbox of captures and cancels
+
+    Operations are appended to a SQLite log (in WAL mode) before being
+    sent, so none is lost while Cielo is unreachable. A drainer sends the
+    pending operations with at most max_workers calls in flight, and one
+    per payment so its operations reach Cielo in order, while the
+    circuit breaker is closed; transient failures keep them pending
+    and count towards opening the circuit, operations rejected by Cielo
+    are settled as failed.
+
+    Every operation is marked started before being sent and done once
+    settled. A cursor, kept in the same database, records the position
+    below which every operation is settled, so recovery only scans the
+    log tail. Operations found started after a crash may have reached
+    Cielo: their payment is queried first and they are only sent again
+    when Cielo did not apply them. Partial cancels are checked against
+    the payment voided amount; when that check is inconclusive the
+    operation is settled for manual review instead of being sent again.
+    '''
+
+    def __init__(self, path, cielo_ws, on_result=None, max_workers=8, batch_size=64,
+                 circuit_breaker=None):
+        '''
+        :param: path SQLite database path
+        :type: path string
+        :type: cielo_ws CieloWS
+        :param: on_result callable receiving (CieloOutboxOperation,
+            CieloResponsePaymentUpdate|None, error|None) once an operation
+            is settled; the response is None for operations recovered as
+            already applied, the error a CieloManualReviewError for those
+            left for manual review
+        :param: max_workers max number of operations sent concurrently
+        :type: max_workers int
+        :param: batch_size max number of operations sent per round
+        :type: batch_size int
+        :type: circuit_breaker CieloCircuitBreaker|None
+        '''
+
+        self.cielo_ws = cielo_ws
+        self.on_result = on_result
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.circuit_breaker = circuit_breaker or CieloCircuitBreaker()
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=FULL")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS operations ("
+                                 "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                                 "operation TEXT NOT NULL, "
+                                 "payment_id TEXT NOT NULL, "
+                                 "amount INTEGER, "
+                                 "service_tax_amount INTEGER)")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS progress ("
+                                 "id INTEGER PRIMARY KEY, "
+                                 "state TEXT NOT NULL, "
+                                 "error TEXT)")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS cursor ("
+                                 "name TEXT PRIMARY KEY, "
+                                 "position INTEGER NOT NULL)")
+        self._connection.execute("INSERT OR IGNORE INTO cursor VALUES ('settled', 0)")
+        self._connection.commit()
+
+        # operations being sent by this process
+        self._claimed = set()
+        # operations that may have reached Cielo unsettled (started by a previous
+        # process or timed out), their payment is checked before they are sent again
+        self._recovering = set(row[0] for row in self._connection.execute(
+            "SELECT id FROM progress WHERE state = 'started'"))
+
+        self._executor = None
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    def _append(self, operation, payment_id, amount=None, service_tax_amount=None):
+        with self._lock:
+            cursor = self._connection.execute(
+                "INSERT INTO operations (operation, payment_id, amount, service_tax_amount) "
+                "VALUES (?, ?, ?, ?)", (operation, payment_id, amount, service_tax_amount))
+            self._connection.commit()
+
+        return cursor.lastrowid
+
+    def capture(self, payment_id, amount=None, service_tax_amount=None):
+        '''
+        Records a capture, see CieloWS.capture
+
+        :return: the operation id
+        :rtype: int
+        '''
+
+        return self._append('capture', payment_id, amount, service_tax_amount)
+
+    def cancel(self, payment_id, amount=None):
+        '''
+        Records a cancel, see CieloWS.cancel
+
+        :return: the operation id
+        :rtype: int
+        '''
+
+        return self._append('cancel', payment_id, amount)
+
+    @property
+    def position(self):
+        '''
+        Cursor position: every operation up to it is settled
+        '''
+
+        with self._lock:
+            return self._position()
+
+    def _position(self):
+        return self._connection.execute("SELECT position FROM cursor "
+                                        "WHERE name = 'settled'").fetchone()[0]
+
+    def pending(self):
+        '''
+        :return: the operations not settled yet, in log order
+        :rtype: list of CieloOutboxOperation
+        '''
+
+        with self._lock:
+            return self._select_pending(None)
+
+    def _select_pending(self, limit):
+        rows = self._connection.execute(
+            "SELECT o.id, o.operation, o.payment_id, o.amount, o.service_tax_amount "
+            "FROM operations o LEFT JOIN progress p ON p.id = o.id "
+            "WHERE o.id > ? AND (p.state IS NULL OR p.state = 'started') "
+            "ORDER BY o.id LIMIT ?", (self._position(), -1 if limit is None else limit))
+
+        return [CieloOutboxOperation(*row) for row in rows]
+
+    def failed(self):
+        '''
+        :return: (CieloOutboxOperation, error message) of the operations
+            rejected by Cielo
+        :rtype: list
+        '''
+
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT o.id, o.operation, o.payment_id, o.amount, o.service_tax_amount, p.error "
+                "FROM operations o JOIN progress p ON p.id = o.id "
+                "WHERE p.state = 'failed' ORDER BY o.id").fetchall()
+
+        return [(CieloOutboxOperation(*row[:5]), row[5]) for row in rows]
+
+    def review(self):
+        '''
+        :return: (CieloOutboxOperation, reason) of the operations that may
+            have been applied by Cielo, which could not be verified
+        :rtype: list
+        '''
+
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT o.id, o.operation, o.payment_id, o.amount, o.service_tax_amount, p.error "
+                "FROM operations o JOIN progress p ON p.id = o.id "
+                "WHERE p.state = 'review' ORDER BY o.id").fetchall()
+
+        return [(CieloOutboxOperation(*row[:5]), row[5]) for row in rows]
+
+    def _set_state(self, operation_id, state, error=None):
+        with self._lock:
+            self._connection.execute("INSERT OR REPLACE INTO progress VALUES (?, ?, ?)",
+                                     (operation_id, state, error))
+            self._connection.commit()
+
+    def _advance(self):
+        '''
+        Moves the cursor past the settled operations at the head of the
+        log and drops their (then useless) done marks
+        '''
+
+        with self._lock:
+            position = self._position()
+            row = self._connection.execute(
+                "SELECT MIN(o.id) FROM operations o LEFT JOIN progress p ON p.id = o.id "
+                "WHERE o.id > ? AND (p.state IS NULL OR p.state = 'started')",
+                (position,)).fetchone()
+
+            if row[0] is not None:
+                settled = row[0] - 1
+            else:
+                settled = self._connection.execute("SELECT COALESCE(MAX(id), 0) "
+                                                   "FROM operations").fetchone()[0]
+
+            if settled > position:
+                self._connection.execute("UPDATE cursor SET position = ? WHERE name = 'settled'",
+                                         (settled,))
+                self._connection.execute("DELETE FROM progress WHERE id <= ? AND state = 'done'",
+                                         (settled,))
+                self._connection.commit()
+
+    def _voided_before(self, operation):
+        '''
+        Returns the amount voided by the cancels of the payment recorded
+        before operation, None when it cannot be told (some are not
+        settled yet, or one was a full cancel)
+        '''
+
+        with self._lock:
+            position = self._position()
+            rows = self._connection.execute(
+                "SELECT o.id, o.amount, p.state FROM operations o "
+                "LEFT JOIN progress p ON p.id = o.id "
+                "WHERE o.operation = 'cancel' AND o.payment_id = ? AND o.id < ?",
+                (operation.payment_id, operation.id)).fetchall()
+
+        voided = 0
+        for operation_id, amount, state in rows:
+            if state == 'failed':
+                continue
+
+            # done marks are dropped once the cursor is past them
+            settled = state == 'done' or (state is None and operation_id <= position)
+            if amount is None or not settled:
+                return None
+
+            voided += amount
+
+        return voided
+
+    def _already_applied(self, operation):
+        '''
+        Whether Cielo applied an operation, None when it cannot be told
+        '''
+
+        payment = self.cielo_ws.query_payment(operation.payment_id, fields=()).payment
+
+        if operation.operation != 'cancel' or operation.amount is None:
+            return payment.status in _APPLIED_STATUS[operation.operation]
+
+        # a partial cancel of a captured payment leaves it PaymentConfirmed
+        voided_before = self._voided_before(operation)
+        if voided_before is None or payment.voided_amount is None:
+            return None
+
+        if payment.voided_amount == voided_before:
+            return False
+        if payment.voided_amount == voided_before + operation.amount:
+            return True
+
+        return None
+
+    def _send(self, operation):
+        response = error = None
+
+        try:
+            applied = False
+            if operation.id in self._recovering:
+                applied = self._already_applied(operation)
+
+            if applied is None:
+                error = CieloManualReviewError(
+                    "cannot tell whether the %s of %s was applied by Cielo"
+                    % (operation.operation, operation.payment_id))
+                logger.error("%s, left for manual review", error)
+            elif applied:
+                logger.info("Cielo %s of %s was applied before a restart",
+                            operation.operation, operation.payment_id)
+            else:
+                self._set_state(operation.id, 'started')
+
+                if operation.operation == 'capture':
+                    response = self.cielo_ws.capture(operation.payment_id,
+                                                     amount=operation.amount,
+                                                     service_tax_amount=operation.service_tax_amount)
+                else:
+                    response = self.cielo_ws.cancel(operation.payment_id, amount=operation.amount)
+        except Exception as exception:
+            error = exception
+
+        if error is not None and is_retryable(error):
+            # stays pending; it may have reached Cielo (e.g. on a timeout),
+            # so its payment is checked before it is sent again
+            self._recovering.add(operation.id)
+            self.circuit_breaker.record_failure()
+            logger.warning("Cielo %s of %s failed, kept in the outbox: %s",
+                           operation.operation, operation.payment_id, error)
+            return False
+
+        self.circuit_breaker.record_success()
+        if error is None:
+            self._set_state(operation.id, 'done')
+        else:
+            self._set_state(operation.id,
+                            'review' if isinstance(error, CieloManualReviewError) else 'failed',
+                            str(error))
+        self._recovering.discard(operation.id)
+
+        if self.on_result is not None:
+            try:
+                self.on_result(operation, response, error)
+            except Exception:
+                logger.exception("Cielo outbox result handler failed for %s",
+                                 operation.payment_id)
+
+        return True
+
+    def drain(self):
+        '''
+        Sends a round of pending operations when the circuit allows it
+
+        :return: number of operations settled
+        :rtype: int
+        '''
+
+        if not self.circuit_breaker.allow():
+            return 0
+
+        probing = self.circuit_breaker.state != CieloCircuitBreaker.Closed
+        limit = 1 if probing else self.batch_size
+
+        with self._lock:
+            operations = []
+            payment_ids = set()
+
+            # only the oldest pending operation of a payment is sent, the
+            # next ones wait for it to be settled (a cancel may follow a capture)
+            for operation in self._select_pending(limit + len(self._claimed)):
+                if operation.payment_id in payment_ids:
+                    continue
+                payment_ids.add(operation.payment_id)
+
+                if operation.id not in self._claimed:
+                    operations.append(operation)
+                    if len(operations) == limit:
+                        break
+
+            self._claimed.update(operation.id for operation in operations)
+
+        if not operations:
+            if probing:
+                # the probe slot was not used
+                self.circuit_breaker.record_success()
+            return 0
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+
+        try:
+            settled = sum(self._executor.map(self._send, operations))
+        finally:
+            with self._lock:
+                self._claimed.difference_update(operation.id for operation in operations)
+
+        self._advance()
+        return settled
+
+    def run(self, stop_event, idle_interval=1.0):
+        '''
+        Drains the outbox until stop_event is set
+
+        :type: stop_event threading.Event
+        :param: idle_interval seconds slept when there is nothing to send
+            or the circuit is open
+        '''
+
+        while not stop_event.is_set():
+            if not self.drain():
+                stop_event.wait(idle_interval)
+
+    def start(self, idle_interval=1.0):
+        '''
+        Starts draining in a background thread
+        '''
+
+        if self._thread is None:
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self.run, args=(self._stop_event, idle_interval))
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        '''
+        Stops the background drainer, after its current round
+        '''
+
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+
+    def close(self):
+        self.stop()
+
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+        with self._lock:
+            self._connection.close()
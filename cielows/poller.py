@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+# This file is part of Python Cielo Webservice.
+#
+# Copyright (c) 2016, Rockho Team. All rights reserved.
+# Author: Christian Hess
+#
+# This source code is licensed under the AGPLv3 license found in the
+# LICENSE file in the root directory of this source tree.
+from concurrent.futures import ThreadPoolExecutor
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+from cielows.constants import CieloPaymentStatus
+
+
+logger = logging.getLogger(__name__)
+
+# statuses that may still change without any action from the merchant
+CieloPollableStatus = frozenset([
+    CieloPaymentStatus.NotFinished,
+    CieloPaymentStatus.Pending,
+    CieloPaymentStatus.Scheduled,
+])
+
+
+class CieloPaymentPoller(object):
+
+    '''
+    Polls the status of pending payments
+
+    Payments are kept in a heap keyed by their next check time, so each
+    round only touches the payments that are due. Every check that finds
+    the payment still pending multiplies its delay by backoff (up to
+    max_delay). Payments leaving the pending statuses are handed to
+    on_update and dropped.
+    '''
+
+    def __init__(self, cielo_ws, on_update=None, max_workers=8, batch_size=64,
+                 initial_delay=5, max_delay=3600, backoff=2.0, clock=time.time):
+        '''
+        :type: cielo_ws CieloWS
+        :param: on_update callable receiving (payment_id, CieloResponse)
+            when a payment leaves the pending statuses
+        :param: max_workers max number of concurrent queries
+        :type: max_workers int
+        :param: batch_size max number of payments checked per round
+        :type: batch_size int
+        :param: initial_delay seconds before the first check of a payment
+        :param: max_delay max seconds between two checks of a payment
+        :param: backoff delay multiplier applied after each pending check
+        '''
+
+        self.cielo_ws = cielo_ws
+        self.on_update = on_update
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.backoff = backoff
+        self.clock = clock
+
+        self._heap = []
+        # payment_id -> (heap entry sequence, current delay)
+        self._payments = {}
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def __len__(self):
+        return len(self._payments)
+
+    def __contains__(self, payment_id):
+        return payment_id in self._payments
+
+    def _schedule(self, payment_id, delay, now):
+        sequence = next(self._sequence)
+        self._payments[payment_id] = (sequence, delay)
+        heapq.heappush(self._heap, (now + delay, sequence, payment_id))
+
+    def add(self, payment_id, delay=None):
+        '''
+        Starts polling a payment
+
+        :type: payment_id string
+        :param: delay seconds before the first check, initial_delay by default
+        '''
+
+        delay = self.initial_delay if delay is None else delay
+
+        with self._lock:
+            self._schedule(payment_id, delay, self.clock())
+
+    def remove(self, payment_id):
+        '''
+        Stops polling a payment
+        '''
+
+        with self._lock:
+            # the heap entry becomes stale and is skipped when popped
+            self._payments.pop(payment_id, None)
+
+    def next_check(self):
+        '''
+        Returns the time of the next due check, None when nothing is polled
+        '''
+
+        with self._lock:
+            self._drop_stale()
+            return self._heap[0][0] if self._heap else None
+
+    def _drop_stale(self):
+        while self._heap:
+            _, sequence, payment_id = self._heap[0]
+            if self._payments.get(payment_id, (None,))[0] == sequence:
+                break
+            heapq.heappop(self._heap)
+
+    def _pop_due(self, now):
+        due = []
+
+        with self._lock:
+            while len(due) < self.batch_size:
+                self._drop_stale()
+                if not self._heap or self._heap[0][0] > now:
+                    break
+
+                _, sequence, payment_id = heapq.heappop(self._heap)
+                due.append((payment_id, self._payments[payment_id][1]))
+
+        return due
+
+    def _query(self, payment_id):
+        try:
+            return self.cielo_ws.query_payment(payment_id)
+        except Exception:
+            logger.exception("Failed to query Cielo payment %s", payment_id)
+            return None
+
+    def poll(self):
+        '''
+        Checks the payments that are due, concurrently
+
+        :return: (payment_id, CieloResponse) of the payments that left
+            the pending statuses
+        :rtype: list
+        '''
+
+        due = self._pop_due(self.clock())
+        if not due:
+            return []
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+
+        responses = list(self._executor.map(self._query, [payment_id for payment_id, _ in due]))
+        now = self.clock()
+        updated = []
+
+        with self._lock:
+            for (payment_id, delay), cielo_response in zip(due, responses):
+                if payment_id not in self._payments:
+                    # removed while it was being checked
+                    continue
+
+                if cielo_response is not None and \
+                        cielo_response.payment.status not in CieloPollableStatus:
+                    del self._payments[payment_id]
+                    updated.append((payment_id, cielo_response))
+                else:
+                    self._schedule(payment_id, min(delay * self.backoff, self.max_delay), now)
+
+        if self.on_update is not None:
+            for payment_id, cielo_response in updated:
+                self.on_update(payment_id, cielo_response)
+
+        return updated
+
+    def run(self, stop_event, idle_interval=1.0):
+        '''
+        Polls until stop_event is set
+
+        :type: stop_event threading.Event
+        :param: idle_interval max seconds slept between two rounds
+        '''
+
+        while not stop_event.is_set():
+            self.poll()
+
+            next_check = self.next_check()
+            wait = idle_interval if next_check is None else next_check - self.clock()
+            stop_event.wait(max(0, min(wait, idle_interval)))
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
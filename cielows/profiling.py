@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+# This file is part of Python Cielo Webservice.
+#
+# Copyright (c) 2016, Rockho Team. All rights reserved.
+# Author: Christian Hess
+#
+# This source code is licensed under the AGPLv3 license found in the
+# LICENSE file in the root directory of this source tree.
+import io
+import os
+import sys
+import threading
+import time
+
+import six
+
+
+# environment variable naming the report file of the clients' shared profiler
+CieloProfileEnvironmentVariable = 'CIELOWS_PROFILE'
+
+# stages of a call, in call order
+CieloProfileStages = ('validation', 'serialization', 'network', 'parse')
+
+_environment_profiler = None
+_environment_lock = threading.Lock()
+
+
+def _frame_name(frame):
+    return '%s:%s' % (frame.f_globals.get('__name__', '?'), frame.f_code.co_name)
+
+
+def _depth(frame):
+    depth = 0
+    while frame is not None:
+        depth += 1
+        frame = frame.f_back
+    return depth
+
+
+class _CieloProfileStage(object):
+
+    __slots__ = ('profiler', 'key', 'started')
+
+    def __init__(self, profiler, key):
+        self.profiler = profiler
+        self.key = key
+
+    def __enter__(self):
+        # frames deeper than the caller of the stage are sampled as its work
+        self.profiler._active[threading.current_thread().ident] = \
+            (self.key, _depth(sys._getframe(1)))
+        self.started = self.profiler._clock()
+        return self
+
+    def __exit__(self, error_type, error, traceback):
+        seconds = self.profiler._clock() - self.started
+        self.profiler._active.pop(threading.current_thread().ident, None)
+        self.profiler._record(self.key, seconds)
+
+
+class CieloProfiler(object):
+
+    '''
+    Profiler of the CieloWS call stages: validation (request checks),
+    serialization (request encoding), network (the transport round trip)
+    and parse (response decoding and model construction)
+
+    Stage durations are measured on every call. While calls are running,
+    a daemon thread also samples the stacks of the threads in a stage, so
+    the report breaks the stage durations down by the functions they were
+    spent in, e.g. which cielows.models parsers a slow parse stage runs.
+
+    The report is in the collapsed stack format of flame graph tools
+    (flamegraph.pl, speedscope, ...): one "operation;stage;frames
+    microseconds" line per stack.
+    '''
+
+    def __init__(self, interval=0.001, sample=True, clock=time.time):
+        '''
+        :param: interval seconds between stack samples
+        :type: interval float
+        :param: sample whether stacks are sampled, stage durations only when False
+        :type: sample bool
+        '''
+
+        self.interval = interval
+        self.sample = sample
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._samples = {}
+        self._active = {}
+        self._sampler = None
+        self._stopped = threading.Event()
+
+    def stage(self, operation, stage):
+        '''
+        Returns a context manager timing a stage of a call
+
+        :param: operation CieloWS method name
+        :type: operation string
+        :param: stage one of CieloProfileStages
+        :type: stage string
+        '''
+
+        if self.sample and self._sampler is None:
+            self._start_sampler()
+
+        return _CieloProfileStage(self, (operation, stage))
+
+    def _record(self, key, seconds):
+        with self._lock:
+            calls, total = self._stages.get(key, (0, 0.0))
+            self._stages[key] = (calls + 1, total + seconds)
+
+    def _start_sampler(self):
+        with self._lock:
+            if self._sampler is not None:
+                return
+
+            self._sampler = threading.Thread(target=self._run_sampler, name='cielows-profiler')
+            self._sampler.daemon = True
+            self._sampler.start()
+
+    def _run_sampler(self):
+        sampler_id = threading.current_thread().ident
+
+        while not self._stopped.wait(self.interval):
+            frames = sys._current_frames()
+
+            for thread_id, (key, depth) in list(self._active.items()):
+                frame = frames.get(thread_id)
+                if frame is None or thread_id == sampler_id:
+                    continue
+
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                stack.reverse()
+
+                sample = key + tuple(stack[depth:])
+                with self._lock:
+                    self._samples[sample] = self._samples.get(sample, 0) + 1
+
+    def stop(self):
+        '''
+        Stops sampling, stage durations are still measured
+        '''
+
+        self.sample = False
+        self._stopped.set()
+
+    def stages(self):
+        '''
+        Returns {(operation, stage): (calls, total seconds)}
+        '''
+
+        with self._lock:
+            return dict(self._stages)
+
+    def stage_totals(self):
+        '''
+        Returns the total seconds of each stage, over all operations,
+        e.g. to tell a network-bound workload from a CPU-bound one
+
+        :rtype: dict
+        '''
+
+        totals = dict((stage, 0.0) for stage in CieloProfileStages)
+
+        for (_, stage), (_, seconds) in six.iteritems(self.stages()):
+            totals[stage] = totals.get(stage, 0.0) + seconds
+
+        return totals
+
+    def report(self):
+        '''
+        Returns the collapsed stacks report
+
+        The measured duration of each (operation, stage) is split between
+        its sampled stacks in proportion to their samples; stages without
+        samples are reported as a single frame.
+
+        :rtype: list of strings
+        '''
+
+        with self._lock:
+            stages = dict(self._stages)
+            samples = dict(self._samples)
+
+        by_stage = {}
+        for sample, count in six.iteritems(samples):
+            by_stage.setdefault(sample[:2], []).append((sample, count))
+
+        weights = {}
+        for key, (_, seconds) in six.iteritems(stages):
+            microseconds = seconds * 1e6
+            stage_samples = by_stage.get(key)
+
+            if not stage_samples:
+                weights[key] = microseconds
+                continue
+
+            total = float(sum(count for _, count in stage_samples))
+            for sample, count in stage_samples:
+                weights[sample] = microseconds * count / total
+
+        return ['%s %d' % (';'.join(stack), round(weight))
+                for stack, weight in sorted(weights.items()) if round(weight)]
+
+    def write(self, path):
+        '''
+        Writes the collapsed stacks report to a file
+
+        :type: path string
+        '''
+
+        with io.open(path, 'w', encoding='utf-8') as report:
+            for line in self.report():
+                report.write(six.text_type(line) + u'\n')
+
+
+def environment_profiler():
+    '''
+    Returns the profiler shared by the clients when the CIELOWS_PROFILE
+    environment variable is set, None otherwise
+
+    Its report is written, at exit, to the file CIELOWS_PROFILE names.
+
+    :rtype: CieloProfiler|None
+    '''
+
+    global _environment_profiler
+
+    path = os.environ.get(CieloProfileEnvironmentVariable)
+    if not path:
+        return None
+
+    with _environment_lock:
+        if _environment_profiler is None:
+            import atexit
+
+            _environment_profiler = CieloProfiler()
+            atexit.register(_environment_profiler.write, path)
+
+        return _environment_profiler
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+# This file is part of Python Cielo Webservice.
+#
+# Copyright (c) 2016, Rockho Team. All rights reserved.
+# Author: Christian Hess
+#
+# This source code is licensed under the AGPLv3 license found in the
+# LICENSE file in the root directory of this source tree.
+import threading
+import time
+
+
+class CieloRateLimiter(object):
+
+    '''
+    Thread-safe token bucket limiting requests to rate per second,
+    with bursts of up to burst requests
+    '''
+
+    def __init__(self, rate, burst=None, clock=time.time, sleep=time.sleep):
+        '''
+        :param: rate requests per second
+        :type: rate float
+        :param: burst bucket size, rate (at least 1) by default
+        :type: burst int|None
+        '''
+
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+
+        self.rate = float(rate)
+        self.burst = float(burst or max(rate, 1))
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = self.burst
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        '''
+        Takes a token and returns how long the caller must wait for it
+        '''
+
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+
+            if self._tokens >= 0:
+                return 0
+
+            return -self._tokens / self.rate
+
+    def acquire(self):
+        '''
+        Blocks until a request is allowed
+        '''
+
+        wait = self._reserve()
+        if wait > 0:
+            self._sleep(wait)
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+# This file is part of Python Cielo Webservice.
+#
+# Copyright (c) 2016, Rockho Team. All rights reserved.
+# Author: Christian Hess
+#
+# This source code is licensed under the AGPLv3 license found in the
+# LICENSE file in the root directory of this source tree.
+from collections import deque
+import gzip
+import json
+import threading
+import time
+
+import six
+
+from cielows.exceptions import CieloTimeoutError
+from cielows.transport import CieloTransport, CieloTransportResponse
+
+
+# JSON fields replaced in the recorded bodies; card numbers keep their last 4 digits
+CieloRedactedFields = frozenset([
+    'CardNumber', 'SecurityCode', 'CardToken', 'Holder', 'ExpirationDate',
+    'Name', 'CustomerName', 'Email', 'Identity', 'Birthdate',
+    # customer, delivery and boleto addresses
+    'Street', 'Number', 'Complement', 'ZipCode', 'City', 'State',
+])
+
+_REDACTED = '***'
+
+
+def redact(cielo_data, fields=CieloRedactedFields):
+    '''
+    Returns a copy of Cielo JSON data with the given fields redacted
+
+    :type: cielo_data dict|list
+    :type: fields set
+    '''
+
+    if isinstance(cielo_data, dict):
+        redacted = {}
+
+        for key, value in six.iteritems(cielo_data):
+            if key not in fields or value is None or isinstance(value, (dict, list)):
+                redacted[key] = redact(value, fields)
+            elif key == 'CardNumber':
+                redacted[key] = _REDACTED + six.text_type(value)[-4:]
+            else:
+                redacted[key] = _REDACTED
+
+        return redacted
+
+    if isinstance(cielo_data, list):
+        return [redact(value, fields) for value in cielo_data]
+
+    return cielo_data
+
+
+def _url_path(url):
+    '''
+    Returns the path of an URL: recordings made against the sandbox
+    can be replayed against production and vice versa
+    '''
+
+    return '/' + url.partition('://')[2].partition('/')[2]
+
+
+def _exchange_key(method, path, params):
+    return (method, path, tuple(sorted(six.iteritems(params or {}))))
+
+
+def _encode_body(body, fields):
+    if not body:
+        return None
+
+    try:
+        return redact(json.loads(body.decode('utf-8')), fields)
+    except ValueError:
+        return {'raw': body.decode('utf-8', 'replace')}
+
+
+def _decode_body(recorded):
+    if recorded is None:
+        return b''
+
+    if isinstance(recorded, dict) and list(recorded) == ['raw']:
+        return recorded['raw'].encode('utf-8')
+
+    return json.dumps(recorded, separators=(',', ':')).encode('utf-8')
+
+
+class CieloRecordingTransport(object):
+
+    '''
+    Transport recording the requests sent through another transport
+
+    Every request/response pair is appended, as one compact JSON line,
+    to a gzip file along with its start offset and duration. Headers
+    (and so the merchant credentials) are not recorded and bodies are
+    redacted, so recordings can be shared and kept with the tests.
+    '''
+
+    def __init__(self, path, transport=None, fields=CieloRedactedFields, clock=time.time):
+        '''
+        :param: path recording file path
+        :type: path string
+        :param: transport transport sending the requests, a new CieloTransport by default
+        :param: fields JSON fields redacted in the recorded bodies
+        :type: fields set
+        '''
+
+        self.transport = transport or CieloTransport()
+        self.fields = fields
+        self.clock = clock
+
+        self._file = gzip.open(path, 'wb')
+        self._lock = threading.Lock()
+        self._started = None
+
+    def request(self, method, url, headers, body=None, params=None, timeout=None):
+        started = self.clock()
+        response = self.transport.request(method, url, headers, body=body, params=params,
+                                          timeout=timeout)
+        duration = self.clock() - started
+
+        record = {
+            'method': method,
+            'path': _url_path(url),
+            'params': params or {},
+            'request': _encode_body(body, self.fields),
+            'status': response.status_code,
+            'response': _encode_body(response.body, self.fields),
+            'duration': round(duration, 6),
+        }
+
+        with self._lock:
+            if self._started is None:
+                self._started = started
+
+            record['offset'] = round(started - self._started, 6)
+            self._file.write(json.dumps(record, separators=(',', ':'), sort_keys=True)
+                             .encode('utf-8') + b'\n')
+
+        return response
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+        self.transport.close()
+
+
+class CieloReplayTransport(object):
+
+    '''
+    Transport answering requests from a CieloRecordingTransport recording
+
+    Requests are matched by method, path and params: each request gets
+    the next recorded response for them, in recording order. Responses
+    are served after their recorded duration divided by speed, or right
+    away when speed is None.
+
+    Only the call durations are replayed by default, not the gaps between
+    the recorded calls. With keep_gaps, a response is not served before
+    its recorded end (offset plus duration, divided by speed) measured
+    from the first replayed request, so the original pacing is kept.
+    '''
+
+    def __init__(self, path, speed=1.0, sleep=time.sleep, keep_gaps=False, clock=time.time):
+        '''
+        :param: path recording file path
+        :type: path string
+        :param: speed latency divisor, 10 serves responses 10 times faster
+            than recorded, None serves them without any delay
+        :type: speed float|None
+        :param: keep_gaps whether the recorded gaps between calls are kept
+        :type: keep_gaps bool
+        '''
+
+        self.speed = speed
+        self.sleep = sleep
+        self.keep_gaps = keep_gaps
+        self.clock = clock
+        self.records = []
+        self._started = None
+
+        self._responses = {}
+        self._lock = threading.Lock()
+
+        with gzip.open(path, 'rb') as recording:
+            for line in recording:
+                record = json.loads(line.decode('utf-8'))
+                self.records.append(record)
+
+                key = _exchange_key(record['method'], record['path'], record['params'])
+                self._responses.setdefault(key, deque()).append(record)
+
+    def __len__(self):
+        '''
+        Number of recorded responses not served yet
+        '''
+
+        with self._lock:
+            return sum(len(responses) for responses in self._responses.values())
+
+    def request(self, method, url, headers, body=None, params=None, timeout=None):
+        '''
+        :raises: LookupError when no recorded response is left for the request
+        :raises: CieloTimeoutError when the scaled duration exceeds timeout
+        '''
+
+        key = _exchange_key(method, _url_path(url), params)
+
+        now = self.clock()
+
+        with self._lock:
+            try:
+                record = self._responses[key].popleft()
+            except (KeyError, IndexError):
+                raise LookupError("no recorded response left for %s %s" % (method, url))
+
+            if self._started is None:
+                self._started = now
+
+        if self.speed:
+            if self.keep_gaps:
+                ended = record.get('offset', 0) + record['duration']
+                duration = max(self._started + ended / self.speed - now, 0)
+            else:
+                duration = record['duration'] / self.speed
+
+            if timeout is not None and duration > timeout:
+                self.sleep(timeout)
+                raise CieloTimeoutError("%s %s timed out after %ss" % (method, url, timeout))
+
+            self.sleep(duration)
+
+        return CieloTransportResponse(record['status'],
+                                      {'Content-Type': 'application/json'},
+                                      _decode_body(record['response']))
+
+    def close(self):
+        pass
@@ -0,0 +1,346 @@
+# -*- coding: utf-8 -*-
+# This file is part of Python Cielo Webservice.
+#
+# Copyright (c) 2016, Rockho Team. All rights reserved.
+# Author: Christian Hess
+#
+# This source code is licensed under the AGPLv3 license found in the
+# LICENSE file in the root directory of this source tree.
+from concurrent.futures import ThreadPoolExecutor
+import calendar
+import datetime
+import heapq
+import io
+import itertools
+import logging
+import os
+import threading
+
+from cielows.constants import CieloRecurrentPaymentIntervalMonths, CieloPaymentStatus
+from cielows.exceptions import ValidationError, CieloChargeDeclinedError, CieloRequestError
+
+
+logger = logging.getLogger(__name__)
+
+# progress file payment id of the orders being charged
+_ATTEMPTING = u'-'
+
+# statuses of a payment charging a recurrence
+_CHARGED_STATUS = frozenset([CieloPaymentStatus.Authorized, CieloPaymentStatus.PaymentConfirmed])
+
+
+def add_months(date, months, day):
+    '''
+    Adds months to a date, using day as the day of the month (clamped
+    to the month length, so 31 gives the last day of shorter months)
+
+    :type: date datetime.date
+    :type: months int
+    :type: day int
+    :rtype: datetime.date
+    '''
+
+    month_index = date.month - 1 + months
+    year = date.year + month_index // 12
+    month = month_index % 12 + 1
+
+    return datetime.date(year, month, min(day, calendar.monthrange(year, month)[1]))
+
+
+class CieloScheduledRecurrence(object):
+
+    '''
+    A recurrence charged locally by CieloRecurrenceScheduler
+    Each charge is an authorization of payment for customer, with
+    order id "<recurrence_id>-<YYYYMMDD>"
+    '''
+
+    recurrence_id = None
+    cielo_ws = None
+    customer = None
+    payment = None
+    interval = None
+    next_date = None
+    end_date = None
+
+    def __init__(self, recurrence_id, cielo_ws, customer, payment, interval, next_date, end_date=None):
+        '''
+        :type: recurrence_id string
+        :param: cielo_ws client of the merchant charging the recurrence
+        :type: cielo_ws CieloWS
+        :type: customer CieloRequestCustomer
+        :type: payment CieloRequestPayment
+        :type: interval CieloRecurrentPaymentInterval
+        :param: next_date date of the next charge
+        :type: next_date datetime.date
+        :param: end_date no charge happens after this date
+        :type: end_date datetime.date|None
+        '''
+
+        if interval not in CieloRecurrentPaymentIntervalMonths:
+            raise ValidationError("invalid recurrent payment interval")
+
+        self.recurrence_id = recurrence_id
+        self.cielo_ws = cielo_ws
+        self.customer = customer
+        self.payment = payment
+        self.interval = interval
+        self.next_date = next_date
+        self.end_date = end_date
+        self._day = next_date.day
+
+    @property
+    def order_id(self):
+        return "%s-%s" % (self.recurrence_id, self.next_date.strftime('%Y%m%d'))
+
+    @property
+    def finished(self):
+        return self.end_date is not None and self.next_date > self.end_date
+
+    def advance(self):
+        '''
+        Moves next_date to the following charge date
+        '''
+
+        self.next_date = add_months(self.next_date,
+                                    CieloRecurrentPaymentIntervalMonths[self.interval],
+                                    self._day)
+
+
+class CieloRecurrenceCharge(object):
+
+    '''
+    Outcome of a recurrence charge, either a response or an error
+    '''
+
+    recurrence = None
+    order_id = None
+    response = None
+    error = None
+
+    def __init__(self, recurrence, order_id, response=None, error=None):
+        self.recurrence = recurrence
+        self.order_id = order_id
+        self.response = response
+        self.error = error
+
+
+class CieloRecurrenceScheduler(object):
+
+    '''
+    Charges local recurrences when they are due
+
+    Recurrences are kept in a heap keyed by their next charge date, and
+    each run charges the due ones concurrently, throttled per merchant by
+    the rate_limits limiters. Every successful charge is appended to the
+    progress file, so a run interrupted halfway can be started again
+    without charging anyone twice. Failed charges are retried on the
+    next run.
+
+    A charge may reach Cielo without being saved as progress, when the
+    process crashes right after it or the call fails after being sent.
+    So every charge is first recorded as being attempted, and the orders
+    left attempted by a crashed run, or whose charge failed, are looked
+    up on Cielo before being charged again: an authorized payment found
+    is used as the charge.
+    '''
+
+    def __init__(self, progress_path=None, max_workers=8, rate_limits=None):
+        '''
+        :param: progress_path progress file, progress is not kept when None
+        :type: progress_path string|None
+        :param: max_workers max number of concurrent charges
+        :type: max_workers int
+        :param: rate_limits merchant_id -> CieloRateLimiter
+        :type: rate_limits dict|None
+        '''
+
+        self.progress_path = progress_path
+        self.max_workers = max_workers
+        self.rate_limits = rate_limits or {}
+
+        self._heap = []
+        self._recurrences = {}
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._progress_lock = threading.Lock()
+        # order ids which may have been charged without being saved as progress
+        self._charged, self._uncertain = self._load_progress()
+
+    def _load_progress(self):
+        '''
+        Returns the charged order ids and the ones a previous run was
+        charging when it stopped
+        '''
+
+        charged = set()
+        attempting = set()
+
+        if self.progress_path and os.path.exists(self.progress_path):
+            with io.open(self.progress_path, 'r', encoding='utf-8') as progress_file:
+                for line in progress_file:
+                    # an interrupted write leaves an incomplete last line
+                    if not line.endswith('\n'):
+                        continue
+
+                    order_id, payment_id = line.split()
+                    if payment_id == _ATTEMPTING:
+                        attempting.add(order_id)
+                    else:
+                        charged.add(order_id)
+
+        return charged, attempting - charged
+
+    def _write_progress(self, order_id, payment_id):
+        if self.progress_path:
+            with io.open(self.progress_path, 'a', encoding='utf-8') as progress_file:
+                progress_file.write(u"%s %s\n" % (order_id, payment_id))
+                progress_file.flush()
+                os.fsync(progress_file.fileno())
+
+    def _save_attempt(self, order_id):
+        with self._progress_lock:
+            self._write_progress(order_id, _ATTEMPTING)
+
+    def _save_progress(self, order_id, payment_id):
+        with self._progress_lock:
+            self._charged.add(order_id)
+            self._uncertain.discard(order_id)
+            self._write_progress(order_id, payment_id)
+
+    def __len__(self):
+        return len(self._recurrences)
+
+    def _push(self, recurrence):
+        self._recurrences[recurrence.recurrence_id] = recurrence
+        heapq.heappush(self._heap, (recurrence.next_date, next(self._sequence),
+                                    recurrence.recurrence_id, recurrence))
+
+    def add(self, recurrence):
+        '''
+        Schedules a recurrence
+
+        :type: recurrence CieloScheduledRecurrence
+        '''
+
+        with self._lock:
+            self._push(recurrence)
+
+    def remove(self, recurrence_id):
+        '''
+        Unschedules a recurrence
+        '''
+
+        with self._lock:
+            self._recurrences.pop(recurrence_id, None)
+
+    def _pop_due(self, day):
+        due = []
+
+        with self._lock:
+            while self._heap and self._heap[0][0] <= day:
+                _, _, recurrence_id, recurrence = heapq.heappop(self._heap)
+
+                # skip removed recurrences
+                if self._recurrences.get(recurrence_id) is recurrence:
+                    del self._recurrences[recurrence_id]
+                    due.append(recurrence)
+
+        return due
+
+    def _charge(self, recurrence):
+        order_id = recurrence.order_id
+
+        if order_id in self._charged:
+            return CieloRecurrenceCharge(recurrence, order_id)
+
+        rate_limiter = self.rate_limits.get(recurrence.cielo_ws.merchant_id)
+
+        def throttle():
+            if rate_limiter is not None:
+                rate_limiter.acquire()
+
+        try:
+            response = None
+            if order_id in self._uncertain:
+                response = self._find_charge(recurrence.cielo_ws, order_id, throttle)
+
+            if response is None:
+                self._save_attempt(order_id)
+                throttle()
+                response = recurrence.cielo_ws.authorize(order_id=order_id,
+                                                         customer=recurrence.customer,
+                                                         payment=recurrence.payment)
+
+                if response.payment.status not in _CHARGED_STATUS:
+                    # not charged: retried on the next run
+                    logger.warning("Recurrence %s was not charged: status %s", order_id,
+                                   response.payment.status)
+                    return CieloRecurrenceCharge(recurrence, order_id, response=response,
+                                                 error=CieloChargeDeclinedError(response))
+        except Exception as error:
+            logger.exception("Failed to charge recurrence %s", order_id)
+            with self._progress_lock:
+                self._uncertain.add(order_id)
+            return CieloRecurrenceCharge(recurrence, order_id, error=error)
+
+        self._save_progress(order_id, response.payment.payment_id)
+        return CieloRecurrenceCharge(recurrence, order_id, response=response)
+
+    def _find_charge(self, cielo_ws, order_id, throttle):
+        '''
+        Returns the response of an authorized payment of an order, if any
+
+        :param: throttle called before each query
+        '''
+
+        throttle()
+        try:
+            payments = cielo_ws.query_payments(order_id).payments
+        except CieloRequestError as error:
+            # no payment was made for unknown orders
+            if error.status_code == 404:
+                return None
+            raise
+
+        for payment in payments:
+            throttle()
+            response = cielo_ws.query_payment(payment.payment_id)
+
+            if response.payment.status in _CHARGED_STATUS:
+                logger.info("Recurrence %s was charged by payment %s", order_id,
+                            payment.payment_id)
+                return response
+
+        return None
+
+    def run(self, day=None):
+        '''
+        Charges the recurrences due on or before day
+
+        :param: day today by default
+        :type: day datetime.date|None
+        :return: the charges of this run, charges already made by an
+            interrupted run have neither response nor error, declined
+            charges have both their response and a CieloChargeDeclinedError
+        :rtype: list of CieloRecurrenceCharge
+        '''
+
+        due = self._pop_due(day or datetime.date.today())
+        if not due:
+            return []
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            charges = list(executor.map(self._charge, due))
+
+        with self._lock:
+            for charge in charges:
+                recurrence = charge.recurrence
+
+                if charge.error is None:
+                    recurrence.advance()
+
+                if not recurrence.finished:
+                    self._push(recurrence)
+
+        return charges
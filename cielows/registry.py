@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+# This file is part of Python Cielo Webservice.
+#
+# Copyright (c) 2016, Rockho Team. All rights reserved.
+# Author: Christian Hess
+#
+# This source code is licensed under the AGPLv3 license found in the
+# LICENSE file in the root directory of this source tree.
+from collections import OrderedDict
+import threading
+
+from cielows.codec import CieloJSONCodec
+from cielows.models import CieloFactory
+from cielows.transport import CieloTransport
+
+
+class CieloWSRegistry(object):
+
+    '''
+    Registry of CieloWS clients of many merchants
+
+    Clients are created on first use and share the registry transport
+    (and so its connection pool), codec, metrics, rate limiter and
+    profiler, each one keeping its own credentials and headers. At most
+    max_clients clients are kept, the least recently used ones being
+    evicted.
+    '''
+
+    def __init__(self, credentials, sandbox=False, max_clients=256, transport=None,
+                 codec=None, metrics=None, rate_limiter=None, timeout=None,
+                 profiler=None):
+        '''
+        :param: credentials merchant_key by merchant_id, either a dict or
+            a callable receiving the merchant_id (raising KeyError for
+            unknown merchants)
+        :type: credentials dict|callable
+        :type: sandbox bool
+        :param: max_clients max number of clients kept
+        :type: max_clients int
+        :type: transport CieloTransport|None
+        :type: codec CieloJSONCodec|None
+        :type: metrics CieloMetrics|None
+        :type: rate_limiter CieloRateLimiter|None
+        :param: timeout default call timeout of the clients
+        :type: timeout float|None
+        :type: profiler CieloProfiler|None
+        '''
+
+        self.credentials = credentials if callable(credentials) else credentials.__getitem__
+        self.sandbox = sandbox
+        self.max_clients = max_clients
+        self.transport = transport or CieloTransport()
+        self.codec = codec or CieloJSONCodec()
+        self.metrics = metrics
+        self.rate_limiter = rate_limiter
+        self.timeout = timeout
+        self.profiler = profiler
+
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._clients)
+
+    def __contains__(self, merchant_id):
+        return merchant_id in self._clients
+
+    def get(self, merchant_id):
+        '''
+        Returns the client of a merchant, creating it if needed
+
+        :type: merchant_id string
+        :raises: KeyError for unknown merchants
+        :rtype: CieloWS
+        '''
+
+        with self._lock:
+            cielo_ws = self._clients.pop(merchant_id, None)
+
+            if cielo_ws is None:
+                cielo_ws = CieloFactory.new_webservice(merchant_id,
+                                                       self.credentials(merchant_id),
+                                                       sandbox=self.sandbox,
+                                                       transport=self.transport,
+                                                       codec=self.codec,
+                                                       metrics=self.metrics,
+                                                       rate_limiter=self.rate_limiter,
+                                                       timeout=self.timeout,
+                                                       profiler=self.profiler)
+
+            # (re)inserting keeps the most recently used clients at the end
+            self._clients[merchant_id] = cielo_ws
+
+            while len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+
+            return cielo_ws
+
+    __getitem__ = get
+
+    def evict(self, merchant_id):
+        '''
+        Drops the client of a merchant, e.g. after its key was changed
+        '''
+
+        with self._lock:
+            self._clients.pop(merchant_id, None)
+
+    def close(self):
+        '''
+        Drops every client and closes the shared transport
+        '''
+
+        with self._lock:
+            self._clients.clear()
+
+        self.transport.close()
@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+# This file is part of Python Cielo Webservice.
+#
+# Copyright (c) 2016, Rockho Team. All rights reserved.
+# Author: Christian Hess
+#
+# This source code is licensed under the AGPLv3 license found in the
+# LICENSE file in the root directory of this source tree.
+import io
+import mmap
+import os
+import struct
+import threading
+import zlib
+
+from cielows.constants import CieloPaymentStatus, CieloPaymentReturnCode, CieloCurrency,\
+    CieloCardBrand
+
+
+_MAGIC = b'CIELOSNP'
+_VERSION = 1
+
+# magic, version, capacity (records), index slots, record count
+_HEADER = struct.Struct('<8sIIII')
+
+# payment fields of a record, strings being NUL padded utf-8
+_FIELDS = (
+    ('payment_id', '36s'),
+    ('tid', '20s'),
+    ('order_id', '50s'),
+    ('payment_type', '16s'),
+    ('status', 'h'),
+    ('amount', 'q'),
+    ('return_code', '8s'),
+    ('captured_amount', 'q'),
+    ('service_tax_amount', 'q'),
+    ('installments', 'H'),
+    ('currency', '3s'),
+    ('authorization_code', '8s'),
+    ('proof_of_sale', '20s'),
+    ('brand', '16s'),
+    ('provider', '16s'),
+)
+
+# a sequence number (odd while the record is being written) and the fields
+_RECORD = struct.Struct('<I' + ''.join(field_format for _, field_format in _FIELDS))
+
+_STRING_SIZES = dict((name, int(field_format[:-1])) for name, field_format in _FIELDS
+                     if field_format.endswith('s'))
+
+_SLOT = struct.Struct('<I')
+
+_CONSTANTS = {
+    'status': CieloPaymentStatus,
+    'return_code': CieloPaymentReturnCode,
+    'currency': CieloCurrency,
+    'brand': CieloCardBrand,
+}
+
+# reads of a record being written are retried this many times before giving up
+_READ_RETRIES = 10000
+
+
+def _hash(key):
+    # stable across processes, unlike hash()
+    return zlib.crc32(key) & 0xffffffff
+
+
+def _key(value, name):
+    # keys are compared with the NUL padded record fields
+    return value.encode('utf-8').ljust(_STRING_SIZES[name], b'\0')
+
+
+class CieloPaymentSnapshot(object):
+
+    '''
+    Payment fields kept by a CieloPaymentSnapshotStore
+    '''
+
+    __slots__ = tuple(name for name, _ in _FIELDS)
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            if name in _STRING_SIZES:
+                value = value.rstrip(b'\0').decode('utf-8') or None
+            if name in _CONSTANTS:
+                value = _CONSTANTS[name].from_value(value)
+            setattr(self, name, value)
+
+
+class CieloPaymentSnapshotStore(object):
+
+    '''
+    Memory-mapped store of payment snapshots
+
+    Payments are written as fixed-size records to a memory-mapped file,
+    along with two open addressing hash indexes, on payment_id and tid,
+    so any process mapping the file looks a payment up in O(1), reading
+    it straight from the shared pages, with no API call or JSON parsing.
+
+    A single process writes the store, which is thread-safe; any number
+    may read it. Putting an already stored payment updates its record in
+    place; a per-record sequence number lets readers retry the reads
+    that raced with an update.
+    '''
+
+    def __init__(self, path, capacity=100000, readonly=False):
+        '''
+        :param: path store file path, created (sized for capacity) if missing
+        :type: path string
+        :param: capacity max number of payments, ignored for existing stores
+        :type: capacity int
+        :param: readonly whether the store is only read, e.g. by another
+            process than the writer
+        :type: readonly bool
+        '''
+
+        self.path = path
+        self.readonly = readonly
+        self._lock = threading.Lock()
+
+        if not os.path.exists(path):
+            if readonly:
+                raise IOError("no snapshot store at %s" % path)
+            self._create(path, capacity)
+
+        self._file = io.open(path, 'rb' if readonly else 'r+b')
+        self._map = mmap.mmap(self._file.fileno(), 0,
+                              access=mmap.ACCESS_READ if readonly else mmap.ACCESS_WRITE)
+
+        magic, version, self.capacity, self._slots, _ = _HEADER.unpack_from(self._map, 0)
+        if magic != _MAGIC or version != _VERSION:
+            raise IOError("%s is not a payment snapshot store" % path)
+
+        self._records_offset = _HEADER.size
+        self._payment_index_offset = self._records_offset + self.capacity * _RECORD.size
+        self._tid_index_offset = self._payment_index_offset + self._slots * _SLOT.size
+
+    @staticmethod
+    def _create(path, capacity):
+        slots = 1
+        # indexes are kept at most half full
+        while slots < 2 * capacity:
+            slots *= 2
+
+        size = _HEADER.size + capacity * _RECORD.size + 2 * slots * _SLOT.size
+
+        with io.open(path, 'wb') as store_file:
+            store_file.write(_HEADER.pack(_MAGIC, _VERSION, capacity, slots, 0))
+            store_file.truncate(size)
+
+    def __len__(self):
+        return _HEADER.unpack_from(self._map, 0)[4]
+
+    def __contains__(self, payment_id):
+        return self.get(payment_id) is not None
+
+    def _read(self, record):
+        offset = self._records_offset + record * _RECORD.size
+
+        for _ in range(_READ_RETRIES):
+            values = _RECORD.unpack_from(self._map, offset)
+
+            # odd: being written, changed: updated while it was read
+            if not values[0] & 1 and _SLOT.unpack_from(self._map, offset)[0] == values[0]:
+                return values[1:]
+
+        raise IOError("snapshot record %d is being written" % record)
+
+    def _lookup(self, index_offset, key, field):
+        '''
+        Returns the (slot, record) of key in an index, record being None
+        (and slot the free slot for it) when key is not indexed
+        '''
+
+        mask = self._slots - 1
+        slot = _hash(key) & mask
+
+        while True:
+            record = _SLOT.unpack_from(self._map, index_offset + slot * _SLOT.size)[0]
+
+            if not record:
+                return slot, None
+
+            # several tids may point to a record whose tid changed
+            if self._read(record - 1)[field] == key:
+                return slot, record - 1
+
+            slot = (slot + 1) & mask
+
+    def _get(self, index_offset, key, field):
+        if not key:
+            return None
+
+        _, record = self._lookup(index_offset, _key(key, _FIELDS[field][0]), field)
+
+        return None if record is None else CieloPaymentSnapshot(*self._read(record))
+
+    def get(self, payment_id):
+        '''
+        :type: payment_id string
+        :rtype: CieloPaymentSnapshot|None
+        '''
+
+        return self._get(self._payment_index_offset, payment_id, 0)
+
+    def get_by_tid(self, tid):
+        '''
+        :type: tid string
+        :rtype: CieloPaymentSnapshot|None
+        '''
+
+        return self._get(self._tid_index_offset, tid, 1)
+
+    def put(self, payment, order_id=None):
+        '''
+        Stores (or updates) the snapshot of a payment
+
+        :type: payment CieloResponsePayment
+        :param: order_id MerchantOrderId of the payment response
+        :type: order_id string|None
+        :raises: ValueError when the store is full or a field does not
+            fit its record field
+        '''
+
+        credit_card = payment.credit_card
+        values = [payment.payment_id, payment.tid, order_id, payment.payment_type,
+                  int(payment.status), int(payment.amount or 0), payment.return_code,
+                  int(payment.captured_amount or 0), int(payment.service_tax_amount or 0),
+                  int(payment.installments or 0), payment.currency,
+                  payment.authorization_code, payment.proof_of_sale,
+                  credit_card.brand if credit_card is not None else None,
+                  payment.provider]
+
+        if not payment.payment_id:
+            raise ValueError("payments without payment_id cannot be stored")
+
+        for index, (name, value) in enumerate(zip(CieloPaymentSnapshot.__slots__, values)):
+            if name in _STRING_SIZES:
+                values[index] = (value or '').encode('utf-8')
+                if len(values[index]) > _STRING_SIZES[name]:
+                    raise ValueError("%s %r is too long for a snapshot" % (name, value))
+
+        with self._lock:
+            slot, record = self._lookup(self._payment_index_offset,
+                                        _key(payment.payment_id, 'payment_id'), 0)
+            count = len(self)
+
+            if record is None:
+                if count >= self.capacity:
+                    raise ValueError("the snapshot store is full")
+                record, is_new = count, True
+            else:
+                is_new = False
+
+            offset = self._records_offset + record * _RECORD.size
+            sequence = _SLOT.unpack_from(self._map, offset)[0]
+            # a write interrupted by a crash leaves an odd sequence
+            sequence += sequence & 1
+            if sequence >= 0xfffffffe:
+                sequence = 0
+
+            _SLOT.pack_into(self._map, offset, sequence + 1)
+            _RECORD.pack_into(self._map, offset, sequence + 1, *values)
+            _SLOT.pack_into(self._map, offset, sequence + 2)
+
+            # the record is complete before the indexes point to it
+            if is_new:
+                _SLOT.pack_into(self._map, self._payment_index_offset + slot * _SLOT.size,
+                                record + 1)
+                _HEADER.pack_into(self._map, 0, _MAGIC, _VERSION, self.capacity, self._slots,
+                                  count + 1)
+
+            if payment.tid:
+                tid_slot, tid_record = self._lookup(self._tid_index_offset,
+                                                    _key(payment.tid, 'tid'), 1)
+                if tid_record is None:
+                    _SLOT.pack_into(self._map, self._tid_index_offset + tid_slot * _SLOT.size,
+                                    record + 1)
+
+    def flush(self):
+        '''
+        Writes the changes to disk, readers see them without flushing
+        '''
+
+        self._map.flush()
+
+    def close(self):
+        with self._lock:
+            self._map.close()
+            self._file.close()
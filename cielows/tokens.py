@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+# This file is part of Python Cielo Webservice.
+#
+# Copyright (c) 2016, Rockho Team. All rights reserved.
+# Author: Christian Hess
+#
+# This source code is licensed under the AGPLv3 license found in the
+# LICENSE file in the root directory of this source tree.
+from collections import OrderedDict
+import hashlib
+import hmac
+import sqlite3
+import threading
+
+import six
+
+from cielows.models import CieloFactory
+
+
+class CieloCardTokenStore(object):
+
+    '''
+    Persistent SQLite store of card tokens, keyed by card fingerprint
+    '''
+
+    def __init__(self, path):
+        '''
+        :param: path SQLite database path
+        :type: path string
+        '''
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("CREATE TABLE IF NOT EXISTS card_tokens ("
+                                 "fingerprint TEXT PRIMARY KEY, "
+                                 "card_token TEXT NOT NULL, "
+                                 "brand TEXT NOT NULL)")
+        self._connection.commit()
+
+    def get(self, fingerprint):
+        '''
+        :return: (card_token, brand) or None
+        '''
+
+        with self._lock:
+            row = self._connection.execute("SELECT card_token, brand FROM card_tokens "
+                                           "WHERE fingerprint = ?", (fingerprint,)).fetchone()
+        return tuple(row) if row else None
+
+    def put(self, fingerprint, card_token, brand):
+        with self._lock:
+            self._connection.execute("INSERT OR REPLACE INTO card_tokens VALUES (?, ?, ?)",
+                                     (fingerprint, card_token, brand))
+            self._connection.commit()
+
+    def delete(self, fingerprint):
+        with self._lock:
+            self._connection.execute("DELETE FROM card_tokens WHERE fingerprint = ?",
+                                     (fingerprint,))
+            self._connection.commit()
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class CieloCardTokenCache(object):
+
+    '''
+    Local cache of Cielo card tokens
+
+    Cards are identified by a fingerprint, an HMAC-SHA256 of the card
+    number and expiration date under a secret key, so the cache never
+    holds card data. Recently used tokens are kept in memory up to
+    max_size (least recently used evicted first), backed by an optional
+    persistent store.
+    '''
+
+    def __init__(self, key, max_size=10000, store=None):
+        '''
+        :param: key secret fingerprint key
+        :type: key bytes
+        :param: max_size max number of tokens kept in memory
+        :type: max_size int
+        :type: store CieloCardTokenStore|None
+        '''
+
+        if not isinstance(key, six.binary_type) or not key:
+            raise TypeError("key must be a non empty bytes string")
+
+        self.max_size = max_size
+        self.store = store
+        self._key = key
+        self._tokens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._tokens)
+
+    def fingerprint(self, credit_card):
+        '''
+        Returns the fingerprint of a card
+
+        :type: credit_card CieloRequestCreditCard
+        :rtype: string
+        '''
+
+        card_data = "%s|%s" % (credit_card.card_number, credit_card.expiration_date)
+        return hmac.new(self._key, card_data.encode('utf-8'), hashlib.sha256).hexdigest()
+
+    def _remember(self, fingerprint, token):
+        with self._lock:
+            # re-inserting moves the entry to the most recently used end
+            self._tokens.pop(fingerprint, None)
+            self._tokens[fingerprint] = token
+
+            while len(self._tokens) > self.max_size:
+                self._tokens.popitem(last=False)
+
+    def get(self, credit_card):
+        '''
+        Returns the cached (card_token, brand) of a card, or None
+
+        :type: credit_card CieloRequestCreditCard
+        '''
+
+        fingerprint = self.fingerprint(credit_card)
+
+        with self._lock:
+            token = self._tokens.pop(fingerprint, None)
+            if token is not None:
+                self._tokens[fingerprint] = token
+                return token
+
+        if self.store is not None:
+            token = self.store.get(fingerprint)
+            if token is not None:
+                self._remember(fingerprint, token)
+                return token
+
+        return None
+
+    def put(self, credit_card, card_token):
+        '''
+        Caches the token of a card
+
+        :type: credit_card CieloRequestCreditCard
+        :type: card_token string
+        '''
+
+        fingerprint = self.fingerprint(credit_card)
+        self._remember(fingerprint, (card_token, credit_card.brand))
+
+        if self.store is not None:
+            self.store.put(fingerprint, card_token, credit_card.brand)
+
+    def discard(self, credit_card):
+        '''
+        Forgets the token of a card, e.g. once Cielo no longer accepts it
+        '''
+
+        fingerprint = self.fingerprint(credit_card)
+
+        with self._lock:
+            self._tokens.pop(fingerprint, None)
+
+        if self.store is not None:
+            self.store.delete(fingerprint)
+
+    def remember(self, credit_card, cielo_response):
+        '''
+        Caches the token returned by an authorization made with save_card
+
+        :type: credit_card CieloRequestCreditCard
+        :type: cielo_response CieloResponse
+        '''
+
+        response_card = cielo_response.payment.credit_card
+        if response_card is not None and response_card.card_token:
+            self.put(credit_card, response_card.card_token)
+
+    def tokenize(self, cielo_ws, customer_name, credit_card):
+        '''
+        Returns a token credit card for a card, asking Cielo for a
+        token only when the card is not cached yet
+
+        :type: cielo_ws CieloWS
+        :type: customer_name string
+        :type: credit_card CieloRequestCreditCard
+        :rtype: CieloRequestCreditCard
+        '''
+
+        token = self.get(credit_card)
+
+        if token is None:
+            card_token = cielo_ws.tokenize_card(customer_name, credit_card)
+            self.put(credit_card, card_token)
+            token = (card_token, credit_card.brand)
+
+        return CieloFactory.new_request_token_credit_card(card_token=token[0],
+                                                          brand=token[1],
+                                                          security_code=credit_card.security_code)
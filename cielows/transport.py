@@ -0,0 +1,385 @@
+# -*- coding: utf-8 -*-
+# This file is part of Python Cielo Webservice.
+#
+# Copyright (c) 2016, Rockho Team. All rights reserved.
+# Author: Christian Hess
+#
+# This source code is licensed under the AGPLv3 license found in the
+# LICENSE file in the root directory of this source tree.
+import io
+import socket
+import threading
+import time
+
+from cielows.exceptions import CieloTimeoutError
+
+# clock of the deadlines, unaffected by system clock changes (python 3.3+)
+_clock = getattr(time, 'monotonic', time.time)
+
+
+class CieloDNSCache(object):
+
+    '''
+    Caches host name resolutions for ttl seconds
+
+    The address of a host is dropped from the cache when connecting to
+    it fails, so a moved host is resolved again right away
+    '''
+
+    def __init__(self, ttl=300, getaddrinfo=socket.getaddrinfo, clock=time.time):
+        '''
+        :param: ttl seconds a resolution is kept
+        :type: ttl int
+        '''
+
+        self.ttl = ttl
+        self.getaddrinfo = getaddrinfo
+        self.clock = clock
+
+        self._addresses = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, host, port):
+        '''
+        :return: the first address of host
+        :rtype: string
+        '''
+
+        now = self.clock()
+
+        with self._lock:
+            cached = self._addresses.get((host, port))
+
+        if cached is not None and cached[0] > now:
+            return cached[1]
+
+        address = self.getaddrinfo(host, port, 0, socket.SOCK_STREAM)[0][4][0]
+
+        with self._lock:
+            self._addresses[(host, port)] = (now + self.ttl, address)
+
+        return address
+
+    def discard(self, host, port):
+        with self._lock:
+            self._addresses.pop((host, port), None)
+
+
+# deadline (_clock()) of the response being read by the calling thread, if any
+_deadline = threading.local()
+
+
+class _CieloDeadlineSocketIO(io.RawIOBase):
+
+    '''
+    Raw reader of a socket bounding each read by the time left
+    before a deadline
+    '''
+
+    def __init__(self, sock, deadline):
+        io.RawIOBase.__init__(self)
+        self._sock = sock
+        self._deadline = deadline
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        remaining = self._deadline - _clock()
+        if remaining <= 0:
+            raise socket.timeout("deadline exceeded")
+
+        self._sock.settimeout(remaining)
+        return self._sock.recv_into(buffer)
+
+
+class _CieloDeadlineSocket(object):
+
+    '''
+    Socket whose makefile reader, which the response (headers and body)
+    is read from, enforces a deadline
+    '''
+
+    def __init__(self, sock, deadline):
+        self._sock = sock
+        self._deadline = deadline
+
+    def __getattr__(self, name):
+        return getattr(self._sock, name)
+
+    def makefile(self, mode='r', *args, **kwargs):
+        if 'r' not in mode:
+            return self._sock.makefile(mode, *args, **kwargs)
+
+        # small buffer: the deadline is checked every few KiB at most
+        return io.BufferedReader(_CieloDeadlineSocketIO(self._sock, self._deadline), 4096)
+
+
+def _pool_classes(dns_cache):
+    '''
+    Returns urllib3 connection pool classes, by scheme, whose
+    connections read responses within the calling thread deadline and,
+    unless dns_cache is None, resolve their host through dns_cache
+    '''
+
+    from urllib3.connection import HTTPConnection, HTTPSConnection
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+    def connection_class(base):
+        def getresponse(self, *args, **kwargs):
+            deadline = getattr(_deadline, 'value', None)
+            if deadline is None or self.sock is None:
+                return base.getresponse(self, *args, **kwargs)
+
+            sock = self.sock
+            self.sock = _CieloDeadlineSocket(sock, deadline)
+            try:
+                return base.getresponse(self, *args, **kwargs)
+            finally:
+                self.sock = sock
+
+        def _new_conn(self):
+            if dns_cache is None:
+                return base._new_conn(self)
+
+            # urllib3 opens the socket to _dns_host, which host also reads;
+            # the cached address is only swapped in while the socket is
+            # opened, so the TLS server name and certificate checks, done
+            # afterwards, still use the host name
+            host = self._dns_host
+            self._dns_host = dns_cache.resolve(host, self.port)
+
+            try:
+                return base._new_conn(self)
+            except Exception:
+                dns_cache.discard(host, self.port)
+                raise
+            finally:
+                self._dns_host = host
+
+        return type(str('Cielo' + base.__name__), (base,),
+                    {'_new_conn': _new_conn, 'getresponse': getresponse})
+
+    return {
+        'http': type(str('CieloHTTPConnectionPool'), (HTTPConnectionPool,),
+                     {'ConnectionCls': connection_class(HTTPConnection)}),
+        'https': type(str('CieloHTTPSConnectionPool'), (HTTPSConnectionPool,),
+                      {'ConnectionCls': connection_class(HTTPSConnection)}),
+    }
+
+
+class CieloTransportResponse(object):
+
+    '''
+    Raw HTTP response of the Cielo webservice
+    The body is kept as the bytes received from the wire and buffer is
+    a memoryview over those same bytes, so the parser and the archiver
+    can share the body without copying it
+    '''
+
+    status_code = None
+    headers = None
+    body = None
+    buffer = None
+
+    def __init__(self, status_code, headers, body):
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+        self.buffer = memoryview(body)
+
+
+class CieloTransport(object):
+
+    '''
+    HTTP transport of the Cielo webservice
+
+    The transport is thread-safe: each thread gets its own requests
+    session, and all sessions share one adapter, whose connection pool
+    is thread-safe, so threads share connections without locking
+    around requests
+
+    Compressed (gzip or deflate) responses are decompressed.
+
+    The HTTP stack (requests) is only imported, and the adapter only
+    created, when the first request is sent (or prewarm is called).
+    Host names are resolved through a CieloDNSCache.
+    '''
+
+    def __init__(self, pool_maxsize=10, pool_block=False, dns_ttl=300, connect_timeout=5):
+        '''
+        :param: pool_maxsize max number of connections kept per host
+        :type: pool_maxsize int
+        :param: pool_block whether requests wait for a free pooled connection
+            instead of opening (and then discarding) extra ones
+        :type: pool_block bool
+        :param: dns_ttl seconds host name resolutions are cached,
+            resolutions are not cached when None
+        :type: dns_ttl int|None
+        :param: connect_timeout max seconds of a call timeout spent
+            connecting (DNS, TCP and TLS) and sending the request
+        :type: connect_timeout float
+        '''
+
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.dns_cache = CieloDNSCache(dns_ttl) if dns_ttl else None
+        self.connect_timeout = connect_timeout
+        self._adapter = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def adapter(self):
+        '''
+        The HTTP adapter shared by the sessions of every thread
+        '''
+
+        if self._adapter is None:
+            with self._lock:
+                if self._adapter is None:
+                    import requests.adapters
+
+                    adapter = requests.adapters.HTTPAdapter(pool_connections=2,
+                                                            pool_maxsize=self.pool_maxsize,
+                                                            pool_block=self.pool_block)
+
+                    adapter.poolmanager.pool_classes_by_scheme = _pool_classes(self.dns_cache)
+
+                    self._adapter = adapter
+
+        return self._adapter
+
+    @property
+    def session(self):
+        '''
+        The requests session of the calling thread
+        '''
+
+        session = getattr(self._local, 'session', None)
+
+        if session is None:
+            import requests
+
+            session = requests.Session()
+            session.mount('https://', self.adapter)
+            session.mount('http://', self.adapter)
+            self._local.session = session
+
+        return session
+
+    def request(self, method, url, headers, body=None, params=None, timeout=None):
+        '''
+        Sends a request and returns its CieloTransportResponse
+
+        With a timeout, connecting and sending the request may take up to
+        connect_timeout of it and the response must be read before it runs
+        out: each socket read of the headers and body waits at most for
+        the time left. A call past its timeout closes its connection (so
+        a half read response never goes back to the pool) and raises
+        CieloTimeoutError.
+
+        :type: method string
+        :type: url string
+        :type: headers dict
+        :type: body bytes|None
+        :type: params dict|None
+        :param: timeout seconds the call may take, no limit when None
+        :type: timeout float|None
+        :raises: CieloTimeoutError
+        :rtype: CieloTransportResponse
+        '''
+
+        if timeout is None:
+            response = self.session.request(method, url, headers=headers, data=body, params=params)
+            return CieloTransportResponse(response.status_code, response.headers, response.content)
+
+        import requests
+        from urllib3.exceptions import ReadTimeoutError
+
+        deadline = _clock() + timeout
+
+        _deadline.value = deadline
+        try:
+            response = self.session.request(method, url, headers=headers, data=body, params=params,
+                                            timeout=(min(self.connect_timeout, timeout), timeout),
+                                            stream=True)
+        except requests.exceptions.Timeout as error:
+            raise CieloTimeoutError("%s %s timed out: %s" % (method, url, error))
+        except requests.exceptions.ConnectionError as error:
+            # a deadline hit while reading the headers may not be reported as a timeout
+            if _clock() >= deadline:
+                raise CieloTimeoutError("%s %s timed out: %s" % (method, url, error))
+            raise
+        finally:
+            _deadline.value = None
+
+        chunks = []
+        try:
+            for chunk in response.raw.stream(4096, decode_content=True):
+                chunks.append(chunk)
+
+                if _clock() >= deadline:
+                    raise CieloTimeoutError("%s %s timed out after %ss" % (method, url, timeout))
+        except (ReadTimeoutError, socket.timeout) as error:
+            response.close()
+            raise CieloTimeoutError("%s %s timed out: %s" % (method, url, error))
+        except Exception:
+            response.close()
+            raise
+
+        response.raw.release_conn()
+        return CieloTransportResponse(response.status_code, response.headers, b''.join(chunks))
+
+    def _connection_pool(self, url):
+        '''
+        Returns the pool requests uses for url, with the TLS and proxy
+        settings it picks up from the environment
+        '''
+
+        import requests
+
+        settings = self.session.merge_environment_settings(url, {}, None, None, None)
+
+        if hasattr(self.adapter, 'get_connection_with_tls_context'):
+            return self.adapter.get_connection_with_tls_context(
+                requests.Request('GET', url).prepare(), settings['verify'],
+                settings['proxies'], settings['cert'])
+
+        return self.adapter.get_connection(url, settings['proxies'])
+
+    def prewarm(self, url, connections=1):
+        '''
+        Opens connections (DNS, TCP and TLS) to the host of url ahead of
+        the first requests and leaves them in the pool
+
+        :type: url string
+        :param: connections number of connections, at most pool_maxsize
+        :type: connections int
+        :return: number of connections opened
+        :rtype: int
+        '''
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        pool = self._connection_pool(url)
+        pooled = [pool._get_conn() for _ in range(min(connections, self.pool_maxsize))]
+        idle = [connection for connection in pooled if getattr(connection, 'sock', None) is None]
+
+        try:
+            if idle:
+                with ThreadPoolExecutor(max_workers=len(idle)) as executor:
+                    list(executor.map(lambda connection: connection.connect(), idle))
+        finally:
+            for connection in pooled:
+                pool._put_conn(connection)
+
+        return len(idle)
+
+    def close(self):
+        '''
+        Closes the pooled connections
+        '''
+
+        if self._adapter is not None:
+            self._adapter.close()
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+# This file is part of Python Cielo Webservice.
+#
+# Copyright (c) 2016, Rockho Team. All rights reserved.
+# Author: Christian Hess
+#
+# This source code is licensed under the AGPLv3 license found in the
+# LICENSE file in the root directory of this source tree.
+import six
+
+from cielows.constants import CieloErrorsMap
+from cielows.exceptions import ValidationError
+
+
+# Cielo field limits, by the field name used in CieloErrorsMap "... length
+# exceeded" messages: (field path in the request JSON, max length) pairs.
+# Fields without a counterpart in the request models are left out.
+_FIELD_LIMITS = {
+    'Card Number': [(('Payment', 'CreditCard', 'CardNumber'), 19)],
+    'SecurityCode': [(('Payment', 'CreditCard', 'SecurityCode'), 4)],
+    'Address Street': [(('Customer', 'Address', 'Street'), 255),
+                       (('Customer', 'DeliveryAddress', 'Street'), 255)],
+    'Address Number': [(('Customer', 'Address', 'Number'), 15),
+                       (('Customer', 'DeliveryAddress', 'Number'), 15)],
+    'Address Complement': [(('Customer', 'Address', 'Complement'), 50),
+                           (('Customer', 'DeliveryAddress', 'Complement'), 50)],
+    'Address ZipCode': [(('Customer', 'Address', 'ZipCode'), 9),
+                        (('Customer', 'DeliveryAddress', 'ZipCode'), 9)],
+    'Address City': [(('Customer', 'Address', 'City'), 50),
+                     (('Customer', 'DeliveryAddress', 'City'), 50)],
+    'Address State': [(('Customer', 'Address', 'State'), 2),
+                      (('Customer', 'DeliveryAddress', 'State'), 2)],
+    'Address Country': [(('Customer', 'Address', 'Country'), 35),
+                        (('Customer', 'DeliveryAddress', 'Country'), 35)],
+    'Address District': [(('Customer', 'Address', 'District'), 50),
+                         (('Customer', 'DeliveryAddress', 'District'), 50)],
+    'Customer Name': [(('Customer', 'Name'), 255)],
+    'Customer Identity': [(('Customer', 'Identity'), 14)],
+    'Customer IdentityType': [(('Customer', 'IdentityType'), 255)],
+    'Customer Email': [(('Customer', 'Email'), 255)],
+    'Boleto Instructions': [(('Payment', 'Instructions'), 450)],
+    'Boleto Demostrative': [(('Payment', 'Demonstrative'), 255)],
+}
+
+_LENGTH_EXCEEDED = ' length exceeded'
+
+
+def _build_length_rules():
+    '''
+    Builds the (field path, max length, error code) rules from the
+    "length exceeded" errors of CieloErrorsMap
+    '''
+
+    rules = []
+
+    for code, message in sorted(six.iteritems(CieloErrorsMap)):
+        if message.endswith(_LENGTH_EXCEEDED):
+            for path, max_length in _FIELD_LIMITS.get(message[:-len(_LENGTH_EXCEEDED)], []):
+                rules.append((path, max_length, int(code)))
+
+    return rules
+
+
+CieloLengthRules = _build_length_rules()
+
+
+def validate_request_json(cielo_data):
+    '''
+    Checks the field lengths of a request JSON before it is sent
+
+    :param: cielo_data Cielo request JSON (CieloRequest.to_json())
+    :type: cielo_data dict
+    :raises: ValidationError with the Cielo error code of the first
+        field exceeding its length
+    '''
+
+    for path, max_length, code in CieloLengthRules:
+        value = cielo_data
+        for key in path:
+            if not isinstance(value, dict):
+                value = None
+                break
+            value = value.get(key)
+
+        if isinstance(value, six.string_types) and len(value) > max_length:
+            raise ValidationError("%s (%s longer than %d)" % (CieloErrorsMap[str(code)],
+                                                              '.'.join(path),
+                                                              max_length),
+                                  code=code)
+
+
+def validate_request(cielo_request):
+    '''
+    Checks the field lengths of a CieloRequest before it is sent
+
+    :type: cielo_request CieloRequest
+    :raises: ValidationError
+    '''
+
+    validate_request_json(cielo_request.to_json())
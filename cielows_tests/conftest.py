@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+# This file is part of Python Cielo Webservice.
+#
+# Copyright (c) 2016, Rockho Team. All rights reserved.
+# Author: Christian Hess
+#
+# This source code is licensed under the AGPLv3 license found in the
+# LICENSE file in the root directory of this source tree.
+import sys
+
+
+collect_ignore = []
+
+# async syntax does not compile before python 3.5 and asyncio.run is 3.7+,
+# the python 3.7 job of .travis.yml runs them
+if sys.version_info < (3, 7):
+    collect_ignore.append('test_asgi.py')
@@ -135,3 +135,89 @@ PAYMENTS_QUERY_RESULT = {
         }
     ]
 }
+
+
+CIELO_CAPTURE_RESPONSE = {
+    "Status": 2,
+    "ReturnCode": "6",
+    "ReturnMessage": "Operation Successful",
+    "Links": [
+        {
+            "Method": "GET",
+            "Rel": "self",
+            "Href": "https://apiquerysandbox.cieloecommerce.cielo.com.br/1/sales/{PaymentId}"
+        },
+        {
+            "Method": "PUT",
+            "Rel": "void",
+            "Href": "https://apisandbox.cieloecommerce.cielo.com.br/1/sales/{PaymentId}/void"
+        }
+    ]
+}
+
+
+CIELO_VOID_RESPONSE = {
+    "Status": 10,
+    "ReturnCode": "9",
+    "ReturnMessage": "Operation Successful",
+    "Links": [
+        {
+            "Method": "GET",
+            "Rel": "self",
+            "Href": "https://apiquerysandbox.cieloecommerce.cielo.com.br/1/sales/{PaymentId}"
+        }
+    ]
+}
+
+
+CIELO_ERROR_RESPONSE = [
+    {
+        "Code": 126,
+        "Message": "Credit Card Expiration Date is invalid"
+    }
+]
+
+
+CIELO_BOLETO_RESPONSE = {
+    "MerchantOrderId": "2014111706",
+    "Customer": {
+        "Name": "Comprador Teste Boleto",
+        "Identity": "1234567890",
+        "Address": {
+            "Street": "Avenida Marechal Câmara",
+            "Number": "160",
+            "Complement": "Sala 934",
+            "ZipCode": "22750012",
+            "District": "Centro",
+            "City": "Rio de Janeiro",
+            "State": "RJ",
+            "Country": "BRA"
+        }
+    },
+    "Payment": {
+        "Instructions": "Aceitar somente até a data de vencimento.",
+        "ExpirationDate": "2015-01-05",
+        "Url": "https://apisandbox.cieloecommerce.cielo.com.br/post/pagador/reenvia.asp/a5f3181d-c2e2-4df9-a5b4-d8f6edf6bd51",
+        "Number": "123-2",
+        "BarCodeNumber": "00096629900000157000494250000000012300656560",
+        "DigitableLine": "00090.49420 50000.000013 23006.565602 6 62990000015700",
+        "Assignor": "Empresa Teste",
+        "Address": "Rua Teste",
+        "Identification": "11884926754",
+        "PaymentId": "a5f3181d-c2e2-4df9-a5b4-d8f6edf6bd51",
+        "Type": "Boleto",
+        "Amount": 15700,
+        "Currency": "BRL",
+        "Country": "BRA",
+        "Provider": "Bradesco2",
+        "ExtraDataCollection": [],
+        "Status": 1,
+        "Links": [
+            {
+                "Method": "GET",
+                "Rel": "self",
+                "Href": "https://apiquerysandbox.cieloecommerce.cielo.com.br/1/sales/a5f3181d-c2e2-4df9-a5b4-d8f6edf6bd51"
+            }
+        ]
+    }
+}
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+# This file is part of Python Cielo Webservice.
+#
+# Copyright (c) 2016, Rockho Team. All rights reserved.
+# Author: Christian Hess
+#
+# This source code is licensed under the AGPLv3 license found in the
+# LICENSE file in the root directory of this source tree.
+
+import copy
+import json
+import threading
+import time
+import zlib
+
+from six.moves import BaseHTTPServer, socketserver
+
+from cielows_tests.fake_data import CIELO_RESPONSE_COMPLETE
+
+
+class TrickleFile(object):
+
+    '''
+    Writes to a file in 16 bytes pieces, delay seconds apart
+    '''
+
+    def __init__(self, fileobj, delay):
+        self.fileobj = fileobj
+        self.delay = delay
+
+    def write(self, data):
+        for start in range(0, len(data), 16):
+            try:
+                self.fileobj.write(data[start:start + 16])
+                self.fileobj.flush()
+            except (IOError, OSError):
+                # the client gave up
+                return
+            time.sleep(self.delay)
+
+    def __getattr__(self, name):
+        return getattr(self.fileobj, name)
+
+
+class FakeCieloHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    '''
+    Answers GET /1/sales/<payment id> with CIELO_RESPONSE_COMPLETE
+    for that payment id, after the server delay, gzipped when the
+    client accepts it; with a server trickle, the body (and the headers
+    too with trickle_headers) is sent slowly
+    '''
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.server.record(self)
+        time.sleep(self.server.delay)
+
+        cielo_data = copy.deepcopy(CIELO_RESPONSE_COMPLETE)
+        cielo_data['Payment']['PaymentId'] = self.path.rsplit('/', 1)[-1]
+        body = json.dumps(cielo_data).encode('utf-8')
+
+        wfile = self.wfile
+        if self.server.trickle and self.server.trickle_headers:
+            self.wfile = TrickleFile(wfile, self.server.trickle)
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            # wbits 31 writes a gzip stream
+            compressor = zlib.compressobj(9, zlib.DEFLATED, 31)
+            body = compressor.compress(body) + compressor.flush()
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+
+        if self.server.trickle:
+            TrickleFile(wfile, self.server.trickle).write(body)
+        else:
+            self.wfile.write(body)
+        self.wfile = wfile
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeCieloServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+
+    '''
+    Local threaded HTTP stub of the Cielo webservice
+    '''
+
+    daemon_threads = True
+
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), FakeCieloHandler)
+        self.request_ids = []
+        self.accept_encodings = []
+        self.clients = set()
+        self.connections = 0
+        # seconds waited before answering
+        self.delay = 0
+        # seconds between the 16 bytes pieces of slow responses
+        self.trickle = 0
+        self.trickle_headers = False
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%d' % self.server_address[1]
+
+    def verify_request(self, request, client_address):
+        with self._lock:
+            self.connections += 1
+        return True
+
+    def record(self, handler):
+        with self._lock:
+            self.request_ids.append(handler.headers.get('RequestId'))
+            self.accept_encodings.append(handler.headers.get('Accept-Encoding'))
+            self.clients.add(handler.client_address)
+
+    def __enter__(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
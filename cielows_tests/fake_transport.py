@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+# This file is part of Python Cielo Webservice.
+#
+# Copyright (c) 2016, Rockho Team. All rights reserved.
+# Author: Christian Hess
+#
+# This source code is licensed under the AGPLv3 license found in the
+# LICENSE file in the root directory of this source tree.
+
+import json
+import re
+
+from cielows.transport import CieloTransportResponse
+
+
+class FakeTransport(object):
+
+    '''
+    Transport stub that answers requests from registered routes
+    and records every request it gets
+    '''
+
+    def __init__(self):
+        self.routes = []
+        self.requests = []
+
+    def add(self, method, url_pattern, payload, status_code=200):
+        '''
+        Registers a response for the requests matching method and url_pattern
+        '''
+
+        self.routes.append((method, re.compile(url_pattern), payload, status_code))
+
+    def request(self, method, url, headers, body=None, params=None, timeout=None):
+        self.requests.append({
+            'method': method,
+            'url': url,
+            'headers': headers,
+            'body': json.loads(body.decode('utf-8')) if body else None,
+            'params': params,
+            'timeout': timeout,
+        })
+
+        for route_method, url_pattern, payload, status_code in self.routes:
+            if route_method == method and url_pattern.search(url):
+                return CieloTransportResponse(status_code, {},
+                                              json.dumps(payload).encode('utf-8'))
+
+        return CieloTransportResponse(404, {}, b'')
+
+    def close(self):
+        pass
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+# This file is part of Python Cielo Webservice.
+#
+# Copyright (c) 2016, Rockho Team. All rights reserved.
+# Author: Christian Hess
+#
+# This source code is licensed under the AGPLv3 license found in the
+# LICENSE file in the root directory of this source tree.
+
+from cielows.archive import CieloResponseArchive
+
+
+def test_archive_append_and_get(tmpdir):
+    archive = CieloResponseArchive(str(tmpdir), segment_size=16)
+
+    archive.append('payment-1', memoryview(b'{"Status": 1}'))
+    archive.append('payment-2', b'{"Status": 2}')
+    archive.append('payment-1', b'{"Status": 10}')
+
+    assert archive.get('payment-1') == [b'{"Status": 1}', b'{"Status": 10}']
+    assert archive.get('payment-2') == [b'{"Status": 2}']
+    assert archive.get('payment-3') == []
+    assert 'payment-2' in archive
+
+    # @test: segments roll over once segment_size is exceeded
+    assert len(tmpdir.listdir(lambda path: path.ext == '.seg')) == 3
+
+    archive.close()
+
+    # @test: the index is reloaded when the archive is reopened
+    archive = CieloResponseArchive(str(tmpdir), segment_size=16)
+    assert archive.get('payment-1') == [b'{"Status": 1}', b'{"Status": 10}']
+
+    archive.append('payment-2', b'{"Status": 3}')
+    assert archive.get('payment-2') == [b'{"Status": 2}', b'{"Status": 3}']
+    archive.close()
+
+
+def test_archive_ignores_interrupted_index_line(tmpdir):
+    archive = CieloResponseArchive(str(tmpdir))
+    archive.append('payment-1', b'{"Status": 1}')
+    archive.close()
+
+    with tmpdir.join(CieloResponseArchive.INDEX_FILENAME).open('ab') as index_file:
+        index_file.write(b'payment-2 0 13')
+
+    archive = CieloResponseArchive(str(tmpdir))
+    assert archive.get('payment-1') == [b'{"Status": 1}']
+    assert 'payment-2' not in archive
+
+    # @test: responses appended after the interrupted line survive a reopen
+    archive.append('payment-3', b'{"Status": 3}')
+    archive.close()
+
+    archive = CieloResponseArchive(str(tmpdir))
+    assert archive.get('payment-3') == [b'{"Status": 3}']
+    assert archive.get('payment-1') == [b'{"Status": 1}']
+    archive.close()
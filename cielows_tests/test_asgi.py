@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+# This file is part of Python Cielo Webservice.
+#
+# Copyright (c) 2016, Rockho Team. All rights reserved.
+# Author: Christian Hess
+#
+# This source code is licensed under the AGPLv3 license found in the
+# LICENSE file in the root directory of this source tree.
+#
+# python 3.7+ only, see conftest.py
+
+import asyncio
+import json
+
+from cielows.asgi import CieloNotificationASGIApp
+from cielows.notifications import CieloNotificationReceiver
+from cielows_tests.test_notifications import NOTIFICATION
+
+
+def call_asgi(app, method, body):
+    messages = [{'type': 'http.request', 'body': body[:10], 'more_body': True},
+                {'type': 'http.request', 'body': body[10:]}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app({'type': 'http', 'method': method}, receive, send))
+    return sent[0]['status']
+
+
+# @test: notifications posted to the ASGI app reach the receiver
+def test_asgi_app():
+    receiver = CieloNotificationReceiver()
+    received = []
+    receiver.register(received.append)
+    app = CieloNotificationASGIApp(receiver)
+
+    body = json.dumps(NOTIFICATION).encode('utf-8')
+    assert call_asgi(app, 'POST', body) == 200
+
+    receiver.start()
+    receiver.stop()
+    assert received[0].payment_id == NOTIFICATION["PaymentId"]
+
+
+def test_asgi_app_errors():
+    receiver = CieloNotificationReceiver(queue_size=1)
+    app = CieloNotificationASGIApp(receiver)
+
+    assert call_asgi(app, 'GET', b'') == 405
+    assert call_asgi(app, 'POST', b'not json') == 400
+
+    # @test: a full queue asks Cielo to resend the notification
+    assert call_asgi(app, 'POST', json.dumps(NOTIFICATION).encode('utf-8')) == 200
+    other = dict(NOTIFICATION, PaymentId="6c1d45c3-a95f-49c1-a626-1e9373feecc2")
+    assert call_asgi(app, 'POST', json.dumps(other).encode('utf-8')) == 503
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+# This file is part of Python Cielo Webservice.
+#
+# Copyright (c) 2016, Rockho Team. All rights reserved.
+# Author: Christian Hess
+#
+# This source code is licensed under the AGPLv3 license found in the
+# LICENSE file in the root directory of this source tree.
+
+import csv
+import datetime
+
+import six
+
+from cielows.batch import CieloBoletoBatch, CieloBoletoCSVSink, CieloPaymentsQueryBatch,\
+    stream_concurrently
+from cielows.constants import CieloBoletoProvider, CieloPaymentType
+from cielows.models import CieloFactory, CieloResponseBoletoPayment
+from cielows_tests.fake_data import CIELO_BOLETO_RESPONSE
+from cielows_tests.fake_transport import FakeTransport
+
+
+def test_stream_concurrently():
+    def invert(number):
+        return 1.0 / number
+
+    results = dict((item, (result, error)) for item, result, error in
+                   stream_concurrently(invert, range(-50, 50), max_workers=4, max_pending=8))
+
+    assert len(results) == 100
+    assert results[4] == (0.25, None)
+    assert isinstance(results[0][1], ZeroDivisionError)
+
+
+def test_boleto_batch():
+    transport = FakeTransport()
+    transport.add('POST', r'/1/sales/$', CIELO_BOLETO_RESPONSE, status_code=201)
+    cielo_ws = CieloFactory.new_webservice('1234', '4567', sandbox=True, transport=transport)
+
+    customer = CieloFactory.new_request_customer(name="Comprador Teste Boleto")
+    payment = CieloFactory.new_request_boleto_payment(amount=15700,
+                                                      provider=CieloBoletoProvider.Bradesco,
+                                                      expiration_date='2015-01-05',
+                                                      instructions='Aceitar somente até a data de vencimento.')
+    orders = (('order-%d' % i, customer, payment) for i in range(20))
+
+    output = six.StringIO()
+    batch = CieloBoletoBatch(cielo_ws, CieloBoletoCSVSink(output), max_workers=4)
+    assert batch.issue(orders) == (20, 0)
+
+    sent = transport.requests[0]['body']['Payment']
+    assert sent['Type'] == CieloPaymentType.Boleto
+    assert sent['Provider'] == CieloBoletoProvider.Bradesco
+    assert sent['ExpirationDate'] == '2015-01-05'
+
+    rows = list(csv.DictReader(six.StringIO(output.getvalue())))
+    assert sorted(row['order_id'] for row in rows) == sorted('order-%d' % i for i in range(20))
+    assert rows[0]['url'] == CIELO_BOLETO_RESPONSE['Payment']['Url']
+    assert rows[0]['bar_code_number'] == CIELO_BOLETO_RESPONSE['Payment']['BarCodeNumber']
+    assert rows[0]['digitable_line'] == CIELO_BOLETO_RESPONSE['Payment']['DigitableLine']
+
+
+def test_boleto_response():
+    cielo_response = CieloFactory.new_response(CIELO_BOLETO_RESPONSE)
+
+    assert isinstance(cielo_response.payment, CieloResponseBoletoPayment)
+    assert cielo_response.payment.credit_card == None
+    assert cielo_response.payment.amount == CIELO_BOLETO_RESPONSE['Payment']['Amount']
+    assert cielo_response.payment.url == CIELO_BOLETO_RESPONSE['Payment']['Url']
+    assert cielo_response.payment.expiration_date == CIELO_BOLETO_RESPONSE['Payment']['ExpirationDate']
+
+
+class FakeQueryPaymentsWS(object):
+
+    def __init__(self):
+        self.order_ids = []
+
+    def query_payments(self, order_id):
+        self.order_ids.append(order_id)
+        if order_id == 'broken':
+            raise IOError('connection reset')
+
+        return CieloFactory.new_payments_query_result({
+            "Payments": [
+                {"PaymentId": "payment-" + order_id, "ReceveidDate": "2016-01-%sT10:13:39.42" % order_id},
+                {"PaymentId": "shared", "ReceveidDate": "2016-01-01T00:00:00"},
+            ]
+        })
+
+
+def test_payments_query_batch():
+    cielo_ws = FakeQueryPaymentsWS()
+    batch = CieloPaymentsQueryBatch(cielo_ws, max_workers=4)
+    order_ids = ['%02d' % day for day in range(1, 21)] * 2 + ['broken']
+
+    results = list(batch.query(order_ids))
+
+    # @test: orders are queried once, payments are yielded once
+    assert sorted(cielo_ws.order_ids) == sorted(set(order_ids))
+    payment_ids = [payment.payment_id for _, payment in results]
+    assert len(payment_ids) == len(set(payment_ids)) == 21
+    assert [order_id for order_id, _ in batch.errors] == ['broken']
+
+    # @test: received date range filter
+    results = list(CieloPaymentsQueryBatch(cielo_ws).query(order_ids,
+                                                           received_since=datetime.date(2016, 1, 5),
+                                                           received_until=datetime.date(2016, 1, 7)))
+    assert sorted(payment.payment_id for _, payment in results) == ['payment-05', 'payment-06', 'payment-07']
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+# This file is part of Python Cielo Webservice.
+#
+# Copyright (c) 2016, Rockho Team. All rights reserved.
+# Author: Christian Hess
+#
+# This source code is licensed under the AGPLv3 license found in the
+# LICENSE file in the root directory of this source tree.
+
+import json
+
+import pytest
+
+from cielows.builder import CieloRequestBuilder
+from cielows.constants import CieloCardBrand
+from cielows.exceptions import ValidationError
+from cielows.models import CieloFactory
+from cielows_tests.test_transactions import new_fake_webservice
+
+
+def fill_builder(builder, name=u'Comprador Teste'):
+    return builder.reset()\
+        .customer(name, email='comprador@teste.com')\
+        .address(street='Rua Teste', number='123', zip_code='12345987', city='Rio de Janeiro')\
+        .credit_card('4024007197692931', 'Teste Holder', '12/2030', '123', CieloCardBrand.Visa)\
+        .payment(15700, 1, 'Simulado', soft_descriptor='Loja')
+
+
+def new_request(order_id='2014111703', name=u'Comprador Teste'):
+    address = CieloFactory.new_customer_address(street='Rua Teste', number='123',
+                                                zip_code='12345987', city='Rio de Janeiro')
+    customer = CieloFactory.new_request_customer(name=name, email='comprador@teste.com',
+                                                 address=address)
+    credit_card = CieloFactory.new_request_credit_card(card_number='4024007197692931',
+                                                       holder='Teste Holder',
+                                                       expiration_date='12/2030',
+                                                       security_code='123',
+                                                       brand=CieloCardBrand.Visa)
+    payment = CieloFactory.new_request_payment(amount=15700, installments=1,
+                                               credit_card=credit_card, provider='Simulado',
+                                               soft_descriptor='Loja')
+    return CieloFactory.new_request(order_id, customer, payment)
+
+
+# @test: the builder serializes the same JSON as the request models
+def test_builder_matches_request_json():
+    builder = fill_builder(CieloRequestBuilder())
+    builder.order_id = '2014111703'
+
+    assert json.loads(builder.serialize().decode('ascii')) == new_request().to_json()
+
+
+# @test: the buffer is reused, a shorter request leaves no stale bytes
+def test_builder_reuses_buffer():
+    builder = fill_builder(CieloRequestBuilder(), name=u'Comprador com um nome bem mais longo')
+    builder.order_id = '1'
+    builder.serialize()
+    buffer = builder._buffer
+
+    fill_builder(builder, name=u'Jos\xe9')
+    builder.order_id = '2'
+    cielo_data = json.loads(builder.serialize().decode('ascii'))
+
+    assert builder._buffer is buffer
+    assert cielo_data == new_request(order_id='2', name=u'Jos\xe9').to_json()
+
+
+# @test: field lengths are checked while serializing
+def test_builder_validates_lengths():
+    builder = fill_builder(CieloRequestBuilder())
+    builder.address_state = 'RJX'
+
+    with pytest.raises(ValidationError) as error:
+        builder.serialize()
+
+    assert 'Customer.Address.State' in str(error.value)
+
+
+# @test: builders are kept per thread and authorize through the webservice
+def test_builder_for_thread_authorize():
+    builder = CieloRequestBuilder.for_thread()
+    builder.card_holder = 'stale'
+
+    assert CieloRequestBuilder.for_thread() is builder
+    assert builder.card_holder is None
+
+    cielo_ws, transport = new_fake_webservice()
+    fill_builder(builder).order_id = '2014111703'
+    cielo_response = builder.authorize(cielo_ws)
+
+    assert cielo_response.payment.payment_id is not None
+    assert transport.requests[0]['body'] == json.loads(builder.serialize().decode('ascii'))
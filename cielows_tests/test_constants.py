@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+# This file is part of Python Cielo Webservice.
+#
+# Copyright (c) 2016, Rockho Team. All rights reserved.
+# Author: Christian Hess
+#
+# This source code is licensed under the AGPLv3 license found in the
+# LICENSE file in the root directory of this source tree.
+
+import copy
+import json
+import pickle
+
+from cielows.constants import CieloCardBrand, CieloPaymentStatus,\
+    CieloPaymentReturnCode, CieloCurrency
+from cielows.models import CieloFactory
+from cielows_tests.fake_data import CIELO_RESPONSE_COMPLETE, CIELO_CAPTURE_RESPONSE
+
+
+# @test: members keep the equality, hashing and JSON of their raw values
+def test_constants_members():
+    assert CieloPaymentStatus.Authorized == 1
+    assert CieloCardBrand.Visa == 'Visa'
+    assert {1: 'x'}[CieloPaymentStatus.Authorized] == 'x'
+    assert json.dumps([CieloPaymentStatus.Voided, CieloCurrency.BRL]) == '[10, "BRL"]'
+
+    assert CieloPaymentStatus.Voided.name == 'Voided'
+    assert CieloPaymentStatus.Voided.group is CieloPaymentStatus
+    assert 12 in CieloPaymentStatus
+    assert len(CieloCardBrand) == 8
+    assert list(CieloPaymentStatus)[:3] == [0, 1, 2]
+
+
+# @test: reverse lookup returns the shared member, unknown values are kept
+def test_constants_from_value():
+    assert CieloPaymentStatus.from_value(2) is CieloPaymentStatus.PaymentConfirmed
+    assert CieloCardBrand.from_value(u'Visa') is CieloCardBrand.Visa
+    assert CieloPaymentReturnCode.from_value('4') is CieloPaymentReturnCode.OperationSuccessful
+    assert CieloPaymentReturnCode.from_value('05') == '05'
+    assert CieloCurrency.from_value(None) is None
+
+
+# @test: members survive pickling and copies
+def test_constants_pickle():
+    assert pickle.loads(pickle.dumps(CieloCardBrand.Elo)) is CieloCardBrand.Elo
+    assert copy.deepcopy(CieloPaymentStatus.Denied) is CieloPaymentStatus.Denied
+
+
+# @test: parsed responses hold the members
+def test_constants_parsed_responses():
+    cielo_response = CieloFactory.new_response(CIELO_RESPONSE_COMPLETE)
+    payment = cielo_response.payment
+
+    assert payment.status is CieloPaymentStatus.PaymentConfirmed
+    assert payment.return_code == '6'
+    assert payment.credit_card.brand is CieloCardBrand.Visa
+
+    update = CieloFactory.new_response_payment_update(CIELO_CAPTURE_RESPONSE)
+    assert update.status is CieloPaymentStatus.PaymentConfirmed
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+# This file is part of Python Cielo Webservice.
+#
+# Copyright (c) 2016, Rockho Team. All rights reserved.
+# Author: Christian Hess
+#
+# This source code is licensed under the AGPLv3 license found in the
+# LICENSE file in the root directory of this source tree.
+
+from cielows.constants import CieloErrorsMap
+from cielows.exceptions import CieloErrorClasses, CieloAPIError, CieloClientError,\
+    CieloMerchantConfigError, CieloRetryableError, CieloServerError, CieloRequestError,\
+    CieloError126, CieloError132, cielo_error
+
+
+def test_error_classes():
+    assert len(CieloErrorClasses) == len(CieloErrorsMap)
+
+    for code, error_class in CieloErrorClasses.items():
+        assert error_class.code == code
+        assert error_class.message == CieloErrorsMap[str(code)]
+        assert issubclass(error_class, (CieloClientError, CieloMerchantConfigError, CieloRetryableError))
+
+    assert issubclass(CieloError126, CieloClientError)
+    assert issubclass(CieloError132, CieloMerchantConfigError)
+    assert issubclass(CieloErrorClasses[315], CieloRetryableError)
+
+
+def test_cielo_error():
+    error = cielo_error(400, [(126, 'Credit Card Expiration Date is invalid')])
+    assert isinstance(error, CieloError126)
+    assert isinstance(error, CieloRequestError)
+    assert error.status_code == 400
+    assert error.errors == [(126, 'Credit Card Expiration Date is invalid')]
+
+    # @test: codes are matched whatever their JSON type
+    assert isinstance(cielo_error(400, [('132', 'MerchantKey is invalid')]), CieloError132)
+
+    # @test: unknown codes fall back on the HTTP status
+    assert type(cielo_error(400, [(999, 'Unknown')])) is CieloClientError
+    assert type(cielo_error(503)) is CieloServerError
+    assert isinstance(cielo_error(503), CieloRetryableError)
+    assert isinstance(cielo_error(401, [(None, None)]), CieloAPIError)
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+# This file is part of Python Cielo Webservice.
+#
+# Copyright (c) 2016, Rockho Team. All rights reserved.
+# Author: Christian Hess
+#
+# This source code is licensed under the AGPLv3 license found in the
+# LICENSE file in the root directory of this source tree.
+
+import csv
+
+import pytest
+import six
+
+from cielows.models import CieloFactory
+from cielows.export import CieloPaymentExporter, CieloCSVColumnWriter,\
+    CieloArrowColumnWriter, CieloPaymentExportColumns
+from cielows_tests.fake_data import CIELO_RESPONSE_COMPLETE
+
+
+def test_csv_export():
+    payment = CieloFactory.new_response_payment(CIELO_RESPONSE_COMPLETE)
+    output = six.StringIO()
+
+    writer = CieloCSVColumnWriter(output)
+    with CieloPaymentExporter(writer, batch_size=2) as exporter:
+        exporter.add_many([payment] * 5)
+
+        # @test: full batches are written as soon as they fill up
+        assert exporter.exported == 4
+
+    assert exporter.exported == 5
+
+    rows = list(csv.reader(six.StringIO(output.getvalue())))
+    assert tuple(rows[0]) == CieloPaymentExportColumns
+    assert len(rows) == 6
+
+    row = dict(zip(rows[0], rows[1]))
+    assert row['payment_id'] == CIELO_RESPONSE_COMPLETE['Payment']['PaymentId']
+    assert row['tid'] == CIELO_RESPONSE_COMPLETE['Payment']['Tid']
+    assert row['amount'] == str(CIELO_RESPONSE_COMPLETE['Payment']['Amount'])
+    assert row['captured_amount'] == str(CIELO_RESPONSE_COMPLETE['Payment']['CapturedAmount'])
+    assert row['status'] == str(CIELO_RESPONSE_COMPLETE['Payment']['Status'])
+    assert row['brand'] == CIELO_RESPONSE_COMPLETE['Payment']['CreditCard']['Brand']
+
+
+def test_parquet_export(tmpdir):
+    pyarrow_parquet = pytest.importorskip('pyarrow.parquet')
+
+    payment = CieloFactory.new_response_payment(CIELO_RESPONSE_COMPLETE)
+    path = str(tmpdir.join('payments.parquet'))
+
+    with CieloPaymentExporter(CieloArrowColumnWriter(path, parquet=True), batch_size=3) as exporter:
+        exporter.add_many([payment] * 7)
+
+    table = pyarrow_parquet.read_table(path)
+    assert table.num_rows == 7
+    assert table.column_names == list(CieloPaymentExportColumns)
+    assert table.column('amount').to_pylist() == [CIELO_RESPONSE_COMPLETE['Payment']['Amount']] * 7
+
+
+def test_exporter_error():
+    with pytest.raises(ValueError):
+        CieloPaymentExporter(CieloCSVColumnWriter(six.StringIO()), batch_size=0)
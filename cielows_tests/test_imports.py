@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+# This file is part of Python Cielo Webservice.
+#
+# Copyright (c) 2016, Rockho Team. All rights reserved.
+# Author: Christian Hess
+#
+# This source code is licensed under the AGPLv3 license found in the
+# LICENSE file in the root directory of this source tree.
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+from cielows.transport import CieloTransport
+
+
+# cumulative import time budget of cielows.cielo, in microseconds
+IMPORT_TIME_BUDGET = 50000
+
+# modules that must only be imported when first needed
+LAZY_MODULES = ('requests', 'urllib3', 'uuid', 'json', 'datetime')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_python(*args):
+    process = subprocess.Popen((sys.executable,) + args, cwd=ROOT,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stdout, stderr = process.communicate()
+    assert process.returncode == 0, stderr
+    return stdout.decode('utf-8'), stderr.decode('utf-8')
+
+
+# @test: importing the client does not load the HTTP stack and other heavy modules
+def test_import_is_lazy():
+    stdout, _ = run_python('-c', 'import sys, cielows.cielo; '
+                                 'print(" ".join(m for m in %r if m in sys.modules))'
+                                 % (LAZY_MODULES,))
+
+    assert stdout.strip() == ''
+
+
+# @test: importing the client stays within the import time budget
+# (run by the python 3.7 job of .travis.yml)
+@pytest.mark.skipif(sys.version_info < (3, 7), reason="-X importtime requires python 3.7")
+def test_import_time_budget():
+    _, stderr = run_python('-X', 'importtime', '-c', 'import cielows.cielo')
+
+    cumulative = [int(line.split('|')[1]) for line in stderr.splitlines()
+                  if line.rstrip().endswith('| cielows.cielo')]
+
+    assert cumulative and cumulative[0] < IMPORT_TIME_BUDGET
+
+
+# @test: the transport creates its adapter on the first request
+def test_transport_adapter_is_lazy():
+    transport = CieloTransport(pool_maxsize=4)
+    assert transport._adapter is None
+
+    transport.close()
+    assert transport.adapter is transport.adapter
+    assert transport.session.get_adapter('https://api.cieloecommerce.cielo.com.br') is transport.adapter
+    transport.close()
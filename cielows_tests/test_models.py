@@ -7,12 +7,17 @@
 # This source code is licensed under the AGPLv3 license found in the
 # LICENSE file in the root directory of this source tree.
 
+import copy
+import io
+import json
+
 import pytest
 
-from cielows.models import CieloFactory
-from cielows.constants import CieloPaymentType, CieloCardBrand
+from cielows.models import CieloFactory, CieloResponseBoletoPayment, CieloValueInterner
+from cielows.constants import CieloPaymentType, CieloCardBrand,\
+    CieloRecurrentPaymentInterval
 from cielows_tests.fake_data import CIELO_REQUEST_COMPLETE,\
-    CIELO_RESPONSE_COMPLETE, PAYMENTS_QUERY_RESULT
+    CIELO_RESPONSE_COMPLETE, PAYMENTS_QUERY_RESULT, CIELO_BOLETO_RESPONSE
 from cielows.exceptions import ValidationError, RequiredAttributeError
 
 
@@ -452,3 +457,76 @@ def test_webservice():
     assert cielo_ws.merchant_key == MERCHANT_KEY
     assert cielo_ws.sandbox == False
 
+
+
+def test_cielo_recurrent_payment():
+    recurrent_payment = CieloFactory.new_request_recurrent_payment(interval=CieloRecurrentPaymentInterval.Monthly,
+                                                                  end_date='2019-12-01')
+    assert recurrent_payment.to_json() == {"AuthorizeNow": True,
+                                           "EndDate": "2019-12-01",
+                                           "Interval": "Monthly"}
+
+    with pytest.raises(ValidationError):
+        CieloFactory.new_request_recurrent_payment(interval='Weekly')
+
+    cielo_data = dict(CIELO_RESPONSE_COMPLETE)
+    cielo_data["Payment"] = dict(CIELO_RESPONSE_COMPLETE["Payment"],
+                                 RecurrentPayment={"RecurrentPaymentId": "808d3631-47ca-43b4-97f5-bd29ab06c271",
+                                                   "NextRecurrency": "2015-11-04",
+                                                   "Interval": "Monthly"})
+    recurrent_payment = CieloFactory.new_response_payment(cielo_data).recurrent_payment
+    assert recurrent_payment.recurrent_payment_id == "808d3631-47ca-43b4-97f5-bd29ab06c271"
+    assert recurrent_payment.next_recurrency == "2015-11-04"
+    assert recurrent_payment.interval == CieloRecurrentPaymentInterval.Monthly
+
+
+# @test: payments are built in batches, from dicts or JSON lines, sharing repeated values
+def with_payment_id(cielo_data, payment_id):
+    cielo_data = copy.deepcopy(cielo_data)
+    cielo_data["Payment"]["PaymentId"] = payment_id
+    for link in cielo_data["Payment"]["Links"]:
+        link["Href"] = link["Href"].replace("{PaymentId}", payment_id)
+    return cielo_data
+
+
+def test_cielo_response_payments():
+    first = with_payment_id(CIELO_RESPONSE_COMPLETE, "24bc8366-fc31-4d6c-8555-17049a836a07")
+    other = with_payment_id(CIELO_RESPONSE_COMPLETE, "5fb4d606-bb63-4423-a683-c966e15399e8")
+    cielo_data = [first, other, CIELO_BOLETO_RESPONSE]
+
+    payments = CieloFactory.new_response_payments(cielo_data)
+    assert [payment.payment_id for payment in payments] == \
+        [payment_data["Payment"]["PaymentId"] for payment_data in cielo_data]
+    assert isinstance(payments[2], CieloResponseBoletoPayment)
+
+    lines = io.BytesIO(b'\n'.join(json.dumps(payment_data).encode('utf-8')
+                                  for payment_data in cielo_data) + b'\n\n')
+    interner = CieloValueInterner()
+    loaded = CieloFactory.new_response_payments(lines, interner=interner)
+    assert [payment.payment_id for payment in loaded] == \
+        [payment.payment_id for payment in payments]
+    assert loaded[1].provider is loaded[0].provider
+
+    # @test: links share their method and rel, hrefs are the payment ones
+    assert loaded[1].links[0] is not loaded[0].links[0]
+    assert loaded[1].links[0].rel is loaded[0].links[0].rel
+    assert loaded[1].links[1].method is loaded[0].links[1].method
+    assert loaded[1].links[0].href.endswith(other["Payment"]["PaymentId"])
+    assert loaded[0].links[0].href.endswith(first["Payment"]["PaymentId"])
+
+    # @test: the interner does not grow with the number of payments
+    values = len(interner._values)
+    CieloFactory.new_response_payments(
+        [with_payment_id(CIELO_RESPONSE_COMPLETE, "6c1d45c3-a95f-49c1-a626-1e9373feecc2")],
+        interner=interner)
+    assert len(interner._values) == values
+
+    boleto = copy.deepcopy(CIELO_BOLETO_RESPONSE)
+    boleto["Payment"]["Address"] = {"Street": "Rua Teste", "City": "Rio de Janeiro"}
+    assert CieloFactory.new_response_payments([boleto])[0].address == \
+        boleto["Payment"]["Address"]
+
+    single = CieloFactory.new_response_payment(first)
+    assert loaded[0].status == single.status
+    assert loaded[0].amount == single.amount
+    assert loaded[0].links[0].href == single.links[0].href
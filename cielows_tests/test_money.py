@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+# This file is part of Python Cielo Webservice.
+#
+# Copyright (c) 2016, Rockho Team. All rights reserved.
+# Author: Christian Hess
+#
+# This source code is licensed under the AGPLv3 license found in the
+# LICENSE file in the root directory of this source tree.
+
+import copy
+from decimal import Decimal
+import threading
+
+import pytest
+
+from cielows.constants import CieloCurrency
+from cielows.models import CieloFactory
+from cielows.money import CieloMoney, CieloMoneyTotals, payment_money, sum_amounts
+from cielows_tests.fake_data import CIELO_RESPONSE_COMPLETE
+
+
+def new_payment(captured_amount, currency=None):
+    cielo_data = copy.deepcopy(CIELO_RESPONSE_COMPLETE)
+    cielo_data["Payment"]["CapturedAmount"] = captured_amount
+    cielo_data["Payment"]["Currency"] = currency
+    return CieloFactory.new_response(cielo_data).payment
+
+
+# @test: amounts are ints of minor units, converted with the currency exponent
+def test_money_units():
+    assert CieloMoney.from_decimal(Decimal('12.34')) == CieloMoney(1234, CieloCurrency.BRL)
+    assert CieloMoney.from_decimal('1500', CieloCurrency.CLP).amount == 1500
+    assert CieloMoney(1234, CieloCurrency.USD).to_decimal() == Decimal('12.34')
+    assert str(CieloMoney(-5, CieloCurrency.BRL)) == '-BRL 0.05'
+    assert str(CieloMoney(1500, CieloCurrency.CLP)) == 'CLP 1500'
+
+    with pytest.raises(ValueError):
+        CieloMoney.from_decimal('12.345')
+
+    with pytest.raises(ValueError):
+        CieloMoney(100, 'XXX')
+
+    with pytest.raises(TypeError):
+        CieloMoney(1.5)
+
+
+# @test: arithmetic and comparisons only mix amounts of the same currency
+def test_money_arithmetic():
+    ten = CieloMoney(1000)
+
+    assert ten + ten == CieloMoney(2000)
+    assert ten - CieloMoney(1) == CieloMoney(999)
+    assert 3 * ten == CieloMoney(3000)
+    assert -ten < ten
+    assert not CieloMoney(0)
+    assert len(set([ten, CieloMoney(1000)])) == 1
+
+    with pytest.raises(ValueError):
+        ten + CieloMoney(1000, CieloCurrency.USD)
+
+    with pytest.raises(TypeError):
+        ten + 1
+
+
+# @test: captured amounts are summed per currency
+def test_sum_amounts():
+    payments = [new_payment(1000), new_payment(500, 'BRL'), new_payment(0, 'USD'),
+                new_payment(250, 'USD')]
+
+    assert sum_amounts(payments) == {
+        CieloCurrency.BRL: CieloMoney(1500, CieloCurrency.BRL),
+        CieloCurrency.USD: CieloMoney(250, CieloCurrency.USD),
+    }
+    assert payment_money(payments[0], 'captured_amount') == CieloMoney(1000)
+
+
+# @test: totals are shared by several threads
+def test_money_totals():
+    totals = CieloMoneyTotals()
+    payments = [new_payment(100)] * 50
+
+    threads = [threading.Thread(target=totals.add, args=(payments,)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert totals.totals() == {CieloCurrency.BRL: CieloMoney(40000)}
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+# This file is part of Python Cielo Webservice.
+#
+# Copyright (c) 2016, Rockho Team. All rights reserved.
+# Author: Christian Hess
+#
+# This source code is licensed under the AGPLv3 license found in the
+# LICENSE file in the root directory of this source tree.
+
+import io
+import json
+import threading
+from wsgiref.util import setup_testing_defaults
+
+import pytest
+
+from cielows.constants import CieloNotificationChangeType
+from cielows.notifications import CieloNotificationReceiver
+from cielows.exceptions import ValidationError
+
+
+NOTIFICATION = {
+    "PaymentId": "24bc8366-fc31-4d6c-8555-17049a836a07",
+    "ChangeType": CieloNotificationChangeType.PaymentStatus
+}
+
+
+def call_wsgi(app, body, method='POST'):
+    environ = {}
+    setup_testing_defaults(environ)
+    environ['REQUEST_METHOD'] = method
+    environ['CONTENT_LENGTH'] = str(len(body))
+    environ['wsgi.input'] = io.BytesIO(body)
+
+    statuses = []
+    app(environ, lambda status, headers: statuses.append(status))
+    return statuses[0]
+
+
+def test_receiver_dispatch_and_dedupe():
+    receiver = CieloNotificationReceiver(workers=2)
+    received = []
+    recurrences = []
+    done = threading.Event()
+
+    def handler(notification):
+        received.append(notification)
+        done.set()
+
+    receiver.register(handler)
+    receiver.register(recurrences.append, change_type=CieloNotificationChangeType.RecurrenceCreated)
+    receiver.start()
+
+    body = json.dumps(NOTIFICATION).encode('utf-8')
+    assert call_wsgi(receiver, body) == '200 OK'
+
+    # @test: resent notifications are acknowledged but dispatched once
+    assert call_wsgi(receiver, body) == '200 OK'
+
+    done.wait(5)
+    receiver.stop()
+
+    assert len(received) == 1
+    assert received[0].payment_id == NOTIFICATION["PaymentId"]
+    assert received[0].change_type == CieloNotificationChangeType.PaymentStatus
+    assert recurrences == []
+
+
+# @test: a notification arriving after the previous one was handled is dispatched again
+def test_receiver_later_change():
+    receiver = CieloNotificationReceiver(workers=1)
+    received = []
+    receiver.register(received.append)
+    receiver.start()
+
+    body = json.dumps(NOTIFICATION).encode('utf-8')
+    assert receiver.receive(body)
+    # waits for the first notification to be handled
+    receiver._queue.join()
+
+    # e.g. a capture right after the authorization
+    assert receiver.receive(body)
+    receiver.stop()
+
+    assert len(received) == 2
+
+
+def test_receiver_errors():
+    receiver = CieloNotificationReceiver(queue_size=1)
+
+    assert call_wsgi(receiver, b'', method='GET') == '405 Method Not Allowed'
+    assert call_wsgi(receiver, b'not json') == '400 Bad Request'
+    assert call_wsgi(receiver, b'{"PaymentId": "1234"}') == '400 Bad Request'
+
+    with pytest.raises(ValidationError):
+        receiver.receive(b'[]')
+
+    # @test: a full queue asks Cielo to resend the notification
+    assert call_wsgi(receiver, json.dumps(NOTIFICATION).encode('utf-8')) == '200 OK'
+    other = dict(NOTIFICATION, PaymentId="6c1d45c3-a95f-49c1-a626-1e9373feecc2")
+    assert call_wsgi(receiver, json.dumps(other).encode('utf-8')) == '503 Service Unavailable'
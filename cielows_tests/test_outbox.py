@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+# This file is part of Python Cielo Webservice.
+#
+# Copyright (c) 2016, Rockho Team. All rights reserved.
+# Author: Christian Hess
+#
+# This source code is licensed under the AGPLv3 license found in the
+# LICENSE file in the root directory of this source tree.
+
+import copy
+import re
+
+from cielows.exceptions import CieloManualReviewError
+from cielows.outbox import CieloOutbox, CieloCircuitBreaker
+from cielows_tests.fake_data import CIELO_ERROR_RESPONSE, CIELO_RESPONSE_COMPLETE
+from cielows_tests.test_transactions import new_fake_webservice
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def new_outbox(path, clock=None):
+    cielo_ws, transport = new_fake_webservice()
+    results = []
+    breaker = CieloCircuitBreaker(failure_threshold=2, reset_timeout=30, clock=clock or FakeClock())
+    outbox = CieloOutbox(str(path), cielo_ws, max_workers=2, circuit_breaker=breaker,
+                         on_result=lambda operation, response, error: results.append(
+                             (operation.id, response, error)))
+    return outbox, transport, results
+
+
+def sent(transport, method):
+    return [request['url'] for request in transport.requests if request['method'] == method]
+
+
+# @test: operations recorded during an outage are kept and replayed once the circuit closes
+def test_outbox_outage(tmpdir):
+    clock = FakeClock()
+    outbox, transport, results = new_outbox(tmpdir.join('outbox.db'), clock)
+    request = transport.request
+
+    def unreachable(*args, **kwargs):
+        raise IOError("connection refused")
+
+    transport.request = unreachable
+
+    ids = [outbox.capture('payment-%d' % number, amount=100) for number in range(3)]
+    ids.append(outbox.cancel('payment-3'))
+
+    assert outbox.drain() == 0
+    assert outbox.circuit_breaker.state == CieloCircuitBreaker.Open
+    assert outbox.drain() == 0
+    assert [operation.id for operation in outbox.pending()] == ids
+    assert outbox.position == 0
+
+    # failed sends may have reached Cielo: they are checked first
+    authorized = copy.deepcopy(CIELO_RESPONSE_COMPLETE)
+    authorized['Payment']['Status'] = 1
+    transport.routes.insert(0, ('GET', re.compile(r'/payment-\d$'), authorized, 200))
+    transport.request = request
+    clock.now += 31
+
+    # half-open: a single probe, then the whole backlog
+    assert outbox.drain() == 1
+    assert outbox.circuit_breaker.state == CieloCircuitBreaker.Closed
+    assert outbox.drain() == 3
+
+    assert outbox.pending() == []
+    assert outbox.position == ids[-1]
+    assert sorted(result[0] for result in results) == ids
+    assert len(sent(transport, 'GET')) == 4
+    assert len(sent(transport, 'PUT')) == 4
+    outbox.close()
+
+
+# @test: operations rejected by Cielo are settled as failed
+def test_outbox_rejected(tmpdir):
+    outbox, transport, results = new_outbox(tmpdir.join('outbox.db'))
+    transport.routes.insert(0, ('PUT', re.compile(r'/bad/capture$'), CIELO_ERROR_RESPONSE, 400))
+
+    outbox.capture('bad')
+    good = outbox.capture('good')
+
+    assert outbox.drain() == 2
+    assert outbox.position == good
+    assert [(operation.payment_id, operation.operation) for operation, _ in outbox.failed()] == \
+        [('bad', 'capture')]
+    assert outbox.circuit_breaker.state == CieloCircuitBreaker.Closed
+    outbox.close()
+
+
+# @test: operations interrupted by a crash are checked on Cielo before being sent again
+def test_outbox_crash_recovery(tmpdir):
+    path = tmpdir.join('outbox.db')
+    outbox, _, _ = new_outbox(path)
+    applied = outbox.capture('applied')
+    not_applied = outbox.cancel('not-applied')
+    fresh = outbox.capture('fresh')
+    outbox._set_state(applied, 'started')
+    outbox._set_state(not_applied, 'started')
+    outbox.close()
+
+    # the fake payment query answers PaymentConfirmed
+    outbox, transport, results = new_outbox(path)
+
+    assert outbox.drain() == 3
+    assert len(sent(transport, 'GET')) == 2
+    assert sorted(sent(transport, 'PUT')) == ['https://apisandbox.cieloecommerce.cielo.com.br'
+                                              '/1/sales/fresh/capture',
+                                              'https://apisandbox.cieloecommerce.cielo.com.br'
+                                              '/1/sales/not-applied/void']
+    assert dict((operation_id, response) for operation_id, response, _ in results)[applied] is None
+    assert outbox.position == fresh
+    outbox.close()
+
+    # nothing is replayed after a restart
+    outbox, transport, _ = new_outbox(path)
+    assert outbox.pending() == []
+    assert outbox.drain() == 0
+    assert transport.requests == []
+    outbox.close()
+
+
+# @test: interrupted partial cancels are checked against the payment voided amount
+def test_outbox_partial_cancel_recovery(tmpdir):
+    path = tmpdir.join('outbox.db')
+    outbox, _, _ = new_outbox(path)
+    first = outbox.cancel('applied', amount=500)
+    applied = outbox.cancel('applied', amount=300)
+    not_applied = outbox.cancel('not-applied', amount=100)
+    unknown = outbox.cancel('unknown', amount=100)
+    outbox._set_state(first, 'done')
+    for operation_id in (applied, not_applied, unknown):
+        outbox._set_state(operation_id, 'started')
+    outbox.close()
+
+    outbox, transport, results = new_outbox(path)
+    # partially voided captured payments stay PaymentConfirmed
+    for payment_id, voided_amount in (('applied', 800), ('not-applied', 0), ('unknown', 50)):
+        confirmed = copy.deepcopy(CIELO_RESPONSE_COMPLETE)
+        confirmed['Payment']['VoidedAmount'] = voided_amount
+        transport.routes.insert(0, ('GET', re.compile(r'/%s$' % payment_id), confirmed, 200))
+
+    assert outbox.drain() == 3
+    assert sent(transport, 'PUT') == ['https://apisandbox.cieloecommerce.cielo.com.br'
+                                      '/1/sales/not-applied/void']
+    assert [operation.id for operation, _ in outbox.review()] == [unknown]
+    errors = dict((operation_id, error) for operation_id, _, error in results)
+    assert errors[applied] is None
+    assert isinstance(errors[unknown], CieloManualReviewError)
+    assert outbox.position == unknown
+    outbox.close()
+
+    outbox, transport, _ = new_outbox(path)
+    assert outbox.drain() == 0
+    assert transport.requests == []
+    outbox.close()
+
+
+# @test: the operations of a payment are sent one after the other, in log order
+def test_outbox_payment_order(tmpdir):
+    outbox, transport, results = new_outbox(tmpdir.join('outbox.db'))
+    capture = outbox.capture('p1')
+    cancel = outbox.cancel('p1', amount=100)
+    other = outbox.capture('p2')
+
+    assert outbox.drain() == 2
+    assert sorted(operation_id for operation_id, _, _ in results) == [capture, other]
+    assert [operation.id for operation in outbox.pending()] == [cancel]
+
+    assert outbox.drain() == 1
+    assert [url.rsplit('/', 2)[1:] for url in sent(transport, 'PUT') if '/p1/' in url] == \
+        [['p1', 'capture'], ['p1', 'void']]
+    assert outbox.position == other
+    outbox.close()
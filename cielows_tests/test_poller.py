@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+# This file is part of Python Cielo Webservice.
+#
+# Copyright (c) 2016, Rockho Team. All rights reserved.
+# Author: Christian Hess
+#
+# This source code is licensed under the AGPLv3 license found in the
+# LICENSE file in the root directory of this source tree.
+
+import copy
+
+from cielows.constants import CieloPaymentStatus
+from cielows.models import CieloFactory
+from cielows.poller import CieloPaymentPoller
+from cielows_tests.fake_data import CIELO_RESPONSE_COMPLETE
+
+
+class FakeClock(object):
+    now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeQueryWS(object):
+
+    def __init__(self, statuses):
+        self.statuses = statuses
+        self.queries = []
+
+    def query_payment(self, payment_id):
+        self.queries.append(payment_id)
+        status = self.statuses[payment_id]
+        if isinstance(status, Exception):
+            raise status
+
+        cielo_data = copy.deepcopy(CIELO_RESPONSE_COMPLETE)
+        cielo_data["Payment"]["PaymentId"] = payment_id
+        cielo_data["Payment"]["Status"] = status
+        return CieloFactory.new_response(cielo_data)
+
+
+def test_poller_backoff_and_drop():
+    clock = FakeClock()
+    cielo_ws = FakeQueryWS({'a': CieloPaymentStatus.Pending,
+                            'b': CieloPaymentStatus.Pending,
+                            'c': IOError('connection reset')})
+    updates = []
+    poller = CieloPaymentPoller(cielo_ws, on_update=lambda *update: updates.append(update),
+                                initial_delay=10, max_delay=30, backoff=2, clock=clock)
+    for payment_id in ('a', 'b', 'c'):
+        poller.add(payment_id)
+
+    # @test: nothing is due before initial_delay
+    assert poller.poll() == []
+    assert cielo_ws.queries == []
+    assert poller.next_check() == 1010
+
+    clock.now = 1010
+    assert poller.poll() == []
+    assert sorted(cielo_ws.queries) == ['a', 'b', 'c']
+
+    # @test: delays back off, failed queries included
+    assert poller.next_check() == 1030
+
+    cielo_ws.statuses['a'] = CieloPaymentStatus.Authorized
+    clock.now = 1030
+    updated = poller.poll()
+    assert [payment_id for payment_id, _ in updated] == ['a']
+    assert updates[0][1].payment.status == CieloPaymentStatus.Authorized
+    assert 'a' not in poller
+    assert len(poller) == 2
+
+    # @test: delays are capped by max_delay
+    assert poller.next_check() == 1060
+
+    poller.remove('b')
+    clock.now = 1060
+    cielo_ws.queries = []
+    poller.poll()
+    assert cielo_ws.queries == ['c']
+    poller.close()
+
+
+def test_poller_batch_size():
+    clock = FakeClock()
+    cielo_ws = FakeQueryWS(dict((str(i), CieloPaymentStatus.Pending) for i in range(10)))
+    poller = CieloPaymentPoller(cielo_ws, batch_size=4, initial_delay=0, clock=clock)
+    for i in range(10):
+        poller.add(str(i))
+
+    poller.poll()
+    assert len(cielo_ws.queries) == 4
+    poller.close()
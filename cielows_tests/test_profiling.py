@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+# This file is part of Python Cielo Webservice.
+#
+# Copyright (c) 2016, Rockho Team. All rights reserved.
+# Author: Christian Hess
+#
+# This source code is licensed under the AGPLv3 license found in the
+# LICENSE file in the root directory of this source tree.
+
+import os
+import subprocess
+import sys
+import time
+
+from cielows.profiling import CieloProfiler
+from cielows_tests.fake_transport import FakeTransport
+from cielows_tests.fake_data import CIELO_RESPONSE_COMPLETE
+from cielows_tests.test_transactions import new_fake_webservice, new_fake_request
+
+
+class TickClock(object):
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        self.now += 0.5
+        return self.now
+
+
+class SlowTransport(FakeTransport):
+
+    def request(self, method, url, headers, body=None, params=None, timeout=None):
+        time.sleep(0.05)
+        return FakeTransport.request(self, method, url, headers, body, params, timeout)
+
+
+# @test: every stage of the calls is timed
+def test_profile_stages():
+    profiler = CieloProfiler(sample=False, clock=TickClock())
+    cielo_ws, _ = new_fake_webservice(profiler=profiler)
+    customer, payment = new_fake_request()
+
+    cielo_ws.authorize('2014111703', customer, payment)
+    cielo_ws.capture('24bc8366-fc31-4d6c-8555-17049a836a07')
+
+    stages = profiler.stages()
+    for stage in ('validation', 'serialization', 'network', 'parse'):
+        assert stages[('authorize', stage)] == (1, 0.5)
+    assert stages[('capture', 'network')] == (1, 0.5)
+    assert ('capture', 'serialization') not in stages
+
+    assert profiler.stage_totals()['network'] == 1.0
+    assert 'authorize;network 500000' in profiler.report()
+
+
+# @test: sampled stacks break the stages down by function
+def test_profile_samples(tmpdir):
+    profiler = CieloProfiler(interval=0.001)
+    transport = SlowTransport()
+    transport.add('GET', r'/1/sales/[\w-]+$', CIELO_RESPONSE_COMPLETE)
+    cielo_ws, _ = new_fake_webservice(profiler=profiler)
+    cielo_ws.transport = transport
+
+    for _ in range(3):
+        cielo_ws.query_payment('24bc8366-fc31-4d6c-8555-17049a836a07')
+    profiler.stop()
+
+    report = profiler.report()
+    assert any(line.startswith('query_payment;network;') and 'test_profiling:request' in line
+               for line in report)
+
+    path = str(tmpdir.join('report.folded'))
+    profiler.write(path)
+    with open(path) as report_file:
+        assert report_file.read().splitlines() == report
+
+
+# @test: the CIELOWS_PROFILE environment variable profiles the clients of a process
+def test_profile_environment(tmpdir):
+    path = str(tmpdir.join('report.folded'))
+    environment = dict(os.environ, CIELOWS_PROFILE=path)
+
+    subprocess.check_call([sys.executable, '-c', (
+        'from cielows_tests.test_transactions import new_fake_webservice; '
+        'cielo_ws, _ = new_fake_webservice(); '
+        'cielo_ws.query_payment("24bc8366-fc31-4d6c-8555-17049a836a07")'
+    )], env=environment)
+
+    with open(path) as report_file:
+        assert any(line.startswith('query_payment;') for line in report_file)
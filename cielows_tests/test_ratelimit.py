@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# This file is part of Python Cielo Webservice.
+#
+# Copyright (c) 2016, Rockho Team. All rights reserved.
+# Author: Christian Hess
+#
+# This source code is licensed under the AGPLv3 license found in the
+# LICENSE file in the root directory of this source tree.
+
+import pytest
+
+from cielows.ratelimit import CieloRateLimiter
+
+
+def test_rate_limiter():
+    now = [0.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+
+    rate_limiter = CieloRateLimiter(rate=2, burst=2, clock=lambda: now[0], sleep=sleep)
+
+    # @test: bursts go through, then requests wait for tokens
+    rate_limiter.acquire()
+    rate_limiter.acquire()
+    assert sleeps == []
+
+    rate_limiter.acquire()
+    rate_limiter.acquire()
+    assert sleeps == [0.5, 1.0]
+
+    now[0] = 10.0
+    rate_limiter.acquire()
+    assert len(sleeps) == 2
+
+
+def test_rate_limiter_error():
+    with pytest.raises(ValueError):
+        CieloRateLimiter(rate=0)
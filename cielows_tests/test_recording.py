@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+# This file is part of Python Cielo Webservice.
+#
+# Copyright (c) 2016, Rockho Team. All rights reserved.
+# Author: Christian Hess
+#
+# This source code is licensed under the AGPLv3 license found in the
+# LICENSE file in the root directory of this source tree.
+
+import gzip
+import itertools
+
+import pytest
+
+from cielows.models import CieloFactory
+from cielows.recording import CieloRecordingTransport, CieloReplayTransport, redact
+from cielows_tests.test_transactions import new_fake_webservice, new_fake_request
+
+
+def record(path):
+    cielo_ws, transport = new_fake_webservice()
+    ticks = itertools.count()
+    cielo_ws.transport = CieloRecordingTransport(path, transport=transport,
+                                                 clock=lambda: 0.25 * next(ticks))
+
+    cielo_customer, cielo_payment = new_fake_request()
+    cielo_response = cielo_ws.authorize(order_id='2014111703', customer=cielo_customer,
+                                        payment=cielo_payment)
+    cielo_ws.capture(cielo_response.payment.payment_id, amount=15700)
+    cielo_ws.query_payment(cielo_response.payment.payment_id)
+    cielo_ws.transport.close()
+
+    return cielo_response
+
+
+# @test: card data, customer data and credentials are not recorded
+def test_recording_is_redacted(tmpdir):
+    path = str(tmpdir.join('traffic.gz'))
+    record(path)
+
+    with gzip.open(path, 'rb') as recording:
+        content = recording.read()
+
+    assert len(content.splitlines()) == 3
+    assert b'4916663711012443' not in content
+    assert b'2443' in content
+    assert b'Jorge da Silva' not in content
+    assert b'Rua Teste' not in content
+    assert b'4567' not in content
+
+    assert redact({'Payment': {'CreditCard': {'SecurityCode': '123', 'Brand': 'Visa'}}}) == \
+        {'Payment': {'CreditCard': {'SecurityCode': '***', 'Brand': 'Visa'}}}
+
+    address = {'Street': 'Rua Teste', 'Number': '123', 'Complement': 'AP 123',
+               'ZipCode': '12345987', 'City': 'Rio de Janeiro', 'State': 'RJ', 'Country': 'BRA'}
+    assert redact({'Customer': {'Address': address, 'DeliveryAddress': address},
+                   'Payment': {'Address': address}}) == \
+        {'Customer': {'Address': dict(address, Street='***', Number='***', Complement='***',
+                                      ZipCode='***', City='***', State='***'),
+                      'DeliveryAddress': dict(address, Street='***', Number='***',
+                                              Complement='***', ZipCode='***', City='***',
+                                              State='***')},
+         'Payment': {'Address': dict(address, Street='***', Number='***', Complement='***',
+                                     ZipCode='***', City='***', State='***')}}
+
+
+# @test: replayed traffic goes through the whole client stack with scaled latencies
+def test_replay(tmpdir):
+    path = str(tmpdir.join('traffic.gz'))
+    recorded_response = record(path)
+
+    sleeps = []
+    transport = CieloReplayTransport(path, speed=5, sleep=sleeps.append)
+    cielo_ws = CieloFactory.new_webservice(merchant_id='1234', merchant_key='4567',
+                                           transport=transport)
+
+    assert len(transport) == 3
+
+    cielo_customer, cielo_payment = new_fake_request()
+    cielo_response = cielo_ws.authorize(order_id='2014111703', customer=cielo_customer,
+                                        payment=cielo_payment)
+    assert cielo_response.payment.payment_id == recorded_response.payment.payment_id
+    assert cielo_response.payment.status is recorded_response.payment.status
+
+    cielo_ws.capture(cielo_response.payment.payment_id, amount=15700)
+    cielo_ws.query_payment(cielo_response.payment.payment_id)
+
+    assert sleeps == [0.05, 0.05, 0.05]
+    assert len(transport) == 0
+
+    with pytest.raises(LookupError):
+        cielo_ws.query_payment(cielo_response.payment.payment_id)
+
+
+# @test: replays may keep the recorded gaps between calls
+def test_replay_keep_gaps(tmpdir):
+    path = str(tmpdir.join('traffic.gz'))
+    recorded_response = record(path)
+
+    class FakeClock(object):
+        now = 0.0
+
+        def __call__(self):
+            return self.now
+
+        def sleep(self, seconds):
+            sleeps.append(round(seconds, 6))
+            self.now += seconds
+
+    sleeps = []
+    clock = FakeClock()
+    transport = CieloReplayTransport(path, speed=5, sleep=clock.sleep, keep_gaps=True,
+                                     clock=clock)
+    cielo_ws = CieloFactory.new_webservice(merchant_id='1234', merchant_key='4567',
+                                           transport=transport)
+
+    cielo_customer, cielo_payment = new_fake_request()
+    cielo_ws.authorize(order_id='2014111703', customer=cielo_customer, payment=cielo_payment)
+    cielo_ws.capture(recorded_response.payment.payment_id, amount=15700)
+    clock.now += 1
+    cielo_ws.query_payment(recorded_response.payment.payment_id)
+
+    # recorded at 0, 0.5 and 1, lasting 0.25 each; the last request comes late
+    assert sleeps == [0.05, 0.1, 0]
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+# This file is part of Python Cielo Webservice.
+#
+# Copyright (c) 2016, Rockho Team. All rights reserved.
+# Author: Christian Hess
+#
+# This source code is licensed under the AGPLv3 license found in the
+# LICENSE file in the root directory of this source tree.
+
+import copy
+import datetime
+import io
+
+import pytest
+
+from cielows.constants import CieloRecurrentPaymentInterval, CieloPaymentStatus
+from cielows.exceptions import CieloRequestError, ValidationError, CieloChargeDeclinedError
+from cielows.models import CieloFactory
+from cielows.recurrence import CieloRecurrenceScheduler, CieloScheduledRecurrence,\
+    add_months
+from cielows_tests.fake_data import CIELO_RESPONSE_COMPLETE
+
+
+class FakeAuthorizeWS(object):
+    merchant_id = '1234'
+
+    def __init__(self, failing=(), denied=()):
+        self.failing = failing
+        self.denied = denied
+        self.order_ids = []
+        self.queried_order_ids = []
+        # order id -> payment ids authorized by Cielo
+        self.payments = {}
+
+    def authorize(self, order_id, customer, payment):
+        self.order_ids.append(order_id)
+        if order_id in self.failing:
+            raise CieloRequestError(500)
+
+        self.payments.setdefault(order_id, []).append("payment-" + order_id)
+        return self.query_payment("payment-" + order_id)
+
+    def query_payments(self, order_id):
+        self.queried_order_ids.append(order_id)
+        # like Cielo, unknown orders are not found
+        if order_id not in self.payments:
+            raise CieloRequestError(404)
+        return CieloFactory.new_payments_query_result(
+            {"Payments": [{"PaymentId": payment_id}
+                          for payment_id in self.payments.get(order_id, [])]})
+
+    def query_payment(self, payment_id):
+        cielo_data = copy.deepcopy(CIELO_RESPONSE_COMPLETE)
+        cielo_data["MerchantOrderId"] = payment_id[len("payment-"):]
+        cielo_data["Payment"]["PaymentId"] = payment_id
+        if cielo_data["MerchantOrderId"] in self.denied:
+            cielo_data["Payment"]["Status"] = CieloPaymentStatus.Denied
+        return CieloFactory.new_response(cielo_data)
+
+
+class CountingLimiter(object):
+
+    def __init__(self):
+        self.acquired = 0
+
+    def acquire(self):
+        self.acquired += 1
+
+
+def new_recurrence(recurrence_id, cielo_ws, next_date, end_date=None):
+    return CieloScheduledRecurrence(recurrence_id, cielo_ws,
+                                    customer=None, payment=None,
+                                    interval=CieloRecurrentPaymentInterval.Monthly,
+                                    next_date=next_date, end_date=end_date)
+
+
+def test_add_months():
+    assert add_months(datetime.date(2016, 1, 31), 1, 31) == datetime.date(2016, 2, 29)
+    assert add_months(datetime.date(2016, 2, 29), 1, 31) == datetime.date(2016, 3, 31)
+    assert add_months(datetime.date(2016, 11, 15), 3, 15) == datetime.date(2017, 2, 15)
+
+
+def test_scheduler_run():
+    cielo_ws = FakeAuthorizeWS(failing=('c-20160110',))
+    scheduler = CieloRecurrenceScheduler(max_workers=2)
+    scheduler.add(new_recurrence('a', cielo_ws, datetime.date(2016, 1, 10),
+                                 end_date=datetime.date(2016, 2, 1)))
+    scheduler.add(new_recurrence('b', cielo_ws, datetime.date(2016, 1, 11)))
+    scheduler.add(new_recurrence('c', cielo_ws, datetime.date(2016, 1, 10)))
+
+    charges = scheduler.run(datetime.date(2016, 1, 10))
+    assert sorted(charge.order_id for charge in charges) == ['a-20160110', 'c-20160110']
+    assert [charge.response.payment.payment_id for charge in charges if charge.response] == \
+        ['payment-a-20160110']
+    assert [charge.order_id for charge in charges if charge.error] == ['c-20160110']
+
+    # @test: finished recurrences are dropped, failed ones are retried
+    assert len(scheduler) == 2
+    cielo_ws.failing = ()
+    charges = scheduler.run(datetime.date(2016, 1, 11))
+    assert sorted(charge.order_id for charge in charges) == ['b-20160111', 'c-20160110']
+
+    charges = scheduler.run(datetime.date(2016, 2, 11))
+    assert sorted(charge.order_id for charge in charges) == ['b-20160211', 'c-20160210']
+
+
+# @test: declined charges are not saved as progress and are retried
+def test_scheduler_declined_charge(tmpdir):
+    progress_path = str(tmpdir.join('progress'))
+    cielo_ws = FakeAuthorizeWS(denied=('a-20160110',))
+    scheduler = CieloRecurrenceScheduler(progress_path=progress_path)
+    scheduler.add(new_recurrence('a', cielo_ws, datetime.date(2016, 1, 10)))
+
+    charge, = scheduler.run(datetime.date(2016, 1, 10))
+    assert isinstance(charge.error, CieloChargeDeclinedError)
+    assert charge.response.payment.status == CieloPaymentStatus.Denied
+    assert charge.recurrence.next_date == datetime.date(2016, 1, 10)
+
+    cielo_ws.denied = ()
+    charge, = scheduler.run(datetime.date(2016, 1, 10))
+    assert charge.error is None
+    assert charge.recurrence.next_date == datetime.date(2016, 2, 10)
+    assert cielo_ws.order_ids == ['a-20160110', 'a-20160110']
+
+
+def test_scheduler_resume(tmpdir):
+    progress_path = str(tmpdir.join('progress'))
+    cielo_ws = FakeAuthorizeWS(failing=('b-20160110',))
+
+    scheduler = CieloRecurrenceScheduler(progress_path=progress_path)
+    scheduler.add(new_recurrence('a', cielo_ws, datetime.date(2016, 1, 10)))
+    scheduler.add(new_recurrence('b', cielo_ws, datetime.date(2016, 1, 10)))
+    scheduler.run(datetime.date(2016, 1, 10))
+
+    # @test: a new scheduler does not charge the recurrences again
+    cielo_ws = FakeAuthorizeWS()
+    scheduler = CieloRecurrenceScheduler(progress_path=progress_path)
+    scheduler.add(new_recurrence('a', cielo_ws, datetime.date(2016, 1, 10)))
+    scheduler.add(new_recurrence('b', cielo_ws, datetime.date(2016, 1, 10)))
+    charges = scheduler.run(datetime.date(2016, 1, 10))
+
+    assert cielo_ws.order_ids == ['b-20160110']
+    assert cielo_ws.queried_order_ids == ['b-20160110']
+    assert len(charges) == 2
+
+
+# @test: a charge made right before a crash is found on Cielo instead of being made again
+def test_scheduler_crash_after_charge(tmpdir):
+    progress_path = str(tmpdir.join('progress'))
+    cielo_ws = FakeAuthorizeWS()
+
+    scheduler = CieloRecurrenceScheduler(progress_path=progress_path)
+    scheduler.add(new_recurrence('a', cielo_ws, datetime.date(2016, 1, 10)))
+
+    def crash(order_id, payment_id):
+        raise SystemExit("crashed")
+
+    scheduler._save_progress = crash
+    with pytest.raises(SystemExit):
+        scheduler.run(datetime.date(2016, 1, 10))
+
+    scheduler = CieloRecurrenceScheduler(progress_path=progress_path)
+    scheduler.add(new_recurrence('a', cielo_ws, datetime.date(2016, 1, 10)))
+    charges = scheduler.run(datetime.date(2016, 1, 10))
+
+    assert cielo_ws.order_ids == ['a-20160110']
+    assert charges[0].response.payment.payment_id == 'payment-a-20160110'
+
+    scheduler = CieloRecurrenceScheduler(progress_path=progress_path)
+    scheduler.add(new_recurrence('a', cielo_ws, datetime.date(2016, 1, 10)))
+    scheduler.run(datetime.date(2016, 1, 10))
+    assert cielo_ws.order_ids == ['a-20160110']
+    assert cielo_ws.queried_order_ids == ['a-20160110']
+
+
+# @test: only the orders being charged when a run crashed are looked up, unknown ones are charged
+def test_scheduler_crash_before_charge(tmpdir):
+    progress_path = str(tmpdir.join('progress'))
+    cielo_ws = FakeAuthorizeWS()
+
+    scheduler = CieloRecurrenceScheduler(progress_path=progress_path)
+    scheduler.add(new_recurrence('a', cielo_ws, datetime.date(2016, 1, 10)))
+    scheduler.add(new_recurrence('b', cielo_ws, datetime.date(2016, 1, 11)))
+    scheduler.run(datetime.date(2016, 1, 10))
+
+    # the crash happens before the charge reaches Cielo
+    with io.open(progress_path, 'a') as progress_file:
+        progress_file.write(u"b-20160111 -\n")
+
+    cielo_ws = FakeAuthorizeWS()
+    limiter = CountingLimiter()
+    scheduler = CieloRecurrenceScheduler(progress_path=progress_path,
+                                         rate_limits={cielo_ws.merchant_id: limiter})
+    scheduler.add(new_recurrence('a', cielo_ws, datetime.date(2016, 2, 10)))
+    scheduler.add(new_recurrence('b', cielo_ws, datetime.date(2016, 1, 11)))
+    charges = scheduler.run(datetime.date(2016, 2, 10))
+
+    assert sorted(charge.order_id for charge in charges) == ['a-20160210', 'b-20160111']
+    assert all(charge.error is None for charge in charges)
+    assert cielo_ws.queried_order_ids == ['b-20160111']
+    assert sorted(cielo_ws.order_ids) == ['a-20160210', 'b-20160111']
+
+    # @test: lookups are rate limited like charges
+    assert limiter.acquired == 3
+
+    # @test: a resumed scheduler does not look up later charges
+    scheduler.add(new_recurrence('c', cielo_ws, datetime.date(2016, 2, 10)))
+    scheduler.run(datetime.date(2016, 2, 10))
+    assert cielo_ws.queried_order_ids == ['b-20160111']
+
+
+def test_scheduled_recurrence_error():
+    with pytest.raises(ValidationError):
+        CieloScheduledRecurrence('a', None, None, None, 'Weekly', datetime.date(2016, 1, 1))
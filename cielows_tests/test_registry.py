@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+# This file is part of Python Cielo Webservice.
+#
+# Copyright (c) 2016, Rockho Team. All rights reserved.
+# Author: Christian Hess
+#
+# This source code is licensed under the AGPLv3 license found in the
+# LICENSE file in the root directory of this source tree.
+
+import pytest
+
+from cielows.metrics import CieloMetrics
+from cielows.ratelimit import CieloRateLimiter
+from cielows.registry import CieloWSRegistry
+from cielows_tests.fake_data import CIELO_RESPONSE_COMPLETE, CIELO_ERROR_RESPONSE
+from cielows_tests.fake_transport import FakeTransport
+
+
+CREDENTIALS = dict(('merchant-%d' % i, 'key-%d' % i) for i in range(5))
+
+
+def test_registry_shared_resources():
+    transport = FakeTransport()
+    transport.add('GET', r'/1/sales/ok$', CIELO_RESPONSE_COMPLETE)
+    transport.add('GET', r'/1/sales/invalid$', CIELO_ERROR_RESPONSE, status_code=400)
+    metrics = CieloMetrics()
+    rate_limiter = CieloRateLimiter(rate=1000)
+
+    registry = CieloWSRegistry(CREDENTIALS, sandbox=True, transport=transport,
+                               metrics=metrics, rate_limiter=rate_limiter)
+
+    client0 = registry.get('merchant-0')
+    client1 = registry['merchant-1']
+    assert registry.get('merchant-0') is client0
+    assert client0.transport is client1.transport is transport
+    assert client0.codec is client1.codec
+    assert client0.rate_limiter is rate_limiter
+
+    # @test: credentials and headers stay separate
+    client0.query_payment('ok')
+    client1.query_payment('ok')
+    assert transport.requests[0]['headers']['MerchantId'] == 'merchant-0'
+    assert transport.requests[0]['headers']['MerchantKey'] == 'key-0'
+    assert transport.requests[1]['headers']['MerchantKey'] == 'key-1'
+    assert transport.requests[0]['headers']['RequestId'] != transport.requests[1]['headers']['RequestId']
+
+    with pytest.raises(Exception):
+        client1.query_payment('invalid')
+
+    assert metrics.calls('query_payment') == 3
+    assert metrics.calls('query_payment', 'ok') == 2
+    assert metrics.calls(outcome='client_error') == 1
+
+
+def test_registry_lru_eviction():
+    created = []
+
+    def credentials(merchant_id):
+        created.append(merchant_id)
+        return CREDENTIALS[merchant_id]
+
+    registry = CieloWSRegistry(credentials, max_clients=2, transport=FakeTransport())
+
+    registry.get('merchant-0')
+    registry.get('merchant-1')
+    registry.get('merchant-0')
+    registry.get('merchant-2')
+
+    assert len(registry) == 2
+    assert 'merchant-1' not in registry
+    assert 'merchant-0' in registry
+
+    registry.get('merchant-1')
+    assert created == ['merchant-0', 'merchant-1', 'merchant-2', 'merchant-1']
+
+    with pytest.raises(KeyError):
+        registry.get('unknown')
+
+    registry.evict('merchant-1')
+    assert 'merchant-1' not in registry
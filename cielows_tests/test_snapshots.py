@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+# This file is part of Python Cielo Webservice.
+#
+# Copyright (c) 2016, Rockho Team. All rights reserved.
+# Author: Christian Hess
+#
+# This source code is licensed under the AGPLv3 license found in the
+# LICENSE file in the root directory of this source tree.
+
+import copy
+import subprocess
+import sys
+
+import pytest
+
+from cielows.constants import CieloPaymentStatus
+from cielows.models import CieloFactory
+from cielows.snapshots import CieloPaymentSnapshotStore
+from cielows_tests.fake_data import CIELO_RESPONSE_COMPLETE
+
+
+def new_payment(**changes):
+    cielo_data = copy.deepcopy(CIELO_RESPONSE_COMPLETE)
+    cielo_data["Payment"].update(changes)
+    return CieloFactory.new_response(cielo_data).payment
+
+
+# @test: a stored payment is found by payment_id and by tid
+def test_put_get(tmpdir):
+    store = CieloPaymentSnapshotStore(str(tmpdir.join('snapshots')), capacity=8)
+    payment = new_payment()
+
+    store.put(payment, order_id=CIELO_RESPONSE_COMPLETE["MerchantOrderId"])
+
+    snapshot = store.get(payment.payment_id)
+    assert snapshot.payment_id == payment.payment_id
+    assert snapshot.tid == payment.tid
+    assert snapshot.order_id == CIELO_RESPONSE_COMPLETE["MerchantOrderId"]
+    assert snapshot.status == CieloPaymentStatus.PaymentConfirmed
+    assert snapshot.amount == payment.amount
+    assert snapshot.return_code == payment.return_code
+    assert snapshot.brand == payment.credit_card.brand
+
+    assert store.get_by_tid(payment.tid).payment_id == payment.payment_id
+    assert payment.payment_id in store
+    assert store.get('5fb4d606-bb63-4423-a683-c966e15399e8') is None
+    assert store.get_by_tid(None) is None
+    store.close()
+
+
+# @test: putting a stored payment again updates its record in place
+def test_put_update(tmpdir):
+    store = CieloPaymentSnapshotStore(str(tmpdir.join('snapshots')), capacity=8)
+    store.put(new_payment())
+    store.put(new_payment(Status=10, Tid='0305020554240'))
+
+    assert len(store) == 1
+    snapshot = store.get_by_tid('0305020554240')
+    assert snapshot.status == CieloPaymentStatus.Voided
+    assert store.get_by_tid('0305020554239') is None
+    store.close()
+
+
+# @test: payments written by one process are read by another mapping the store
+def test_shared_readers(tmpdir):
+    path = str(tmpdir.join('snapshots'))
+    store = CieloPaymentSnapshotStore(path, capacity=8)
+    payment = new_payment()
+    store.put(payment)
+
+    reader = CieloPaymentSnapshotStore(path, readonly=True)
+    assert reader.capacity == 8
+    assert reader.get(payment.payment_id).tid == payment.tid
+
+    output = subprocess.check_output([sys.executable, '-c', (
+        'from cielows.snapshots import CieloPaymentSnapshotStore; '
+        'print(CieloPaymentSnapshotStore(%r, readonly=True).get(%r).tid)'
+    ) % (path, payment.payment_id)])
+    assert output.decode('ascii').strip() == payment.tid
+
+    store.put(new_payment(Status=10))
+    assert reader.get(payment.payment_id).status == CieloPaymentStatus.Voided
+
+    reader.close()
+    store.close()
+
+
+# @test: stores reject payments that do not fit
+def test_put_errors(tmpdir):
+    store = CieloPaymentSnapshotStore(str(tmpdir.join('snapshots')), capacity=1)
+    store.put(new_payment())
+
+    with pytest.raises(ValueError):
+        store.put(new_payment(PaymentId='5fb4d606-bb63-4423-a683-c966e15399e8'))
+
+    with pytest.raises(ValueError):
+        store.put(new_payment(Tid='0' * 21))
+
+    with pytest.raises(IOError):
+        CieloPaymentSnapshotStore(str(tmpdir.join('missing')), readonly=True)
+
+    store.close()
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+# This file is part of Python Cielo Webservice.
+#
+# Copyright (c) 2016, Rockho Team. All rights reserved.
+# Author: Christian Hess
+#
+# This source code is licensed under the AGPLv3 license found in the
+# LICENSE file in the root directory of this source tree.
+
+import threading
+
+from cielows.metrics import CieloMetrics
+from cielows.models import CieloFactory
+from cielows.transport import CieloTransport
+from cielows_tests.fake_server import FakeCieloServer
+
+
+THREADS = 16
+CALLS = 25
+
+
+def test_shared_webservice_stress():
+    metrics = CieloMetrics()
+    transport = CieloTransport(pool_maxsize=4, pool_block=True)
+    cielo_ws = CieloFactory.new_webservice('1234', '4567', transport=transport, metrics=metrics)
+    mismatches = []
+    errors = []
+
+    def work(thread_index):
+        try:
+            for call in range(CALLS):
+                payment_id = 'payment-%d-%d' % (thread_index, call)
+                cielo_response = cielo_ws.query_payment(payment_id)
+                if cielo_response.payment.payment_id != payment_id:
+                    mismatches.append(payment_id)
+        except Exception as error:
+            errors.append(error)
+
+    with FakeCieloServer() as server:
+        cielo_ws.query_url = server.url
+
+        threads = [threading.Thread(target=work, args=(i,)) for i in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        transport.close()
+
+    assert errors == []
+    assert mismatches == []
+    assert metrics.calls('query_payment', 'ok') == THREADS * CALLS
+
+    # @test: every call got its own request id
+    assert len(set(server.request_ids)) == THREADS * CALLS
+
+    # @test: threads share the pooled connections
+    assert len(server.clients) <= 4
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+# This file is part of Python Cielo Webservice.
+#
+# Copyright (c) 2016, Rockho Team. All rights reserved.
+# Author: Christian Hess
+#
+# This source code is licensed under the AGPLv3 license found in the
+# LICENSE file in the root directory of this source tree.
+
+import pytest
+
+from cielows.constants import CieloCardBrand
+from cielows.models import CieloFactory
+from cielows.tokens import CieloCardTokenCache, CieloCardTokenStore
+from cielows_tests.fake_transport import FakeTransport
+
+
+CARD_TOKEN = '6e1bf77a-b28b-4660-b14f-455e2a1c95e9'
+
+
+def new_credit_card(card_number='4916663711012443'):
+    return CieloFactory.new_request_credit_card(card_number=card_number,
+                                                holder='Jose da Silva',
+                                                expiration_date='12/2030',
+                                                security_code='123',
+                                                brand=CieloCardBrand.Visa)
+
+
+def test_token_cache_tokenize():
+    transport = FakeTransport()
+    transport.add('POST', r'/1/card/$', {"CardToken": CARD_TOKEN}, status_code=201)
+    cielo_ws = CieloFactory.new_webservice('1234', '4567', sandbox=True, transport=transport)
+    cache = CieloCardTokenCache(b'secret')
+
+    token_card = cache.tokenize(cielo_ws, 'Jose da Silva', new_credit_card())
+    assert token_card.card_token == CARD_TOKEN
+    assert token_card.card_number == None
+    assert token_card.to_json() == {"CardToken": CARD_TOKEN,
+                                    "SecurityCode": "123",
+                                    "SaveCard": False,
+                                    "Brand": CieloCardBrand.Visa}
+    assert transport.requests[0]['body']['CustomerName'] == 'Jose da Silva'
+
+    # @test: repeat customers are served from the cache
+    cache.tokenize(cielo_ws, 'Jose da Silva', new_credit_card())
+    assert len(transport.requests) == 1
+
+
+def test_token_cache_lru_and_store(tmpdir):
+    store = CieloCardTokenStore(str(tmpdir.join('tokens.db')))
+    cache = CieloCardTokenCache(b'secret', max_size=2, store=store)
+    cards = [new_credit_card(number) for number in
+             ('4539696011571731', '4824449019263420', '4485157518938000')]
+
+    for i, card in enumerate(cards):
+        cache.put(card, 'token-%d' % i)
+
+    # @test: the least recently used token is evicted from memory only
+    assert len(cache) == 2
+    assert cache.get(cards[0]) == ('token-0', CieloCardBrand.Visa)
+
+    # @test: the store never sees card numbers
+    fingerprint = cache.fingerprint(cards[0])
+    assert len(fingerprint) == 64
+    assert cards[0].card_number not in fingerprint
+
+    cache.discard(cards[1])
+    store.close()
+
+    cache = CieloCardTokenCache(b'secret', store=CieloCardTokenStore(str(tmpdir.join('tokens.db'))))
+    assert cache.get(cards[0]) == ('token-0', CieloCardBrand.Visa)
+    assert cache.get(cards[1]) == None
+
+    # @test: another key gives other fingerprints
+    assert CieloCardTokenCache(b'other').fingerprint(cards[0]) != fingerprint
+
+
+def test_token_cache_error():
+    with pytest.raises(TypeError):
+        CieloCardTokenCache(u'secret')
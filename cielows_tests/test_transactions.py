@@ -7,10 +7,22 @@
 # This source code is licensed under the AGPLv3 license found in the
 # LICENSE file in the root directory of this source tree.
 
+import copy
+import json
+import re
+
+import pytest
+
 from cielows.models import CieloFactory
 from cielows.cielo import CieloWS
+from cielows.archive import CieloResponseArchive
 from cielows.constants import CieloCardBrand, CieloPaymentType,\
     CieloPaymentStatus, CieloPaymentReturnCode
+from cielows.exceptions import CieloRequestError, CieloError126
+from cielows_tests.fake_data import CIELO_RESPONSE_COMPLETE,\
+    CIELO_CAPTURE_RESPONSE, CIELO_VOID_RESPONSE, CIELO_ERROR_RESPONSE,\
+    PAYMENTS_QUERY_RESULT
+from cielows_tests.fake_transport import FakeTransport
 
 
 def test_authorize_simple_transaction_success():
@@ -68,3 +80,155 @@ def test_authorize_simple_transaction_success():
     payments_response = cielo_ws.fetch_payments(order_id=ORDER_ID)
     assert len(payments_response.payments) == 1
 
+
+def new_fake_webservice(**kwargs):
+    transport = FakeTransport()
+    transport.add('POST', r'/1/sales/$', CIELO_RESPONSE_COMPLETE, status_code=201)
+    transport.add('PUT', r'/capture$', CIELO_CAPTURE_RESPONSE)
+    transport.add('PUT', r'/void$', CIELO_VOID_RESPONSE)
+    transport.add('GET', r'/1/sales/[\w-]+$', CIELO_RESPONSE_COMPLETE)
+    transport.add('GET', r'/1/sales$', PAYMENTS_QUERY_RESULT)
+
+    cielo_ws = CieloFactory.new_webservice(merchant_id='1234',
+                                           merchant_key='4567',
+                                           sandbox=True,
+                                           transport=transport,
+                                           **kwargs)
+    return cielo_ws, transport
+
+
+def new_fake_request():
+    cielo_customer = CieloFactory.new_request_customer(name="Jorge da Silva")
+    cielo_cc = CieloFactory.new_request_credit_card(card_number='4916663711012443',
+                                                    holder='Jose da silva',
+                                                    expiration_date='12/2030',
+                                                    security_code='213',
+                                                    brand=CieloCardBrand.Visa)
+    cielo_payment = CieloFactory.new_request_payment(amount=15700,
+                                                     provider='Simulado',
+                                                     installments=1,
+                                                     credit_card=cielo_cc)
+    return cielo_customer, cielo_payment
+
+
+def test_transactions_with_fake_transport():
+    cielo_ws, transport = new_fake_webservice()
+    cielo_customer, cielo_payment = new_fake_request()
+    payment_id = CIELO_RESPONSE_COMPLETE['Payment']['PaymentId']
+
+    # @test: authorize
+    cielo_response = cielo_ws.authorize(order_id='2014111706',
+                                        customer=cielo_customer,
+                                        payment=cielo_payment)
+    assert cielo_response.order_id == CIELO_RESPONSE_COMPLETE['MerchantOrderId']
+    assert cielo_response.payment.payment_id == payment_id
+
+    sent = transport.requests[-1]
+    assert sent['url'] == 'https://apisandbox.cieloecommerce.cielo.com.br/1/sales/'
+    assert sent['headers']['MerchantId'] == '1234'
+    assert sent['headers']['MerchantKey'] == '4567'
+    assert sent['body']['MerchantOrderId'] == '2014111706'
+    assert sent['body']['Customer'] == {'Name': 'Jorge da Silva'}
+    assert sent['body']['Payment']['Amount'] == 15700
+    assert sent['body']['Payment']['CreditCard']['CardNumber'] == '4916663711012443'
+
+    # @test: capture
+    capture_response = cielo_ws.capture(payment_id, amount=15700)
+    assert capture_response.status == CieloPaymentStatus.PaymentConfirmed
+    assert transport.requests[-1]['params'] == {'amount': 15700}
+
+    # @test: cancel
+    cancel_response = cielo_ws.cancel(payment_id)
+    assert cancel_response.status == CieloPaymentStatus.Voided
+    assert transport.requests[-1]['params'] == {}
+
+    # @test: query
+    query_response = cielo_ws.query_payment(payment_id)
+    assert query_response.payment.tid == CIELO_RESPONSE_COMPLETE['Payment']['Tid']
+    assert transport.requests[-1]['url'].startswith('https://apiquerysandbox.')
+
+    payments_response = cielo_ws.query_payments(order_id='2014111706')
+    assert len(payments_response.payments) == 2
+    assert transport.requests[-1]['params'] == {'merchantOrderId': '2014111706'}
+
+
+def test_transaction_error():
+    cielo_ws, transport = new_fake_webservice()
+    transport.routes.insert(0, ('POST', transport.routes[0][1], CIELO_ERROR_RESPONSE, 400))
+    cielo_customer, cielo_payment = new_fake_request()
+
+    with pytest.raises(CieloRequestError) as excinfo:
+        cielo_ws.authorize(order_id='2014111706',
+                           customer=cielo_customer,
+                           payment=cielo_payment)
+    assert isinstance(excinfo.value, CieloError126)
+    assert excinfo.value.status_code == 400
+    assert excinfo.value.errors == [(126, 'Credit Card Expiration Date is invalid')]
+
+
+def test_transactions_archive(tmpdir):
+    archive = CieloResponseArchive(str(tmpdir))
+    cielo_ws, transport = new_fake_webservice(archive=archive)
+    cielo_customer, cielo_payment = new_fake_request()
+    payment_id = CIELO_RESPONSE_COMPLETE['Payment']['PaymentId']
+
+    cielo_ws.authorize(order_id='2014111706', customer=cielo_customer, payment=cielo_payment)
+    cielo_ws.capture(payment_id)
+
+    responses = archive.get(payment_id)
+    assert len(responses) == 2
+    assert CieloFactory.new_response(json.loads(responses[0].decode('utf-8'))).payment.payment_id == payment_id
+    assert json.loads(responses[1].decode('utf-8')) == CIELO_CAPTURE_RESPONSE
+
+    # @test: rejected calls and order queries are archived too
+    cielo_ws.query_payments('2014111706')
+    assert len(archive.get('2014111706')) == 1
+
+    errors = [{"Code": 308, "Message": "Transaction not available to capture"}]
+    transport.routes.insert(0, ('PUT', re.compile(r'/capture$'), errors, 400))
+    transport.routes.insert(0, ('POST', re.compile(r'/1/sales/$'), errors, 400))
+
+    with pytest.raises(CieloRequestError):
+        cielo_ws.capture(payment_id)
+    assert json.loads(archive.get(payment_id)[2].decode('utf-8')) == errors
+
+    with pytest.raises(CieloRequestError):
+        cielo_ws.authorize(order_id='2014111707', customer=cielo_customer, payment=cielo_payment)
+    assert json.loads(archive.get('2014111707')[0].decode('utf-8')) == errors
+
+
+def test_authorize_and_capture():
+    cielo_ws, transport = new_fake_webservice()
+    cielo_customer, cielo_payment = new_fake_request()
+
+    # @test: full captures are a single authorization with Capture set
+    cielo_response = cielo_ws.authorize_and_capture('2014111706', cielo_customer, cielo_payment)
+    assert len(transport.requests) == 1
+    assert transport.requests[0]['body']['Payment']['Capture'] == True
+    assert cielo_payment.capture == False
+    assert cielo_response.payment.status == CieloPaymentStatus.PaymentConfirmed
+
+    # @test: partial captures follow a successful authorization
+    authorized = copy.deepcopy(CIELO_RESPONSE_COMPLETE)
+    authorized['Payment']['Status'] = CieloPaymentStatus.Authorized
+    authorized['Payment']['CapturedAmount'] = 0
+    transport.routes.insert(0, ('POST', transport.routes[0][1], authorized, 201))
+
+    cielo_response = cielo_ws.authorize_and_capture('2014111706', cielo_customer, cielo_payment,
+                                                    amount=10000)
+    assert transport.requests[1]['body']['Payment']['Capture'] == False
+    assert transport.requests[2]['url'].endswith('/capture')
+    assert transport.requests[2]['params'] == {'amount': 10000}
+    assert cielo_response.payment.status == CieloPaymentStatus.PaymentConfirmed
+    assert cielo_response.payment.captured_amount == 10000
+
+    # @test: a failed partial capture returns the authorization
+    transport.routes.insert(0, ('PUT', re.compile(r'/capture$'),
+                                [{"Code": 500, "Message": "Internal error"}], 500))
+
+    cielo_response = cielo_ws.authorize_and_capture('2014111706', cielo_customer, cielo_payment,
+                                                    amount=10000)
+    assert transport.requests[4]['url'].endswith('/capture')
+    assert cielo_response.payment.status == CieloPaymentStatus.Authorized
+    assert cielo_response.payment.payment_id == authorized['Payment']['PaymentId']
+    assert cielo_response.payment.captured_amount == 0
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+# This file is part of Python Cielo Webservice.
+#
+# Copyright (c) 2016, Rockho Team. All rights reserved.
+# Author: Christian Hess
+#
+# This source code is licensed under the AGPLv3 license found in the
+# LICENSE file in the root directory of this source tree.
+
+import copy
+import re
+import socket
+import time
+
+import pytest
+
+from cielows.constants import CieloResponsePart
+from cielows.exceptions import CieloTimeoutError
+from cielows.metrics import CieloMetrics
+from cielows.models import CieloFactory
+from cielows.transport import CieloTransport, CieloDNSCache
+from cielows_tests.fake_data import CIELO_RESPONSE_COMPLETE
+from cielows_tests.fake_server import FakeCieloServer
+from cielows_tests.test_transactions import new_fake_webservice, new_fake_request
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+# @test: prewarmed connections are the ones later requests use
+def test_prewarm():
+    transport = CieloTransport(pool_maxsize=3)
+    cielo_ws = CieloFactory.new_webservice('1234', '4567', transport=transport)
+
+    with FakeCieloServer() as server:
+        cielo_ws.transaction_url = server.url
+        cielo_ws.query_url = server.url
+
+        assert cielo_ws.prewarm(connections=3, query_connections=0) == 3
+        assert wait_for(lambda: server.connections == 3)
+
+        # already open connections are not opened again
+        assert cielo_ws.prewarm(connections=5, query_connections=0) == 0
+
+        for number in range(5):
+            cielo_ws.query_payment('payment-%d' % number)
+
+        assert server.connections == 3
+        transport.close()
+
+
+# @test: transports that cannot prewarm are left alone
+def test_prewarm_unsupported():
+    cielo_ws, _ = new_fake_webservice()
+    assert cielo_ws.prewarm() == 0
+
+
+# @test: host names are resolved once per ttl, and again after a failed connection
+def test_dns_cache():
+    now = [0]
+    resolutions = []
+
+    def getaddrinfo(host, port, *args):
+        resolutions.append(host)
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', ('127.0.0.1', port))]
+
+    transport = CieloTransport()
+    transport.dns_cache = CieloDNSCache(ttl=60, getaddrinfo=getaddrinfo, clock=lambda: now[0])
+
+    with FakeCieloServer() as server:
+        url = 'http://cielo.test:%d' % server.server_address[1]
+        session = transport.session
+
+        assert session.get(url + '/1/sales/a').json()['Payment']['PaymentId'] == 'a'
+        transport.close()
+        session.get(url + '/1/sales/b')
+        assert resolutions == ['cielo.test']
+
+        now[0] = 61
+        transport.close()
+        session.get(url + '/1/sales/c')
+        assert resolutions == ['cielo.test', 'cielo.test']
+
+    transport.dns_cache.discard('cielo.test', server.server_address[1])
+    assert transport.dns_cache.resolve('cielo.test', 80) == '127.0.0.1'
+
+
+# @test: calls past their deadline raise CieloTimeoutError and leave the pool usable
+def test_call_timeout():
+    metrics = CieloMetrics()
+    transport = CieloTransport(pool_maxsize=1)
+    cielo_ws = CieloFactory.new_webservice('1234', '4567', transport=transport, metrics=metrics,
+                                           timeout=0.2)
+
+    with FakeCieloServer() as server:
+        cielo_ws.query_url = server.url
+        server.delay = 0.5
+
+        started = time.time()
+        with pytest.raises(CieloTimeoutError):
+            cielo_ws.query_payment('slow')
+        assert time.time() - started < 0.45
+        assert metrics.calls('query_payment', 'timeout') == 1
+
+        # per call timeouts override the client one
+        assert cielo_ws.query_payment('patient', timeout=5).payment.payment_id == 'patient'
+
+        server.delay = 0
+        assert cielo_ws.query_payment('fast').payment.payment_id == 'fast'
+        transport.close()
+
+
+# @test: the deadline holds against servers sending the response slowly
+def test_call_timeout_slow_response():
+    transport = CieloTransport(pool_maxsize=1)
+    cielo_ws = CieloFactory.new_webservice('1234', '4567', transport=transport, timeout=0.3)
+
+    with FakeCieloServer() as server:
+        cielo_ws.query_url = server.url
+        server.trickle = 0.05
+
+        for trickle_headers in (False, True):
+            server.trickle_headers = trickle_headers
+
+            started = time.time()
+            with pytest.raises(CieloTimeoutError):
+                cielo_ws.query_payment('slow')
+            assert time.time() - started < 0.5
+
+        server.trickle = 0
+        assert cielo_ws.query_payment('fast').payment.payment_id == 'fast'
+        transport.close()
+
+
+# @test: deadlines do not follow system clock changes
+@pytest.mark.skipif(not hasattr(time, 'monotonic'), reason="time.monotonic requires python 3.3")
+def test_call_timeout_clock_change(monkeypatch):
+    transport = CieloTransport(pool_maxsize=1)
+    cielo_ws = CieloFactory.new_webservice('1234', '4567', transport=transport, timeout=0.3)
+
+    with FakeCieloServer() as server:
+        cielo_ws.query_url = server.url
+        server.trickle = 0.05
+
+        # the system clock is stopped
+        wall_clock = time.time()
+        monkeypatch.setattr(time, 'time', lambda: wall_clock)
+
+        started = time.monotonic()
+        with pytest.raises(CieloTimeoutError):
+            cielo_ws.query_payment('slow')
+        assert time.monotonic() - started < 0.5
+
+        monkeypatch.undo()
+        transport.close()
+
+
+# @test: authorize and capture share one deadline
+def test_authorize_and_capture_timeout():
+    cielo_ws, transport = new_fake_webservice(timeout=10)
+    authorized = copy.deepcopy(CIELO_RESPONSE_COMPLETE)
+    authorized['Payment']['Status'] = 1
+    transport.routes.insert(0, ('POST', re.compile(r'/1/sales/$'), authorized, 201))
+    cielo_customer, cielo_payment = new_fake_request()
+
+    cielo_ws.authorize_and_capture('2014111703', cielo_customer, cielo_payment, amount=100)
+    authorize_timeout, capture_timeout = [request['timeout'] for request in transport.requests]
+
+    assert 0 < capture_timeout <= authorize_timeout <= 10
+    assert cielo_ws.query_payment('payment', timeout=1) is not None
+    assert transport.requests[-1]['timeout'] == pytest.approx(1, abs=0.1)
+
+
+# @test: responses are negotiated and decoded compressed, with or without a timeout
+def test_compressed_responses():
+    transport = CieloTransport()
+    cielo_ws = CieloFactory.new_webservice('1234', '4567', transport=transport)
+
+    with FakeCieloServer() as server:
+        cielo_ws.query_url = server.url
+
+        assert cielo_ws.query_payment('a').payment.payment_id == 'a'
+        assert cielo_ws.query_payment('b', timeout=5).payment.payment_id == 'b'
+        assert server.accept_encodings == ['gzip, deflate', 'gzip, deflate']
+        transport.close()
+
+
+# @test: status checks may skip the parts of the response they do not need
+def test_query_payment_fields():
+    cielo_ws, _ = new_fake_webservice()
+
+    cielo_response = cielo_ws.query_payment('payment', fields=())
+    assert cielo_response.order_id == CIELO_RESPONSE_COMPLETE['MerchantOrderId']
+    assert cielo_response.payment.status == CIELO_RESPONSE_COMPLETE['Payment']['Status']
+    assert cielo_response.customer is None
+    assert cielo_response.payment.credit_card is None
+    assert cielo_response.payment.links == []
+
+    cielo_response = cielo_ws.query_payment('payment', fields=[CieloResponsePart.CreditCard])
+    assert cielo_response.customer is None
+    assert cielo_response.payment.credit_card.brand == 'Visa'
+
+    cielo_response = cielo_ws.query_payment('payment')
+    assert cielo_response.customer.name is not None
+    assert len(cielo_response.payment.links) == len(CIELO_RESPONSE_COMPLETE['Payment']['Links'])
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+# This file is part of Python Cielo Webservice.
+#
+# Copyright (c) 2016, Rockho Team. All rights reserved.
+# Author: Christian Hess
+#
+# This source code is licensed under the AGPLv3 license found in the
+# LICENSE file in the root directory of this source tree.
+
+import copy
+
+import pytest
+
+from cielows.constants import CieloCardBrand
+from cielows.exceptions import ValidationError
+from cielows.models import CieloFactory
+from cielows.validation import CieloLengthRules, validate_request, validate_request_json
+from cielows_tests.fake_data import CIELO_REQUEST_COMPLETE
+from cielows_tests.fake_transport import FakeTransport
+
+
+def test_length_rules():
+    codes = set(code for _, _, code in CieloLengthRules)
+
+    assert 128 in codes
+    assert 155 in codes
+    assert all(128 <= code <= 162 for code in codes)
+    assert (('Customer', 'DeliveryAddress', 'State'), 2, 152) in CieloLengthRules
+
+
+def test_validate_request_json():
+    validate_request_json(CIELO_REQUEST_COMPLETE)
+
+    cielo_data = copy.deepcopy(CIELO_REQUEST_COMPLETE)
+    cielo_data['Customer']['DeliveryAddress']['ZipCode'] = '1234567890'
+
+    with pytest.raises(ValidationError) as excinfo:
+        validate_request_json(cielo_data)
+    assert excinfo.value.code == 150
+    assert 'Address ZipCode length exceeded' in str(excinfo.value)
+
+
+def test_validate_request_before_sending():
+    transport = FakeTransport()
+    cielo_ws = CieloFactory.new_webservice('1234', '4567', sandbox=True, transport=transport)
+
+    customer = CieloFactory.new_request_customer(name='x' * 256)
+    credit_card = CieloFactory.new_request_credit_card(card_number='4916663711012443',
+                                                       holder='Jose da silva',
+                                                       expiration_date='12/2030',
+                                                       security_code='213',
+                                                       brand=CieloCardBrand.Visa)
+    payment = CieloFactory.new_request_payment(amount=100, installments=1,
+                                               credit_card=credit_card, provider='Simulado')
+
+    with pytest.raises(ValidationError) as excinfo:
+        validate_request(CieloFactory.new_request('1', customer, payment))
+    assert excinfo.value.code == 155
+
+    with pytest.raises(ValidationError) as excinfo:
+        cielo_ws.authorize('1', customer, payment)
+    assert excinfo.value.code == 155
+    assert transport.requests == []
@@ -18,6 +18,7 @@ URL = 'http://www.rockho.com.br/'
 LICENSE = 'AGPL-3.0'
 
 REQUIRES = [
+    "futures; python_version < '3'",
     "requests",
     "six"
 ]